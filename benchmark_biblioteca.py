@@ -0,0 +1,257 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from biblioteca_models import DVD, Autor, Biblioteca, Livro, Revista, Usuario
+from carga import percentil
+
+ESCALAS_PADRAO = (1000, 10000, 100000)
+GENEROS = ("Romance", "Ficção científica", "Distopia", "Fantasia", "Ensaio", "Poesia", "História", "Biografia")
+DATA_EMPRESTIMO = "2024-01-01"
+DATA_DEVOLUCAO = "2024-01-10"
+
+
+def gerar_itens(quantidade, semente=0):
+    # Mistura parecida com a de um acervo real: 70% livros, 20% DVDs e 10%
+    # revistas, com autores, gêneros e editoras repetidos entre os itens
+    gerador = random.Random(semente)
+    autores = [Autor(f"Autor {i}", f"autor{i}@example.com") for i in range(max(1, quantidade // 50))]
+    for i in range(quantidade):
+        ano = gerador.randint(1950, 2024)
+        resto = i % 10
+        if resto == 0:
+            yield Revista(f"Revista {i}", ano, f"Edição {i % 120 + 1}", f"Editora {i % 40}")
+        elif resto <= 2:
+            yield DVD(f"Filme {i}", ano, gerador.randint(80, 180), f"Diretor {i % 300}")
+        else:
+            yield Livro(f"Livro {i}", ano, f"ISBN-{i:09d}", gerador.choice(autores), gerador.choice(GENEROS))
+
+
+def gerar_usuarios(quantidade):
+    for i in range(quantidade):
+        yield Usuario(f"Leitor {i}", f"leitor{i}@example.com", f"U{i}")
+
+
+def titulos_emprestaveis(quantidade):
+    return [f"Filme {i}" if i % 10 <= 2 else f"Livro {i}" for i in range(quantidade) if i % 10]
+
+
+class Cronometro:
+    # Guarda a duração de cada chamada; a vazão considera só o tempo medido,
+    # sem o custo de preparar os argumentos
+    def __init__(self):
+        self.duracoes = []
+
+    def medir(self, funcao, *argumentos):
+        inicio = time.perf_counter()
+        resultado = funcao(*argumentos)
+        self.duracoes.append(time.perf_counter() - inicio)
+        return resultado
+
+    def resumo(self, registros=None):
+        duracoes = sorted(self.duracoes)
+        total = sum(duracoes)
+        quantidade = registros if registros is not None else len(duracoes)
+        return {
+            "chamadas": len(duracoes),
+            "registros": quantidade,
+            "duracao_s": total,
+            "por_segundo": quantidade / total if total else 0.0,
+            "latencia_p50_us": percentil(duracoes, 50) * 1e6,
+            "latencia_p95_us": percentil(duracoes, 95) * 1e6,
+            "latencia_p99_us": percentil(duracoes, 99) * 1e6,
+            "latencia_max_us": (duracoes[-1] if duracoes else 0.0) * 1e6,
+        }
+
+
+def _percorrer(iterador):
+    quantidade = 0
+    for quantidade, _ in enumerate(iterador, start=1):
+        pass
+    return quantidade
+
+
+def medir_memoria_acervo(quantidade, quantidade_usuarios, semente=0):
+    # Pico de memória para montar o acervo do zero (objetos e índices). Fica
+    # separado das medições de tempo porque o tracemalloc as distorce.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        biblioteca = Biblioteca("Biblioteca de Benchmark")
+        biblioteca.importar_itens(gerar_itens(quantidade, semente))
+        biblioteca.importar_usuarios(gerar_usuarios(quantidade_usuarios))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def executar_cenario(quantidade, amostra=10000, semente=0, medir_memoria=True):
+    gerador = random.Random(semente)
+    itens = list(gerar_itens(quantidade, semente))
+    quantidade_usuarios = max(10, quantidade // 10)
+    usuarios = list(gerar_usuarios(quantidade_usuarios))
+    gc.collect()
+
+    biblioteca = Biblioteca("Biblioteca de Benchmark")
+    operacoes = {}
+
+    cronometro = Cronometro()
+    for item in itens:
+        cronometro.medir(biblioteca.adicionar_item_catalogo, item)
+    operacoes["adicionar_item_catalogo"] = cronometro.resumo()
+
+    cronometro = Cronometro()
+    for usuario in usuarios:
+        cronometro.medir(biblioteca.registrar_usuario, usuario)
+    operacoes["registrar_usuario"] = cronometro.resumo()
+
+    # Metade das buscas acerta um título do catálogo; a outra metade erra
+    cronometro = Cronometro()
+    for numero in range(amostra):
+        indice = gerador.randrange(quantidade)
+        titulo = itens[indice].get_titulo() if numero % 2 == 0 else f"Ausente {indice}"
+        cronometro.medir(biblioteca.buscar_item_por_titulo, titulo)
+    operacoes["buscar_item_por_titulo"] = cronometro.resumo()
+
+    # Cada usuário leva no máximo um item por rodada, para não esbarrar nos
+    # limites da ConfiguracaoBiblioteca padrão
+    emprestaveis = titulos_emprestaveis(quantidade)
+    gerador.shuffle(emprestaveis)
+    limite = biblioteca.config.get_max_livros_por_usuario()
+    pares = [(usuarios[numero % quantidade_usuarios].matricula, titulo)
+             for numero, titulo in enumerate(emprestaveis[:min(amostra, quantidade_usuarios * limite)])]
+    cronometro = Cronometro()
+    for matricula, titulo in pares:
+        cronometro.medir(biblioteca.realizar_emprestimo, matricula, titulo, DATA_EMPRESTIMO)
+    operacoes["realizar_emprestimo"] = cronometro.resumo()
+
+    cronometro = Cronometro()
+    registros = cronometro.medir(_percorrer, biblioteca.iterar_itens())
+    operacoes["iterar_itens"] = cronometro.resumo(registros)
+
+    cronometro = Cronometro()
+    registros = cronometro.medir(_percorrer, biblioteca.iterar_itens(tipo="livro", disponivel=True))
+    operacoes["iterar_itens_filtrado"] = cronometro.resumo(registros)
+
+    cronometro = Cronometro()
+    registros = cronometro.medir(_percorrer, biblioteca.iterar_usuarios())
+    operacoes["iterar_usuarios"] = cronometro.resumo(registros)
+
+    cronometro = Cronometro()
+    registros = cronometro.medir(_percorrer, biblioteca.iterar_emprestimos_ativos())
+    operacoes["iterar_emprestimos_ativos"] = cronometro.resumo(registros)
+
+    cronometro = Cronometro()
+    for _ in range(min(amostra, 1000)):
+        cronometro.medir(biblioteca.pagina_itens, gerador.randrange(quantidade), 20)
+    operacoes["pagina_itens"] = cronometro.resumo()
+
+    cronometro = Cronometro()
+    for _ in range(min(amostra, 1000)):
+        cronometro.medir(biblioteca.pagina_usuarios, gerador.randrange(quantidade_usuarios), 20)
+    operacoes["pagina_usuarios"] = cronometro.resumo()
+
+    cronometro = Cronometro()
+    for matricula, titulo in pares:
+        cronometro.medir(biblioteca.registrar_devolucao_item, matricula, titulo, DATA_DEVOLUCAO)
+    operacoes["registrar_devolucao_item"] = cronometro.resumo()
+
+    del biblioteca, itens, usuarios
+    memoria_pico = medir_memoria_acervo(quantidade, quantidade_usuarios, semente) if medir_memoria else None
+
+    return {
+        "itens": quantidade,
+        "usuarios": quantidade_usuarios,
+        "emprestimos": len(pares),
+        "memoria_pico_mb": memoria_pico / 2 ** 20 if memoria_pico is not None else None,
+        "operacoes": operacoes,
+    }
+
+
+def executar(escalas, amostra=10000, semente=0, medir_memoria=True, ao_concluir=None):
+    resultado = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "amostra": amostra,
+        "semente": semente,
+        "escalas": {},
+    }
+    for quantidade in escalas:
+        cenario = executar_cenario(quantidade, amostra, semente, medir_memoria)
+        resultado["escalas"][str(quantidade)] = cenario
+        if ao_concluir is not None:
+            ao_concluir(quantidade, cenario)
+    return resultado
+
+
+def comparar(atual, base, tolerancia=0.2):
+    # Devolve as regressões em relação a uma execução anterior: vazão menor
+    # ou pico de memória maior que a tolerância permite. Escalas e operações
+    # que não existem nas duas execuções são ignoradas.
+    regressoes = []
+    for escala, cenario in atual["escalas"].items():
+        cenario_base = base.get("escalas", {}).get(escala)
+        if cenario_base is None:
+            continue
+        for operacao, medida in cenario["operacoes"].items():
+            medida_base = cenario_base["operacoes"].get(operacao)
+            if not medida_base or not medida_base["por_segundo"]:
+                continue
+            razao = medida["por_segundo"] / medida_base["por_segundo"]
+            if razao < 1 - tolerancia:
+                regressoes.append(f"{escala} registros, {operacao}: vazão {medida['por_segundo']:.0f}/s "
+                                  f"contra {medida_base['por_segundo']:.0f}/s na base ({razao - 1:+.0%})")
+        memoria, memoria_base = cenario.get("memoria_pico_mb"), cenario_base.get("memoria_pico_mb")
+        if memoria and memoria_base and memoria / memoria_base > 1 + tolerancia:
+            regressoes.append(f"{escala} registros, memória: pico de {memoria:.1f} MB "
+                              f"contra {memoria_base:.1f} MB na base ({memoria / memoria_base - 1:+.0%})")
+    return regressoes
+
+
+def imprimir_cenario(quantidade, cenario):
+    memoria = cenario["memoria_pico_mb"]
+    texto_memoria = f", pico de memória {memoria:.1f} MB" if memoria is not None else ""
+    print(f"\n== {quantidade} itens, {cenario['usuarios']} usuários, "
+          f"{cenario['emprestimos']} empréstimos{texto_memoria}")
+    print(f"{'operação':<28} {'registros/s':>12} {'p50 µs':>10} {'p95 µs':>10} {'p99 µs':>10}")
+    for operacao, medida in cenario["operacoes"].items():
+        print(f"{operacao:<28} {medida['por_segundo']:>12.0f} {medida['latencia_p50_us']:>10.1f} "
+              f"{medida['latencia_p95_us']:>10.1f} {medida['latencia_p99_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das operações da Biblioteca em várias escalas")
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS_PADRAO),
+                        help="quantidades de itens a medir (ex.: 1000 10000 100000 1000000)")
+    parser.add_argument("--amostra", type=int, default=10000,
+                        help="chamadas medidas por operação de busca, empréstimo e devolução")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória (tracemalloc)")
+    parser.add_argument("--saida", metavar="ARQUIVO", help="grava os resultados em JSON")
+    parser.add_argument("--base", metavar="ARQUIVO", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="perda de vazão (ou ganho de memória) aceita em relação à base")
+    argumentos = parser.parse_args()
+
+    resultado = executar(argumentos.escalas, argumentos.amostra, argumentos.semente,
+                         not argumentos.sem_memoria, imprimir_cenario)
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {argumentos.saida}")
+    if argumentos.base:
+        with open(argumentos.base, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), argumentos.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) em relação a {argumentos.base}:")
+            for regressao in regressoes:
+                print(f"- {regressao}")
+            sys.exit(1)
+        print(f"\nSem regressões em relação a {argumentos.base}.")
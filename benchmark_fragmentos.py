@@ -0,0 +1,111 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import time
+from datetime import datetime
+
+from benchmark_biblioteca import DATA_DEVOLUCAO, DATA_EMPRESTIMO, gerar_itens, gerar_usuarios, titulos_emprestaveis
+from biblioteca_fragmentada import BibliotecaFragmentada
+
+FRAGMENTOS_PADRAO = (1, 2, 4, 8)
+
+
+def _executar_cliente(enderecos, chave, usuarios, titulos, rodadas, semente):
+    # Roda em um processo cliente, com conexões próprias com os fragmentos.
+    # Cada rodada empresta um item a cada usuário do cliente, consulta o item
+    # e o usuário e devolve tudo; clientes diferentes nunca disputam os
+    # mesmos usuários, e os títulos são sorteados para cruzar fragmentos.
+    gerador = random.Random(semente)
+    biblioteca = BibliotecaFragmentada(enderecos, chave)
+    operacoes = 0
+    try:
+        inicio = time.perf_counter()
+        for _ in range(rodadas):
+            pares = [(matricula, gerador.choice(titulos)) for matricula in usuarios]
+            for matricula, titulo in pares:
+                biblioteca.realizar_emprestimo(matricula, titulo, DATA_EMPRESTIMO)
+                biblioteca.buscar_item_por_titulo(titulo)
+                biblioteca.buscar_usuario_por_matricula(matricula)
+            for matricula, titulo in pares:
+                biblioteca.registrar_devolucao_item(matricula, titulo, DATA_DEVOLUCAO)
+            operacoes += 4 * len(pares)
+        return operacoes, time.perf_counter() - inicio
+    finally:
+        biblioteca.fechar()
+
+
+def executar_cenario(fragmentos, itens, usuarios, clientes, rodadas, semente=0):
+    biblioteca = BibliotecaFragmentada.iniciar(fragmentos)
+    try:
+        biblioteca.importar_itens(gerar_itens(itens, semente))
+        biblioteca.importar_usuarios(gerar_usuarios(usuarios))
+        titulos = titulos_emprestaveis(itens)
+        matriculas = [f"U{i}" for i in range(usuarios)]
+        argumentos = [(biblioteca.enderecos, biblioteca.chave, matriculas[cliente::clientes], titulos, rodadas,
+                       semente + cliente) for cliente in range(clientes)]
+        inicio = time.perf_counter()
+        with multiprocessing.Pool(clientes) as pool:
+            parciais = pool.starmap(_executar_cliente, argumentos)
+        duracao = time.perf_counter() - inicio
+    finally:
+        biblioteca.encerrar()
+    operacoes = sum(quantidade for quantidade, _ in parciais)
+    return {
+        "fragmentos": fragmentos,
+        "clientes": clientes,
+        "operacoes": operacoes,
+        "duracao_s": duracao,
+        "por_segundo": operacoes / duracao if duracao else 0.0,
+    }
+
+
+def executar(fragmentos, itens=10000, usuarios=400, clientes=8, rodadas=5, semente=0, ao_concluir=None):
+    resultado = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "nucleos": os.cpu_count(),
+        "itens": itens,
+        "usuarios": usuarios,
+        "cenarios": [],
+    }
+    base = None
+    for quantidade in fragmentos:
+        cenario = executar_cenario(quantidade, itens, usuarios, clientes, rodadas, semente)
+        # Aceleração em relação ao primeiro cenário (normalmente 1 fragmento)
+        base = base or cenario["por_segundo"]
+        cenario["aceleracao"] = cenario["por_segundo"] / base if base else 0.0
+        resultado["cenarios"].append(cenario)
+        if ao_concluir is not None:
+            ao_concluir(cenario)
+    return resultado
+
+
+def imprimir_cenario(cenario):
+    print(f"{cenario['fragmentos']:>10} {cenario['operacoes']:>10} {cenario['duracao_s']:>10.2f} "
+          f"{cenario['por_segundo']:>12.0f} {cenario['aceleracao']:>10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vazão da biblioteca fragmentada por número de processos")
+    parser.add_argument("--fragmentos", type=int, nargs="+", default=list(FRAGMENTOS_PADRAO))
+    parser.add_argument("--itens", type=int, default=10000)
+    parser.add_argument("--usuarios", type=int, default=400)
+    parser.add_argument("--clientes", type=int, default=8, help="processos clientes gerando carga ao mesmo tempo")
+    parser.add_argument("--rodadas", type=int, default=5, help="rodadas de empréstimo e devolução por cliente")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", metavar="ARQUIVO", help="grava os resultados em JSON")
+    argumentos = parser.parse_args()
+
+    print(f"{os.cpu_count()} núcleo(s); {argumentos.clientes} cliente(s), {argumentos.itens} itens, "
+          f"{argumentos.usuarios} usuários")
+    print(f"{'fragmentos':>10} {'operações':>10} {'segundos':>10} {'operações/s':>12} {'aceleração':>11}")
+    resultado = executar(argumentos.fragmentos, argumentos.itens, argumentos.usuarios, argumentos.clientes,
+                         argumentos.rodadas, argumentos.semente, imprimir_cenario)
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {argumentos.saida}")
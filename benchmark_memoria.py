@@ -0,0 +1,77 @@
+import argparse
+import gc
+import tracemalloc
+
+from biblioteca_models import DVD, Autor, Emprestimo, Livro, Revista, Usuario
+
+
+def medir(quantidade, construir):
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    objetos = construir(quantidade)
+    depois = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objetos
+    return (depois - antes) / quantidade
+
+
+def _atributos(classe):
+    # Todos os __slots__ da hierarquia, da classe base para a derivada
+    nomes = []
+    for base in reversed(classe.__mro__):
+        nomes.extend(base.__dict__.get("__slots__", ()))
+    return nomes
+
+
+def _copias(objetos, quantidade, classe):
+    # Novos objetos de classe com os mesmos atributos (e os mesmos valores)
+    # dos originais: só o objeto, e o seu __dict__ se houver, é medido
+    nomes = [nome for nome in _atributos(type(objetos[0])) if hasattr(objetos[0], nome)]
+    copias = []
+    for posicao in range(quantidade):
+        objeto = objetos[posicao]
+        copia = object.__new__(classe)
+        for nome in nomes:
+            setattr(copia, nome, getattr(objeto, nome))
+        copias.append(copia)
+    return copias
+
+
+def comparar(descricao, quantidade, construir):
+    # Antes dos __slots__ as classes do modelo guardavam os atributos num
+    # __dict__; a versão com dict é uma classe comum com os mesmos atributos
+    total = medir(quantidade, construir)
+    objetos = construir(quantidade)
+    classe = type(objetos[0])
+    com_dict = type(f"{classe.__name__}ComDict", (), {})
+    antes = medir(quantidade, lambda q: _copias(objetos, q, com_dict))
+    depois = medir(quantidade, lambda q: _copias(objetos, q, classe))
+    economia = antes - depois
+    print(f"{descricao:<12} {antes:>12.1f} {depois:>12.1f} {economia:>9.1f} ({economia / antes:>4.0%}) "
+          f"{total:>12.1f}")
+    return antes, depois
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memória ocupada por objeto do modelo da biblioteca")
+    parser.add_argument("--quantidade", type=int, default=100000)
+    argumentos = parser.parse_args()
+    n = argumentos.quantidade
+
+    autor = Autor("Autor Compartilhado", "autor@example.com")
+    # Os textos são criados antes das medições para contar só os objetos
+    titulos = [f"Título {i}" for i in range(n)]
+    textos = [f"TXT-{i}" for i in range(n)]
+
+    print(f"Objetos por tipo: {n} (bytes por objeto, incluindo a referência na lista)")
+    # "total" inclui o que o construtor cria além do objeto (datas, listas)
+    print(f"{'':<12} {'com __dict__':>12} {'com slots':>12} {'economia':>16} {'total':>12}")
+    comparar("Livro", n, lambda q: [Livro(titulos[i], 2000, textos[i], autor, "Romance") for i in range(q)])
+    comparar("DVD", n, lambda q: [DVD(titulos[i], 2000, 120, "Diretor") for i in range(q)])
+    comparar("Revista", n, lambda q: [Revista(titulos[i], 2000, "Edição 1", "Editora") for i in range(q)])
+    comparar("Autor", n, lambda q: [Autor(titulos[i], "autor@example.com") for i in range(q)])
+    comparar("Usuario", n, lambda q: [Usuario(titulos[i], "leitor@example.com", textos[i]) for i in range(q)])
+    livros = [Livro(titulos[i], 2000, textos[i], autor) for i in range(n)]
+    usuario = Usuario("Leitor", "leitor@example.com", "U1")
+    comparar("Emprestimo", n, lambda q: [Emprestimo(usuario, livros[i], "2024-01-01", "2024-01-15") for i in range(q)])
@@ -0,0 +1,581 @@
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import uuid
+import zlib
+from multiprocessing.connection import Client, Listener
+
+from biblioteca_models import (
+    Biblioteca, ConfiguracaoBiblioteca, Emprestimo, ItemBibliografico, ItemEmprestavel, Recusa, RelatorioImportacao,
+    Usuario, item_de_registro, item_para_registro, para_data, tipo_item, usuario_de_registro
+)
+
+ERROS_FRAGMENTO = {"ValueError": ValueError, "TypeError": TypeError}
+
+
+def fragmento_de(chave, quantidade):
+    # hash() muda a cada processo (PYTHONHASHSEED); o crc32 não
+    return zlib.crc32(chave.encode("utf-8")) % quantidade
+
+
+class Fragmento:
+    # Parte do acervo e dos usuários, dentro de um processo de trabalho.
+    # Um empréstimo envolve o fragmento do item e o do usuário, que podem ser
+    # diferentes, e segue em duas fases: cada lado primeiro reserva o que
+    # precisa (um exemplar; uma vaga nos limites do usuário) e só depois
+    # confirma ou desfaz. Nada fica travado entre as fases; um pedido
+    # concorrente apenas encontra o exemplar ou a vaga já reservados.
+    #
+    # Do lado do usuário o empréstimo aponta para uma cópia do item (o item
+    # verdadeiro pode estar em outro fragmento); os exemplares só são
+    # controlados no fragmento do item.
+    #
+    # Limites e prazos vêm da configuração que o roteador envia em cada
+    # pedido, e não da cópia recebida quando o processo começou: uma
+    # alteração na configuração do roteador vale no empréstimo seguinte.
+
+    def __init__(self, indice, config=None):
+        self.indice = indice
+        self.biblioteca = Biblioteca(f"Fragmento {indice}", config)
+        self._copias_itens = {}
+        self._itens_pendentes = {}
+        self._usuarios_pendentes = {}
+        self._vagas_pendentes = {}
+        self._devolucoes_pendentes = {}
+        self._em_devolucao = set()
+        self._travas_usuarios = self.biblioteca._travas_usuarios
+        self._travas_itens = self.biblioteca._travas_itens
+
+    # --- catálogo e usuários ---
+
+    def adicionar_item_catalogo(self, item):
+        self.biblioteca.adicionar_item_catalogo(item)
+
+    def importar_itens(self, itens):
+        return self.biblioteca.importar_itens(itens)
+
+    def remover_item_catalogo(self, titulo):
+        return self.biblioteca.remover_item_catalogo(titulo)
+
+    def adicionar_exemplares(self, titulo, quantidade):
+        return self.biblioteca.adicionar_exemplares(titulo, quantidade)
+
+    def registrar_usuario(self, usuario):
+        self.biblioteca.registrar_usuario(usuario)
+
+    def importar_usuarios(self, usuarios):
+        return self.biblioteca.importar_usuarios(usuarios)
+
+    def buscar_item_por_titulo(self, titulo):
+        return self.biblioteca.buscar_item_por_titulo(titulo)
+
+    def buscar_usuario_por_matricula(self, matricula):
+        return self.biblioteca.buscar_usuario_por_matricula(matricula)
+
+    def sugerir_titulos(self, titulo, limite):
+        return self.biblioteca.sugerir_titulos(titulo, limite)
+
+    def listar_itens(self):
+        return list(self.biblioteca.catalogo)
+
+    def listar_usuarios(self):
+        return list(self.biblioteca.usuarios_registrados)
+
+    def listar_emprestimos_ativos(self):
+        return list(self.biblioteca.iterar_emprestimos_ativos())
+
+    def emprestimos_atrasados(self, data_referencia):
+        return self.biblioteca.emprestimos_atrasados(data_referencia)
+
+    def tamanhos(self):
+        return len(self.biblioteca.catalogo), len(self.biblioteca.usuarios_registrados), len(self.biblioteca._emprestimos)
+
+    # --- empréstimo, lado do item ---
+
+    def preparar_item(self, transacao, titulo, exemplar=None):
+        item = self.biblioteca.buscar_item_por_titulo(titulo)
+        if not item:
+            return False, "Item não encontrado no catálogo."
+        if not isinstance(item, ItemEmprestavel):
+            return False, "Este tipo de item não pode ser emprestado."
+        with self._travas_itens.travar(item):
+            if not item.esta_disponivel():
+                return False, f"Item '{item.get_titulo()}' não está disponível para empréstimo."
+            retirado = item.emprestar(exemplar)
+            if not retirado:
+                return False, f"Exemplar {exemplar} de '{item.get_titulo()}' não está disponível para empréstimo."
+            self._itens_pendentes[transacao] = (item, retirado)
+        return True, (item_para_registro(item), tipo_item(item), retirado)
+
+    def confirmar_item(self, transacao):
+        self._itens_pendentes.pop(transacao, None)
+
+    def abortar_item(self, transacao):
+        pendente = self._itens_pendentes.pop(transacao, None)
+        if pendente is not None:
+            item, exemplar = pendente
+            with self._travas_itens.travar(item):
+                item.devolver(exemplar)
+
+    def devolver_exemplar(self, titulo, exemplar):
+        # O item pode ter saído do catálogo enquanto estava emprestado
+        item = self.biblioteca.buscar_item_por_titulo(titulo)
+        if isinstance(item, ItemEmprestavel):
+            with self._travas_itens.travar(item):
+                item.devolver(exemplar)
+
+    def retirar_exemplar(self, titulo, exemplar):
+        # Desfaz devolver_exemplar quando a devolução não chega ao fim
+        item = self.biblioteca.buscar_item_por_titulo(titulo)
+        if isinstance(item, ItemEmprestavel):
+            with self._travas_itens.travar(item):
+                item.emprestar(exemplar)
+
+    # --- empréstimo, lado do usuário ---
+
+    def _copia_item(self, registro):
+        chave = Biblioteca._chave_titulo(registro["titulo"])
+        copia = self._copias_itens.get(chave)
+        if copia is None:
+            copia = self._copias_itens[chave] = item_de_registro(registro)
+        return copia
+
+    def preparar_usuario(self, transacao, matricula, titulo, tipo, config):
+        usuario = self.biblioteca.buscar_usuario_por_matricula(matricula)
+        if not usuario:
+            return False, "Usuário não encontrado."
+        chave = Biblioteca._chave_titulo(titulo)
+        emprestimos = self.biblioteca._emprestimos
+        with self._travas_usuarios.travar(matricula):
+            vagas = self._vagas_pendentes.get(matricula, {})
+            copia = self._copias_itens.get(chave)
+            if (copia is not None and emprestimos.buscar(matricula, copia)) or \
+                    any(chave_pendente == chave for chave_pendente, _ in vagas.values()):
+                return False, f"Usuário já possui um exemplar de '{titulo}'."
+            # Vagas reservadas por transações em andamento contam como empréstimos
+            total = emprestimos.quantidade_do_usuario(matricula) + len(vagas)
+            if total >= config.get_max_livros_por_usuario():
+                return False, f"Limite de {config.get_max_livros_por_usuario()} empréstimo(s) por usuário atingido."
+            limite_tipo = config.get_limite_por_tipo(tipo)
+            do_tipo = emprestimos.quantidade_do_usuario(matricula, tipo) + \
+                sum(1 for _, tipo_pendente in vagas.values() if tipo_pendente == tipo)
+            if limite_tipo is not None and do_tipo >= limite_tipo:
+                return False, f"Limite de {limite_tipo} empréstimo(s) do tipo '{tipo}' por usuário atingido."
+            self._vagas_pendentes.setdefault(matricula, {})[transacao] = (chave, tipo)
+            self._usuarios_pendentes[transacao] = usuario
+        return True, usuario.nome
+
+    def confirmar_usuario(self, transacao, registro_item, data_emprestimo, data_devolucao_prevista, exemplar):
+        # Tudo o que pode falhar vem antes de mexer no estado: se algo der
+        # errado, a vaga continua pendente e abortar_usuario a libera
+        usuario = self._usuarios_pendentes[transacao]
+        copia = self._copia_item(registro_item)
+        emprestimo = Emprestimo(usuario, copia, data_emprestimo, data_devolucao_prevista, exemplar)
+        with self._travas_usuarios.travar(usuario.matricula):
+            del self._usuarios_pendentes[transacao]
+            self._liberar_vaga(usuario.matricula, transacao)
+            self.biblioteca._emprestimos.adicionar(emprestimo)
+            usuario.livros_emprestados.append(copia)
+
+    def abortar_usuario(self, transacao):
+        usuario = self._usuarios_pendentes.pop(transacao, None)
+        if usuario is not None:
+            with self._travas_usuarios.travar(usuario.matricula):
+                self._liberar_vaga(usuario.matricula, transacao)
+
+    def _liberar_vaga(self, matricula, transacao):
+        vagas = self._vagas_pendentes.get(matricula)
+        if vagas is not None:
+            vagas.pop(transacao, None)
+            if not vagas:
+                del self._vagas_pendentes[matricula]
+
+    # --- devolução ---
+
+    def preparar_devolucao(self, transacao, matricula, titulo):
+        with self._travas_usuarios.travar(matricula):
+            emprestimo = self.biblioteca._emprestimos.buscar_por_titulo(matricula, titulo)
+            if not emprestimo or (matricula, emprestimo.item) in self._em_devolucao:
+                return False, "Empréstimo não encontrado ou já devolvido."
+            self._em_devolucao.add((matricula, emprestimo.item))
+            self._devolucoes_pendentes[transacao] = emprestimo
+        return True, (emprestimo.item.get_titulo(), emprestimo.exemplar)
+
+    def confirmar_devolucao(self, transacao, data_devolucao_real):
+        emprestimo = self._devolucoes_pendentes[transacao]
+        data_devolucao_real = para_data(data_devolucao_real) # Data inválida falha antes de qualquer mudança
+        usuario = emprestimo.usuario
+        with self._travas_usuarios.travar(usuario.matricula):
+            del self._devolucoes_pendentes[transacao]
+            self._em_devolucao.discard((usuario.matricula, emprestimo.item))
+            usuario.remover_livro_emprestado(emprestimo.item)
+            self.biblioteca._emprestimos.encerrar(emprestimo)
+            # A cópia do item não controla exemplares (o exemplar volta no
+            # fragmento do item), então não passa por registrar_devolucao
+            emprestimo.devolvido = True
+            return f"Item {emprestimo.item.get_titulo()} devolvido por {usuario.nome} em {data_devolucao_real}."
+
+    def abortar_devolucao(self, transacao):
+        emprestimo = self._devolucoes_pendentes.pop(transacao, None)
+        if emprestimo is not None:
+            self._em_devolucao.discard((emprestimo.usuario.matricula, emprestimo.item))
+
+    # --- item e usuário no mesmo fragmento: as duas fases numa só mensagem ---
+
+    def emprestar_local(self, transacao, matricula, titulo, data_emprestimo, data_devolucao_prevista, exemplar,
+                        config):
+        ok, resultado = self.preparar_item(transacao, titulo, exemplar)
+        if not ok:
+            if not self.biblioteca.buscar_usuario_por_matricula(matricula):
+                return False, "Usuário não encontrado."
+            return False, resultado
+        registro, tipo, retirado = resultado
+        ok, nome = self.preparar_usuario(transacao, matricula, registro["titulo"], tipo, config)
+        if not ok:
+            self.abortar_item(transacao)
+            return False, nome
+        try:
+            if data_devolucao_prevista is None:
+                data_devolucao_prevista = config.data_devolucao_padrao(tipo, data_emprestimo)
+            self.confirmar_usuario(transacao, registro, data_emprestimo, data_devolucao_prevista, retirado)
+        except Exception:
+            self.abortar_usuario(transacao)
+            self.abortar_item(transacao)
+            raise
+        self.confirmar_item(transacao)
+        return True, f"Empréstimo de '{registro['titulo']}' para '{nome}' realizado com sucesso."
+
+    def devolver_local(self, transacao, matricula, titulo, data_devolucao_real):
+        ok, resultado = self.preparar_devolucao(transacao, matricula, titulo)
+        if not ok:
+            return Recusa(resultado)
+        titulo_item, exemplar = resultado
+        self.devolver_exemplar(titulo_item, exemplar)
+        try:
+            return self.confirmar_devolucao(transacao, data_devolucao_real)
+        except Exception:
+            self.retirar_exemplar(titulo_item, exemplar)
+            self.abortar_devolucao(transacao)
+            raise
+
+
+def _atender(fragmento, conexao, parar):
+    try:
+        while True:
+            try:
+                operacao, argumentos = conexao.recv()
+            except (EOFError, OSError):
+                return
+            if operacao == "encerrar":
+                parar.set()
+                conexao.send(("ok", None))
+                return
+            try:
+                resposta = ("ok", getattr(fragmento, operacao)(*argumentos))
+            except Exception as e:
+                # Qualquer falha vira resposta: o roteador desfaz a transação
+                # em vez de esperar por uma resposta que não vem
+                resposta = ("erro", type(e).__name__, str(e))
+            try:
+                conexao.send(resposta)
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                # Resultado que não pôde ser serializado
+                conexao.send(("erro", type(e).__name__, str(e)))
+    finally:
+        conexao.close()
+
+
+def executar_fragmento(indice, endereco, chave, config, pronto):
+    # Corpo do processo de trabalho: uma thread por conexão do roteador
+    fragmento = Fragmento(indice, config)
+    parar = threading.Event()
+    with Listener(endereco, family="AF_UNIX", authkey=chave) as ouvinte:
+        pronto.set()
+        while not parar.is_set():
+            try:
+                conexao = ouvinte.accept()
+            except OSError:
+                continue
+            threading.Thread(target=_atender, args=(fragmento, conexao, parar), daemon=True).start()
+
+
+class BibliotecaFragmentada:
+    # Roteador com a interface de Biblioteca para um acervo dividido entre
+    # processos: itens pelo hash do título, usuários pelo hash da matrícula.
+    # Cada thread usa as suas próprias conexões com os fragmentos, então
+    # chamadas de threads (ou processos) diferentes andam em paralelo.
+    #
+    # Reservas, busca textual e persistência continuam só na Biblioteca de
+    # um processo.
+
+    def __init__(self, enderecos, chave, config=None):
+        self.nome = f"Biblioteca em {len(enderecos)} fragmento(s)"
+        self.config = config if config is not None else ConfiguracaoBiblioteca()
+        self.enderecos = list(enderecos)
+        self.chave = chave
+        self._local = threading.local()
+        self._conexoes = []
+        self._trava = threading.Lock()
+        self._processos = []
+        self._diretorio = None
+
+    @classmethod
+    def iniciar(cls, quantidade, config=None):
+        if quantidade < 1:
+            raise ValueError("Quantidade de fragmentos inválida.")
+        config = config if config is not None else ConfiguracaoBiblioteca()
+        diretorio = tempfile.mkdtemp(prefix="fragmentos-")
+        chave = secrets.token_bytes(16)
+        enderecos = [os.path.join(diretorio, f"fragmento-{indice}.sock") for indice in range(quantidade)]
+        processos = []
+        for indice, endereco in enumerate(enderecos):
+            pronto = multiprocessing.Event()
+            processo = multiprocessing.Process(target=executar_fragmento, daemon=True,
+                                               args=(indice, endereco, chave, config, pronto))
+            processo.start()
+            if not pronto.wait(30):
+                raise RuntimeError(f"Fragmento {indice} não respondeu.")
+            processos.append(processo)
+        biblioteca = cls(enderecos, chave, config)
+        biblioteca._processos = processos
+        biblioteca._diretorio = diretorio
+        return biblioteca
+
+    @property
+    def quantidade_fragmentos(self):
+        return len(self.enderecos)
+
+    def _conexao(self, indice):
+        conexoes = getattr(self._local, "conexoes", None)
+        if conexoes is None:
+            conexoes = self._local.conexoes = [None] * len(self.enderecos)
+        conexao = conexoes[indice]
+        if conexao is None:
+            conexao = conexoes[indice] = Client(self.enderecos[indice], family="AF_UNIX", authkey=self.chave)
+            with self._trava:
+                self._conexoes.append(conexao)
+        return conexao
+
+    @staticmethod
+    def _resposta(conexao):
+        situacao, *resultado = conexao.recv()
+        if situacao == "erro":
+            tipo, mensagem = resultado
+            if tipo in ERROS_FRAGMENTO:
+                raise ERROS_FRAGMENTO[tipo](mensagem)
+            raise RuntimeError(f"{tipo}: {mensagem}")
+        return resultado[0]
+
+    def _chamar(self, indice, operacao, *argumentos):
+        conexao = self._conexao(indice)
+        conexao.send((operacao, argumentos))
+        return self._resposta(conexao)
+
+    def _espalhar(self, operacao, *argumentos):
+        # Envia a todos antes de esperar: os fragmentos trabalham ao mesmo tempo
+        conexoes = [self._conexao(indice) for indice in range(len(self.enderecos))]
+        for conexao in conexoes:
+            conexao.send((operacao, argumentos))
+        return [self._resposta(conexao) for conexao in conexoes]
+
+    def _desfazer(self, indice, operacao, *argumentos):
+        # Compensação depois de uma falha: se ela também falhar (fragmento
+        # fora do ar), o erro original é o que sobe
+        try:
+            self._chamar(indice, operacao, *argumentos)
+        except Exception:
+            pass
+
+    def _fragmento_item(self, titulo):
+        return fragmento_de(Biblioteca._chave_titulo(titulo), len(self.enderecos))
+
+    def _fragmento_usuario(self, matricula):
+        return fragmento_de(matricula, len(self.enderecos))
+
+    def fechar(self):
+        with self._trava:
+            conexoes, self._conexoes = self._conexoes, []
+        for conexao in conexoes:
+            conexao.close()
+        self._local = threading.local()
+
+    def encerrar(self):
+        # Para os processos iniciados por iniciar()
+        if self._processos:
+            for indice in range(len(self.enderecos)):
+                try:
+                    self._chamar(indice, "encerrar")
+                    # Uma conexão nova acorda o accept() para ver o pedido
+                    Client(self.enderecos[indice], family="AF_UNIX", authkey=self.chave).close()
+                except (OSError, EOFError):
+                    pass
+        self.fechar()
+        for processo in self._processos:
+            processo.join(5)
+            if processo.is_alive():
+                processo.terminate()
+        self._processos = []
+        if self._diretorio is not None:
+            shutil.rmtree(self._diretorio, ignore_errors=True)
+            self._diretorio = None
+
+    # --- catálogo e usuários ---
+
+    @property
+    def catalogo(self):
+        return [item for itens in self._espalhar("listar_itens") for item in itens]
+
+    @property
+    def usuarios_registrados(self):
+        return [usuario for usuarios in self._espalhar("listar_usuarios") for usuario in usuarios]
+
+    @property
+    def emprestimos_ativos(self):
+        emprestimos = [emprestimo for parte in self._espalhar("listar_emprestimos_ativos") for emprestimo in parte]
+        emprestimos.sort(key=lambda emprestimo: emprestimo.data_devolucao_prevista)
+        return emprestimos
+
+    def emprestimos_atrasados(self, data_referencia):
+        atrasados = [emprestimo for parte in self._espalhar("emprestimos_atrasados", para_data(data_referencia))
+                     for emprestimo in parte]
+        atrasados.sort(key=lambda emprestimo: emprestimo.data_devolucao_prevista)
+        return atrasados
+
+    def adicionar_item_catalogo(self, item):
+        if not isinstance(item, ItemBibliografico):
+            raise TypeError("Só é possível adicionar Itens Bibliográficos ao catálogo.")
+        self._chamar(self._fragmento_item(item.get_titulo()), "adicionar_item_catalogo", item)
+
+    def remover_item_catalogo(self, item_titulo):
+        return self._chamar(self._fragmento_item(item_titulo), "remover_item_catalogo", item_titulo)
+
+    def adicionar_exemplares(self, titulo_item, quantidade=1):
+        return self._chamar(self._fragmento_item(titulo_item), "adicionar_exemplares", titulo_item, quantidade)
+
+    def registrar_usuario(self, usuario):
+        if not isinstance(usuario, Usuario):
+            raise TypeError("Só é possível registrar Usuários.")
+        self._chamar(self._fragmento_usuario(usuario.matricula), "registrar_usuario", usuario)
+
+    def _importar(self, registros, converter, tipo, fragmento_de_registro, operacao):
+        relatorio = RelatorioImportacao()
+        partes = [[] for _ in self.enderecos]
+        numeros = [[] for _ in self.enderecos]
+        for numero, registro in enumerate(registros, start=1):
+            try:
+                objeto = registro if isinstance(registro, tipo) else converter(registro)
+            except (ValueError, TypeError, AttributeError) as e:
+                relatorio.registrar_erro(numero, str(e))
+                continue
+            indice = fragmento_de_registro(objeto)
+            partes[indice].append(objeto)
+            numeros[indice].append(numero)
+        for indice, parte in enumerate(partes):
+            if not parte:
+                continue
+            parcial = self._chamar(indice, operacao, parte)
+            relatorio.importados += parcial.importados
+            # Os números de registro do fragmento são posições na sua parte
+            relatorio.erros.extend((numeros[indice][numero - 1], mensagem) for numero, mensagem in parcial.erros)
+        relatorio.erros.sort()
+        return relatorio
+
+    def importar_itens(self, registros):
+        return self._importar(registros, item_de_registro, ItemBibliografico,
+                              lambda item: self._fragmento_item(item.get_titulo()), "importar_itens")
+
+    def importar_usuarios(self, registros):
+        return self._importar(registros, usuario_de_registro, Usuario,
+                              lambda usuario: self._fragmento_usuario(usuario.matricula), "importar_usuarios")
+
+    def buscar_item_por_titulo(self, titulo):
+        return self._chamar(self._fragmento_item(titulo), "buscar_item_por_titulo", titulo)
+
+    def buscar_usuario_por_matricula(self, matricula):
+        return self._chamar(self._fragmento_usuario(matricula), "buscar_usuario_por_matricula", matricula)
+
+    def sugerir_titulos(self, titulo, limite=5):
+        # Junta as sugestões de cada fragmento, sem repetir títulos
+        sugestoes = []
+        for parte in self._espalhar("sugerir_titulos", titulo, limite):
+            sugestoes.extend(sugestao for sugestao in parte if sugestao not in sugestoes)
+        return sugestoes[:limite]
+
+    # --- empréstimos ---
+
+    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista=None,
+                            exemplar=None):
+        data_emprestimo = para_data(data_emprestimo)
+        if data_devolucao_prevista is not None:
+            data_devolucao_prevista = para_data(data_devolucao_prevista)
+        transacao = uuid.uuid4().hex
+        fragmento_item = self._fragmento_item(titulo_item)
+        fragmento_usuario = self._fragmento_usuario(matricula_usuario)
+        if fragmento_item == fragmento_usuario:
+            ok, mensagem = self._chamar(fragmento_item, "emprestar_local", transacao, matricula_usuario, titulo_item,
+                                        data_emprestimo, data_devolucao_prevista, exemplar, self.config)
+            return mensagem if ok else Recusa(mensagem)
+
+        # Fase 1: o fragmento do item separa um exemplar e o do usuário, uma vaga
+        ok, resultado = self._chamar(fragmento_item, "preparar_item", transacao, titulo_item, exemplar)
+        if not ok:
+            if not self.buscar_usuario_por_matricula(matricula_usuario):
+                return Recusa("Usuário não encontrado.")
+            return Recusa(resultado)
+        registro, tipo, retirado = resultado
+        try:
+            # Limites lidos da configuração atual do roteador
+            ok, nome = self._chamar(fragmento_usuario, "preparar_usuario", transacao, matricula_usuario,
+                                    registro["titulo"], tipo, self.config)
+        except Exception:
+            self._desfazer(fragmento_item, "abortar_item", transacao)
+            raise
+        if not ok:
+            self._chamar(fragmento_item, "abortar_item", transacao)
+            return Recusa(nome)
+        # Fase 2: os dois lados aceitaram. O usuário confirma primeiro; se
+        # falhar, os dois lados ainda estão só reservados e são desfeitos.
+        # Depois disso o exemplar já está fora da estante, e confirmar_item
+        # só descarta a reserva.
+        try:
+            if data_devolucao_prevista is None:
+                data_devolucao_prevista = self.config.data_devolucao_padrao(tipo, data_emprestimo)
+            self._chamar(fragmento_usuario, "confirmar_usuario", transacao, registro, data_emprestimo,
+                         data_devolucao_prevista, retirado)
+        except Exception:
+            self._desfazer(fragmento_usuario, "abortar_usuario", transacao)
+            self._desfazer(fragmento_item, "abortar_item", transacao)
+            raise
+        self._chamar(fragmento_item, "confirmar_item", transacao)
+        return f"Empréstimo de '{registro['titulo']}' para '{nome}' realizado com sucesso."
+
+    def registrar_devolucao_item(self, matricula_usuario, titulo_item, data_devolucao_real):
+        transacao = uuid.uuid4().hex
+        fragmento_item = self._fragmento_item(titulo_item)
+        fragmento_usuario = self._fragmento_usuario(matricula_usuario)
+        if fragmento_item == fragmento_usuario:
+            return self._chamar(fragmento_usuario, "devolver_local", transacao, matricula_usuario, titulo_item,
+                                data_devolucao_real)
+
+        ok, resultado = self._chamar(fragmento_usuario, "preparar_devolucao", transacao, matricula_usuario,
+                                     titulo_item)
+        if not ok:
+            return Recusa(resultado)
+        titulo, exemplar = resultado
+        try:
+            self._chamar(fragmento_item, "devolver_exemplar", titulo, exemplar)
+        except Exception:
+            self._desfazer(fragmento_usuario, "abortar_devolucao", transacao)
+            raise
+        try:
+            return self._chamar(fragmento_usuario, "confirmar_devolucao", transacao, data_devolucao_real)
+        except Exception:
+            # O empréstimo continua ativo: o exemplar volta a ficar com ele
+            self._desfazer(fragmento_item, "retirar_exemplar", titulo, exemplar)
+            self._desfazer(fragmento_usuario, "abortar_devolucao", transacao)
+            raise
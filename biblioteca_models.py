@@ -1,4 +1,22 @@
+import bisect
+import csv
+import heapq
+import itertools
+import json
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import eventos
+from indice_busca import IndiceBusca, IndiceTrigramas
+
 class Pessoa:
+    # __slots__ em todo o modelo: sem __dict__ por instância, o que pesa em
+    # catálogos e cadastros com milhões de objetos
+    __slots__ = ("nome", "email")
+
     def __init__(self, nome, email):
         if not nome or not isinstance(nome, str):
             raise ValueError("Nome inválido")
@@ -14,45 +32,79 @@ class Pessoa:
         return {"nome": self.nome, "email": self.email}
 
 class Autor(Pessoa):
+    __slots__ = ("biografia", "_livros_publicados")
+
     def __init__(self, nome, email, biografia=""):
         super().__init__(nome, email)
         self.biografia = biografia
-        self.livros_publicados = []
+        self._livros_publicados = None # Lista criada só quando necessária
+
+    @property
+    def livros_publicados(self):
+        if self._livros_publicados is None:
+            self._livros_publicados = []
+        return self._livros_publicados
 
     def adicionar_livro_publicado(self, livro_titulo):
         if not livro_titulo or not isinstance(livro_titulo, str):
             raise ValueError("Título do livro inválido")
         self.livros_publicados.append(livro_titulo)
 
+    def remover_livro_publicado(self, livro_titulo):
+        publicados = self._livros_publicados
+        if publicados and livro_titulo in publicados:
+            publicados.remove(livro_titulo)
+            if not publicados:
+                self._livros_publicados = None
+
     def get_biografia(self):
         return self.biografia
 
 class Usuario(Pessoa):
+    __slots__ = ("matricula", "_livros_emprestados")
+
     def __init__(self, nome, email, matricula):
         super().__init__(nome, email)
         if not matricula or not isinstance(matricula, str):
             raise ValueError("Matrícula inválida")
         self.matricula = matricula
-        self.livros_emprestados = []
+        self._livros_emprestados = None # Lista criada só no primeiro empréstimo
+
+    @property
+    def livros_emprestados(self):
+        if self._livros_emprestados is None:
+            self._livros_emprestados = []
+        return self._livros_emprestados
 
     def __str__(self):
         return f"Usuário: {self.nome}, Matrícula: {self.matricula}"
 
-    def pegar_livro_emprestado(self, livro):
-        if livro.esta_disponivel():
+    def pegar_livro_emprestado(self, livro, exemplar=None):
+        # Devolve o número do exemplar retirado (ou False se não houver)
+        exemplar = livro.emprestar(exemplar)
+        if exemplar:
             self.livros_emprestados.append(livro)
-            livro.emprestar()
+            return exemplar
+        return False
+
+    def remover_livro_emprestado(self, livro):
+        emprestados = self._livros_emprestados
+        if emprestados and livro in emprestados:
+            emprestados.remove(livro)
+            if not emprestados:
+                self._livros_emprestados = None
             return True
         return False
 
-    def devolver_livro(self, livro):
-        if livro in self.livros_emprestados:
-            self.livros_emprestados.remove(livro)
-            livro.devolver()
+    def devolver_livro(self, livro, exemplar=None):
+        if self.remover_livro_emprestado(livro):
+            livro.devolver(exemplar)
             return True
         return False
 
 class ItemBibliografico:
+    __slots__ = ("titulo", "ano_publicacao")
+
     def __init__(self, titulo, ano_publicacao):
         if not titulo or not isinstance(titulo, str):
             raise ValueError("Título inválido")
@@ -67,9 +119,81 @@ class ItemBibliografico:
     def get_ano_publicacao(self):
         return self.ano_publicacao
 
-class Livro(ItemBibliografico):
-    def __init__(self, titulo, ano_publicacao, isbn, autor, genero="Não especificado"):
+    def get_campos_busca(self):
+        return {"titulo": self.titulo}
+
+class ItemEmprestavel(ItemBibliografico):
+    # Um registro bibliográfico com vários exemplares físicos, numerados a
+    # partir de 1. Os exemplares livres ficam numa pilha, criada só no
+    # primeiro empréstimo: retirar e devolver um exemplar custa O(1).
+    __slots__ = ("_exemplares", "_livres", "_emprestados")
+
+    def __init__(self, titulo, ano_publicacao, exemplares=1):
         super().__init__(titulo, ano_publicacao)
+        if not isinstance(exemplares, int) or exemplares < 1:
+            raise ValueError("Quantidade de exemplares inválida")
+        self._exemplares = exemplares
+        # None nos dois: todos os exemplares estão livres. Senão, a pilha dos
+        # livres e o conjunto dos emprestados, para conferir uma devolução em O(1)
+        self._livres = None
+        self._emprestados = None
+
+    def get_total_exemplares(self):
+        return self._exemplares
+
+    def get_exemplares_disponiveis(self):
+        return self._exemplares if self._livres is None else len(self._livres)
+
+    def esta_disponivel(self):
+        return self._livres is None or bool(self._livres)
+
+    def emprestar(self, exemplar=None):
+        if self._livres is None:
+            self._livres = list(range(self._exemplares, 0, -1))
+            self._emprestados = set()
+        livres = self._livres
+        if exemplar is None:
+            if not livres:
+                return None
+            exemplar = livres.pop()
+        else:
+            # Exemplar escolhido pelo balcão (ou reproduzido do diário)
+            if (not isinstance(exemplar, int) or not 1 <= exemplar <= self._exemplares
+                    or exemplar in self._emprestados):
+                return None
+            livres.remove(exemplar)
+        self._emprestados.add(exemplar)
+        return exemplar
+
+    def devolver(self, exemplar=None):
+        emprestados = self._emprestados
+        if exemplar is None:
+            if not emprestados:
+                return
+            exemplar = emprestados.pop()
+        else:
+            if not isinstance(exemplar, int) or not 1 <= exemplar <= self._exemplares:
+                raise ValueError("Exemplar inválido")
+            if not emprestados or exemplar not in emprestados:
+                raise ValueError(f"Exemplar {exemplar} não está emprestado")
+            emprestados.remove(exemplar)
+        self._livres.append(exemplar)
+        if not emprestados:
+            self._livres = None
+            self._emprestados = None
+
+    def adicionar_exemplares(self, quantidade=1):
+        if not isinstance(quantidade, int) or quantidade < 1:
+            raise ValueError("Quantidade de exemplares inválida")
+        if self._livres is not None:
+            self._livres.extend(range(self._exemplares + quantidade, self._exemplares, -1))
+        self._exemplares += quantidade
+
+class Livro(ItemEmprestavel):
+    __slots__ = ("isbn", "autor", "genero")
+
+    def __init__(self, titulo, ano_publicacao, isbn, autor, genero="Não especificado", exemplares=1):
+        super().__init__(titulo, ano_publicacao, exemplares)
         if not isbn or not isinstance(isbn, str): # Simplificado, ISBN tem validação mais complexa
             raise ValueError("ISBN inválido")
         if not isinstance(autor, Autor):
@@ -77,27 +201,21 @@ class Livro(ItemBibliografico):
         self.isbn = isbn
         self.autor = autor
         self.genero = genero
-        self._disponivel = True
 
     def __str__(self):
         return f"'{self.titulo}' por {self.autor.nome}, ISBN: {self.isbn}"
 
-    def esta_disponivel(self):
-        return self._disponivel
-
-    def emprestar(self):
-        if self._disponivel:
-            self._disponivel = False
-            return True
-        return False
-
-    def devolver(self):
-        self._disponivel = True
-
     def get_autor_nome(self):
         return self.autor.nome
 
+    def get_campos_busca(self):
+        campos = super().get_campos_busca()
+        campos.update(autor=self.autor.nome, genero=self.genero, isbn=self.isbn)
+        return campos
+
 class Revista(ItemBibliografico):
+    __slots__ = ("edicao", "editora")
+
     def __init__(self, titulo, ano_publicacao, edicao, editora):
         super().__init__(titulo, ano_publicacao)
         self.edicao = edicao
@@ -109,9 +227,16 @@ class Revista(ItemBibliografico):
     def get_editora(self):
         return self.editora
 
-class DVD(ItemBibliografico):
-    def __init__(self, titulo, ano_publicacao, duracao_minutos, diretor):
-        super().__init__(titulo, ano_publicacao)
+    def get_campos_busca(self):
+        campos = super().get_campos_busca()
+        campos["editora"] = self.editora
+        return campos
+
+class DVD(ItemEmprestavel):
+    __slots__ = ("duracao_minutos", "diretor")
+
+    def __init__(self, titulo, ano_publicacao, duracao_minutos, diretor, exemplares=1):
+        super().__init__(titulo, ano_publicacao, exemplares)
         if not isinstance(duracao_minutos, int) or duracao_minutos <=0:
             raise ValueError("Duração inválida")
         self.duracao_minutos = duracao_minutos
@@ -120,107 +245,1068 @@ class DVD(ItemBibliografico):
     def get_duracao(self):
         return self.duracao_minutos
 
+    def get_campos_busca(self):
+        campos = super().get_campos_busca()
+        campos["diretor"] = self.diretor
+        return campos
+
+def para_data(valor):
+    # Aceita date, datetime ou texto ISO ("2023-03-10")
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return date.fromisoformat(valor.strip())
+        except ValueError:
+            pass
+    raise ValueError("Data inválida")
+
 class Emprestimo:
-    def __init__(self, usuario, item, data_emprestimo, data_devolucao_prevista):
+    __slots__ = ("usuario", "item", "data_emprestimo", "data_devolucao_prevista", "devolvido", "exemplar",
+                 "sequencia")
+
+    def __init__(self, usuario, item, data_emprestimo, data_devolucao_prevista, exemplar=None):
         if not isinstance(usuario, Usuario):
             raise TypeError("Usuário inválido")
-        if not isinstance(item, (Livro, DVD)): # Revistas podem não ser emprestáveis
+        if not isinstance(item, ItemEmprestavel): # Revistas podem não ser emprestáveis
             raise TypeError("Item inválido para empréstimo")
         self.usuario = usuario
         self.item = item
-        self.data_emprestimo = data_emprestimo
-        self.data_devolucao_prevista = data_devolucao_prevista
+        self.data_emprestimo = para_data(data_emprestimo)
+        self.data_devolucao_prevista = para_data(data_devolucao_prevista)
         self.devolvido = False
+        self.exemplar = exemplar
+        self.sequencia = None # Atribuída pelo registro de empréstimos; desempata a ordem por vencimento
 
     def registrar_devolucao(self, data_devolucao_real):
         self.devolvido = True
-        self.item.devolver() 
+        self.item.devolver(self.exemplar)
         return f"Item {self.item.get_titulo()} devolvido por {self.usuario.nome} em {data_devolucao_real}."
 
     def esta_atrasado(self, data_atual):
-        return not self.devolvido and data_atual > self.data_devolucao_prevista
+        return not self.devolvido and para_data(data_atual) > self.data_devolucao_prevista
+
+class Reserva:
+    __slots__ = ("usuario", "item", "data_reserva", "situacao", "exemplar", "data_limite_retirada")
+
+    AGUARDANDO = "aguardando"
+    SEPARADA = "separada" # exemplar reservado na estante, à espera da retirada
+    ATENDIDA = "atendida"
+    EXPIRADA = "expirada"
+    CANCELADA = "cancelada"
+
+    def __init__(self, usuario, item, data_reserva):
+        if not isinstance(usuario, Usuario):
+            raise TypeError("Usuário inválido")
+        if not isinstance(item, ItemEmprestavel):
+            raise TypeError("Item inválido para reserva")
+        self.usuario = usuario
+        self.item = item
+        self.data_reserva = para_data(data_reserva)
+        self.situacao = Reserva.AGUARDANDO
+        self.exemplar = None
+        self.data_limite_retirada = None
+
+    def __str__(self):
+        return f"Reserva de '{self.item.get_titulo()}' para {self.usuario.nome} ({self.situacao})"
+
+    def esta_ativa(self):
+        return self.situacao in (Reserva.AGUARDANDO, Reserva.SEPARADA)
+
+def _inteiro(valor):
+    # Valores vindos de CSV chegam como texto; o que não for número segue
+    # como está para que a validação das próprias classes o rejeite.
+    if isinstance(valor, str):
+        try:
+            return int(valor.strip())
+        except ValueError:
+            return valor
+    return valor
+
+def item_de_registro(registro):
+    tipo = str(registro.get("tipo", "")).strip().lower()
+    titulo = registro.get("titulo")
+    ano = _inteiro(registro.get("ano_publicacao"))
+    if tipo == "livro":
+        autor = Autor(registro.get("autor_nome"), registro.get("autor_email"),
+                      registro.get("autor_biografia") or "")
+        return Livro(titulo, ano, registro.get("isbn"), autor,
+                     registro.get("genero") or "Não especificado", _inteiro(registro.get("exemplares") or 1))
+    if tipo == "revista":
+        return Revista(titulo, ano, registro.get("edicao"), registro.get("editora"))
+    if tipo == "dvd":
+        return DVD(titulo, ano, _inteiro(registro.get("duracao_minutos")), registro.get("diretor"),
+                   _inteiro(registro.get("exemplares") or 1))
+    if tipo == "item":
+        return ItemBibliografico(titulo, ano)
+    raise ValueError(f"Tipo de item inválido: {tipo or 'não informado'}")
+
+def usuario_de_registro(registro):
+    return Usuario(registro.get("nome"), registro.get("email"), registro.get("matricula"))
+
+def tipo_item(item):
+    # Nome do tipo usado nos registros e nas regras de empréstimo
+    if isinstance(item, Livro):
+        return "livro"
+    if isinstance(item, Revista):
+        return "revista"
+    if isinstance(item, DVD):
+        return "dvd"
+    return "item"
+
+def item_para_registro(item):
+    registro = {"tipo": tipo_item(item), "titulo": item.titulo, "ano_publicacao": item.ano_publicacao}
+    if isinstance(item, Livro):
+        registro.update(isbn=item.isbn, genero=item.genero,
+                        autor_nome=item.autor.nome, autor_email=item.autor.email,
+                        autor_biografia=item.autor.biografia)
+    elif isinstance(item, Revista):
+        registro.update(edicao=item.edicao, editora=item.editora)
+    elif isinstance(item, DVD):
+        registro.update(duracao_minutos=item.duracao_minutos, diretor=item.diretor)
+    if isinstance(item, ItemEmprestavel):
+        registro["exemplares"] = item.get_total_exemplares()
+    return registro
+
+def usuario_para_registro(usuario):
+    return {"nome": usuario.nome, "email": usuario.email, "matricula": usuario.matricula}
+
+def item_para_registro_com_estado(item):
+    registro = item_para_registro(item)
+    if isinstance(item, ItemEmprestavel):
+        registro["disponivel"] = item.esta_disponivel()
+        registro["exemplares_disponiveis"] = item.get_exemplares_disponiveis()
+    return registro
+
+def item_de_registro_com_estado(registro):
+    item = item_de_registro(registro)
+    if isinstance(item, ItemEmprestavel):
+        disponiveis = registro.get("exemplares_disponiveis")
+        if disponiveis is None:
+            disponiveis = item.get_total_exemplares() if registro.get("disponivel", True) else 0
+        for _ in range(item.get_total_exemplares() - disponiveis):
+            item.emprestar()
+    return item
+
+def ler_registros_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8") as arquivo:
+        yield from csv.DictReader(arquivo)
+
+def ler_registros_jsonl(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                yield json.loads(linha)
+
+class Recusa(str):
+    # Mensagem de uma operação que as regras da biblioteca recusaram
+    # (usuário ou item inexistente, limite atingido, exemplar indisponível).
+    # Continua sendo a mesma string; quem precisa distinguir usa isinstance.
+    __slots__ = ()
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.importados = 0
+        self.erros = []
+
+    def registrar_erro(self, numero_registro, mensagem):
+        self.erros.append((numero_registro, mensagem))
+
+    def __str__(self):
+        return f"{self.importados} registro(s) importado(s), {len(self.erros)} erro(s)."
+
+class IndiceVencimentos:
+    # Empréstimos agrupados por data prevista de devolução, com as datas
+    # distintas em ordem: consultas por intervalo visitam só as datas do
+    # intervalo em vez de todos os empréstimos. Dentro de uma data, a ordem
+    # é a da sequência dada a cada empréstimo ao entrar no índice, que não
+    # muda com outras inclusões e remoções.
+    def __init__(self):
+        self._por_data = {} # data -> {empréstimo: None}, em ordem de sequência
+        self._datas = []
+        self._sequencia = itertools.count(1)
+        self._trava = threading.Lock()
+
+    def adicionar(self, emprestimo):
+        data = emprestimo.data_devolucao_prevista
+        with self._trava:
+            # Numerado com a trava: a ordem dos grupos é a das sequências
+            emprestimo.sequencia = next(self._sequencia)
+            grupo = self._por_data.get(data)
+            if grupo is None:
+                grupo = self._por_data[data] = {}
+                bisect.insort(self._datas, data)
+            grupo[emprestimo] = None
+
+    def remover(self, emprestimo):
+        data = emprestimo.data_devolucao_prevista
+        with self._trava:
+            grupo = self._por_data[data]
+            grupo.pop(emprestimo, None)
+            if not grupo:
+                del self._por_data[data]
+                del self._datas[bisect.bisect_left(self._datas, data)]
+
+    def iterar(self, inicio=None, fim=None, sequencia_inicial=None):
+        # Como entre(), mas copia um grupo (uma data) por vez: a memória não
+        # cresce com o total de empréstimos. Com sequencia_inicial, os
+        # empréstimos da data inicio anteriores a ela são pulados.
+        data = inicio
+        primeira = True
+        while True:
+            with self._trava:
+                if data is None:
+                    posicao = 0
+                elif primeira:
+                    posicao = bisect.bisect_left(self._datas, data)
+                else:
+                    posicao = bisect.bisect_right(self._datas, data)
+                if posicao >= len(self._datas) or (fim is not None and self._datas[posicao] > fim):
+                    return
+                pular = primeira and sequencia_inicial is not None and self._datas[posicao] == inicio
+                data = self._datas[posicao]
+                if pular:
+                    grupo = [emprestimo for emprestimo in self._por_data[data]
+                             if emprestimo.sequencia >= sequencia_inicial]
+                else:
+                    grupo = list(self._por_data[data])
+            primeira = False
+            yield from grupo
+
+    def entre(self, inicio=None, fim=None):
+        # Empréstimos com vencimento em [inicio, fim], em ordem de vencimento
+        with self._trava:
+            posicao_inicio = 0 if inicio is None else bisect.bisect_left(self._datas, inicio)
+            posicao_fim = len(self._datas) if fim is None else bisect.bisect_right(self._datas, fim)
+            return [emprestimo for data in self._datas[posicao_inicio:posicao_fim]
+                    for emprestimo in self._por_data[data]]
+
+class RegistroEmprestimos:
+    def __init__(self):
+        self._por_chave = {}
+        self._por_usuario = {}
+        self._por_item = {}
+        # Contadores de empréstimos abertos por (matrícula, tipo de item); o
+        # total do usuário é o tamanho de _por_usuario[matricula].
+        self._por_usuario_tipo = {}
+        self._vencimentos = IndiceVencimentos()
+        self.historico = []
+
+    def __len__(self):
+        return len(self._por_chave)
+
+    def __iter__(self):
+        return iter(list(self._por_chave.values()))
+
+    def adicionar(self, emprestimo):
+        matricula = emprestimo.usuario.matricula
+        item = emprestimo.item
+        chave = (matricula, item)
+        if chave in self._por_chave:
+            raise ValueError("Empréstimo já registrado para este usuário e item.")
+        self._por_chave[chave] = emprestimo
+        self._por_usuario.setdefault(matricula, {})[item] = emprestimo
+        self._por_item.setdefault(item, {})[matricula] = emprestimo
+        chave_tipo = (matricula, tipo_item(item))
+        self._por_usuario_tipo[chave_tipo] = self._por_usuario_tipo.get(chave_tipo, 0) + 1
+        self._vencimentos.adicionar(emprestimo)
+
+    def buscar(self, matricula, item):
+        return self._por_chave.get((matricula, item))
+
+    def buscar_por_titulo(self, matricula, titulo):
+        # Mesma regra de buscar_item_por_titulo: sem diferenciar maiúsculas
+        chave = Biblioteca._chave_titulo(titulo)
+        for item, emprestimo in self._por_usuario.get(matricula, {}).items():
+            if Biblioteca._chave_titulo(item.get_titulo()) == chave:
+                return emprestimo
+        return None
+
+    def do_usuario(self, matricula):
+        return list(self._por_usuario.get(matricula, {}).values())
+
+    def quantidade_do_usuario(self, matricula, tipo=None):
+        if tipo is None:
+            return len(self._por_usuario.get(matricula, ()))
+        return self._por_usuario_tipo.get((matricula, tipo), 0)
+
+    def do_item(self, item):
+        return list(self._por_item.get(item, {}).values())
+
+    def encerrar(self, emprestimo):
+        matricula = emprestimo.usuario.matricula
+        item = emprestimo.item
+        del self._por_chave[(matricula, item)]
+        emprestimos_usuario = self._por_usuario[matricula]
+        del emprestimos_usuario[item]
+        if not emprestimos_usuario:
+            del self._por_usuario[matricula]
+        emprestimos_item = self._por_item[item]
+        del emprestimos_item[matricula]
+        if not emprestimos_item:
+            del self._por_item[item]
+        chave_tipo = (matricula, tipo_item(item))
+        restantes = self._por_usuario_tipo[chave_tipo] - 1
+        if restantes:
+            self._por_usuario_tipo[chave_tipo] = restantes
+        else:
+            del self._por_usuario_tipo[chave_tipo]
+        self._vencimentos.remover(emprestimo)
+        self.historico.append(emprestimo)
+
+    def vencendo_entre(self, inicio=None, fim=None):
+        return self._vencimentos.entre(inicio, fim)
+
+    def iterar_por_vencimento(self, inicio=None, fim=None, sequencia_inicial=None):
+        return self._vencimentos.iterar(inicio, fim, sequencia_inicial)
+
+class RegistroReservas:
+    # Uma fila FIFO por item. Reservas canceladas ou atendidas fora de ordem
+    # saem da fila só quando chegam à frente, então atender a próxima custa
+    # O(1) amortizado. Os prazos de retirada ficam num heap: processar as
+    # expirações visita só as reservas vencidas.
+    def __init__(self):
+        self._filas = {}
+        self._ativas = {}
+        self._expiracoes = []
+        self._contador = itertools.count()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._ativas)
+
+    def __iter__(self):
+        # Reservas ativas, na ordem das filas
+        with self._trava:
+            separadas = [reserva for reserva in self._ativas.values() if reserva.situacao == Reserva.SEPARADA]
+            filas = [list(fila) for fila in self._filas.values()]
+        aguardando = [reserva for fila in filas for reserva in fila if reserva.situacao == Reserva.AGUARDANDO]
+        return iter(separadas + aguardando)
+
+    def adicionar(self, reserva):
+        chave = (reserva.usuario.matricula, reserva.item)
+        with self._trava:
+            if chave in self._ativas:
+                raise ValueError("Reserva já registrada para este usuário e item.")
+            self._ativas[chave] = reserva
+            if reserva.situacao == Reserva.AGUARDANDO:
+                self._filas.setdefault(reserva.item, deque()).append(reserva)
+            elif reserva.situacao == Reserva.SEPARADA:
+                self._agendar(reserva)
+
+    def buscar(self, matricula, item):
+        return self._ativas.get((matricula, item))
+
+    def posicao(self, reserva):
+        # 1 para a próxima da fila; 0 se já há um exemplar separado
+        if reserva.situacao == Reserva.SEPARADA:
+            return 0
+        with self._trava:
+            posicao = 0
+            for outra in self._filas.get(reserva.item, ()):
+                if outra.situacao == Reserva.AGUARDANDO:
+                    posicao += 1
+                if outra is reserva:
+                    return posicao
+        return None
+
+    def proxima(self, item):
+        with self._trava:
+            fila = self._filas.get(item)
+            while fila:
+                reserva = fila.popleft()
+                if reserva.situacao == Reserva.AGUARDANDO:
+                    if not fila:
+                        del self._filas[item]
+                    return reserva
+            self._filas.pop(item, None)
+            return None
+
+    def separar(self, reserva, exemplar, data_limite_retirada):
+        reserva.situacao = Reserva.SEPARADA
+        reserva.exemplar = exemplar
+        reserva.data_limite_retirada = para_data(data_limite_retirada)
+        with self._trava:
+            self._agendar(reserva)
+
+    def _agendar(self, reserva):
+        heapq.heappush(self._expiracoes, (reserva.data_limite_retirada, next(self._contador), reserva))
+
+    def encerrar(self, reserva, situacao):
+        reserva.situacao = situacao
+        with self._trava:
+            chave = (reserva.usuario.matricula, reserva.item)
+            if self._ativas.get(chave) is reserva:
+                del self._ativas[chave]
+
+    def vencidas(self, data_referencia):
+        # Reservas separadas cujo prazo de retirada terminou antes da data
+        vencidas = []
+        with self._trava:
+            while self._expiracoes and self._expiracoes[0][0] < data_referencia:
+                reserva = heapq.heappop(self._expiracoes)[2]
+                if reserva.situacao == Reserva.SEPARADA:
+                    vencidas.append(reserva)
+        return vencidas
+
+def _dados_emprestimo(emprestimo):
+    return {"matricula": emprestimo.usuario.matricula, "titulo": emprestimo.item.get_titulo(),
+            "exemplar": emprestimo.exemplar, "data_emprestimo": emprestimo.data_emprestimo.isoformat(),
+            "data_devolucao_prevista": emprestimo.data_devolucao_prevista.isoformat()}
+
+def evento_da_mutacao(operacao, argumentos):
+    # Converte o registro de _registrar_mutacao em (classe do evento, dados)
+    if operacao == "adicionar_item":
+        return eventos.ItemAdicionado, item_para_registro(argumentos[0])
+    if operacao == "importar_itens":
+        return eventos.ItensImportados, [item_para_registro(item) for item in argumentos[0]]
+    if operacao == "remover_item":
+        return eventos.ItemRemovido, {"titulo": argumentos[0]}
+    if operacao == "adicionar_exemplares":
+        titulo, quantidade, data = argumentos
+        return eventos.ExemplaresAdicionados, {"titulo": titulo, "quantidade": quantidade, "data": data.isoformat()}
+    if operacao == "registrar_usuario":
+        return eventos.UsuarioRegistrado, usuario_para_registro(argumentos[0])
+    if operacao == "importar_usuarios":
+        return eventos.UsuariosImportados, [usuario_para_registro(usuario) for usuario in argumentos[0]]
+    if operacao == "emprestimo":
+        return eventos.EmprestimoRealizado, _dados_emprestimo(argumentos[0])
+    if operacao == "devolucao":
+        emprestimo, data_devolucao_real = argumentos
+        dados = _dados_emprestimo(emprestimo)
+        dados["data_devolucao_real"] = str(data_devolucao_real)
+        return eventos.ItemDevolvido, dados
+    if operacao == "reserva":
+        reserva = argumentos[0]
+        return eventos.ReservaRegistrada, {"matricula": reserva.usuario.matricula, "titulo": reserva.item.get_titulo(),
+                                           "data_reserva": reserva.data_reserva.isoformat()}
+    if operacao == "cancelar_reserva":
+        matricula, titulo, data = argumentos
+        return eventos.ReservaCancelada, {"matricula": matricula, "titulo": titulo, "data": str(data)}
+    if operacao == "expirar_reservas":
+        return eventos.ReservasExpiradas, {"data": argumentos[0].isoformat()}
+    raise ValueError(f"Operação desconhecida: {operacao}")
+
+class RegistroAutores:
+    # Um único Autor por nome e email normalizados, e os itens de cada um.
+    # O catálogo passa por aqui ao incluir e remover livros: o autor de cada
+    # Livro novo é trocado pela instância já registrada, e "livros do autor
+    # X" vira uma consulta a dicionário em vez de percorrer o catálogo.
+    # Quem chama segura a trava do catálogo.
+
+    def __init__(self):
+        self._autores = {}
+        self._itens = {}
+        self._chaves_por_nome = {}
+
+    def __len__(self):
+        return len(self._autores)
+
+    def __iter__(self):
+        return iter(list(self._autores.values()))
+
+    @staticmethod
+    def _normalizar_nome(nome):
+        return " ".join(nome.split()).casefold()
+
+    @classmethod
+    def chave(cls, nome, email):
+        return cls._normalizar_nome(nome), (email or "").strip().casefold()
+
+    def buscar(self, nome, email):
+        return self._autores.get(self.chave(nome, email))
+
+    def internar(self, autor):
+        chave = self.chave(autor.nome, autor.email)
+        existente = self._autores.get(chave)
+        if existente is None:
+            autor.nome = sys.intern(autor.nome)
+            autor.email = sys.intern(autor.email)
+            self._autores[chave] = autor
+            self._chaves_por_nome.setdefault(chave[0], []).append(chave)
+            return autor
+        if autor.biografia and not existente.biografia:
+            existente.biografia = autor.biografia
+        return existente
+
+    def adicionar_item(self, livro):
+        livro.autor = autor = self.internar(livro.autor)
+        self._itens.setdefault(self.chave(autor.nome, autor.email), []).append(livro)
+        autor.adicionar_livro_publicado(livro.titulo)
+
+    def remover_item(self, livro):
+        autor = livro.autor
+        chave = self.chave(autor.nome, autor.email)
+        itens = self._itens.get(chave)
+        if not itens or livro not in itens:
+            return
+        itens.remove(livro)
+        autor.remover_livro_publicado(livro.titulo)
+        if not itens:
+            # Sem livros no catálogo, o autor deixa de ser guardado
+            del self._itens[chave]
+            del self._autores[chave]
+            chaves = self._chaves_por_nome[chave[0]]
+            chaves.remove(chave)
+            if not chaves:
+                del self._chaves_por_nome[chave[0]]
+
+    def itens_do_autor(self, nome, email=None):
+        # Sem email, junta os autores homônimos
+        if email is not None:
+            return list(self._itens.get(self.chave(nome, email), ()))
+        return [item for chave in self._chaves_por_nome.get(self._normalizar_nome(nome), ())
+                for item in self._itens[chave]]
+
+def _internar_textos(item):
+    # Gêneros, editoras e diretores se repetem em milhares de itens; depois
+    # do intern, as cópias de cada texto viram uma única string
+    if isinstance(item, Livro):
+        if isinstance(item.genero, str):
+            item.genero = sys.intern(item.genero)
+    elif isinstance(item, Revista):
+        if isinstance(item.editora, str):
+            item.editora = sys.intern(item.editora)
+    elif isinstance(item, DVD):
+        if isinstance(item.diretor, str):
+            item.diretor = sys.intern(item.diretor)
+
+class TravasPorChave:
+    # Uma trava por chave (usuário ou item), criada sob demanda e descartada
+    # quando ninguém mais a usa. A trava interna só protege o dicionário.
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._travas = {}
+
+    @contextmanager
+    def travar(self, chave):
+        with self._trava:
+            entrada = self._travas.get(chave)
+            if entrada is None:
+                entrada = self._travas[chave] = [threading.Lock(), 0]
+            entrada[1] += 1
+        entrada[0].acquire()
+        try:
+            yield
+        finally:
+            entrada[0].release()
+            with self._trava:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._travas[chave]
+
+class PaginaCursor:
+    # Página de uma listagem; proximo_cursor é None quando não há mais registros
+    def __init__(self, itens, proximo_cursor):
+        self.itens = itens
+        self.proximo_cursor = proximo_cursor
+
+def _pagina_de(pares, por_pagina):
+    # pares: (cursor, registro) em ordem; lê um registro além da página
+    # para saber se ainda há continuação
+    if por_pagina < 1:
+        raise ValueError("Paginação inválida.")
+    itens = []
+    for cursor, registro in pares:
+        if len(itens) == por_pagina:
+            return PaginaCursor(itens, cursor)
+        itens.append(registro)
+    return PaginaCursor(itens, None)
+
+def _a_partir_de(lista, cursor):
+    # Percorre a lista pela posição, sem copiá-la; itens acrescentados
+    # durante a iteração também aparecem
+    if not isinstance(cursor, int) or isinstance(cursor, bool) or cursor < 0:
+        raise ValueError("Cursor inválido.")
+    posicao = cursor
+    while True:
+        try:
+            registro = lista[posicao]
+        except IndexError:
+            return
+        yield posicao, registro
+        posicao += 1
+
+def _cursor_emprestimo(emprestimo):
+    # Chave do empréstimo na ordem da listagem: vencimento e sequência
+    return f"{emprestimo.data_devolucao_prevista.isoformat()}/{emprestimo.sequencia}"
+
+def _ler_cursor_emprestimo(cursor):
+    # 0 é o início da listagem; senão, um cursor devolvido por uma página
+    if cursor == 0 and type(cursor) is int:
+        return None, None
+    if not isinstance(cursor, str):
+        raise ValueError("Cursor inválido.")
+    data, _, sequencia = cursor.partition("/")
+    try:
+        return para_data(data), int(sequencia)
+    except ValueError:
+        raise ValueError("Cursor inválido.")
 
 class Biblioteca:
-    def __init__(self, nome):
+    def __init__(self, nome, config=None):
         self.nome = nome
+        # Lida a cada empréstimo: alterações na configuração valem na hora
+        self.config = config if config is not None else ConfiguracaoBiblioteca()
         self.catalogo = []
+        # Posições removidas do catálogo, em ordem: corrigem os cursores de itens
+        self._remocoes_catalogo = []
         self.usuarios_registrados = []
-        self.emprestimos_ativos = []
+        self._emprestimos = RegistroEmprestimos()
+        self._reservas = RegistroReservas()
+        # Índices para busca em tempo constante (título normalizado e matrícula)
+        self._itens_por_titulo = {}
+        self._usuarios_por_matricula = {}
+        self._indice_busca = IndiceBusca()
+        self._indice_trigramas = IndiceTrigramas()
+        self.autores = RegistroAutores()
+        # Empréstimos e devoluções travam sempre o usuário e depois o item,
+        # de modo que operações sobre usuários e itens distintos não se bloqueiam.
+        self._travas_usuarios = TravasPorChave()
+        self._travas_itens = TravasPorChave()
+        self._trava_catalogo = threading.RLock()
+        self._trava_usuarios = threading.Lock()
+        self.eventos = eventos.BarramentoEventos()
+        # Preenchidos por metricas.instrumentar, perfilamento.monitorar e cache_busca.ativar_cache
+        self.metricas = None
+        self.operacoes_lentas = None
+        self.cache_busca = None
+
+    def _registrar_mutacao(self, operacao, *argumentos):
+        # Ponto de extensão chamado após cada alteração bem-sucedida do estado.
+        # Sem assinantes, nenhum evento é montado.
+        if self.eventos.tem_assinantes():
+            self.eventos.publicar(*evento_da_mutacao(operacao, argumentos))
+
+    def assinar_eventos(self, funcao, tipos=None):
+        # funcao(evento) roda na thread despachante, fora das operações
+        return self.eventos.assinar(funcao, tipos)
+
+    def cancelar_assinatura(self, assinatura):
+        self.eventos.cancelar(assinatura)
+
+    @property
+    def emprestimos_ativos(self):
+        return list(self._emprestimos)
+
+    @property
+    def historico_emprestimos(self):
+        return self._emprestimos.historico
+
+    @property
+    def reservas_ativas(self):
+        return list(self._reservas)
+
+    def emprestimos_atrasados(self, data_referencia):
+        # Atrasado: ainda aberto e com devolução prevista antes da data
+        limite = para_data(data_referencia) - timedelta(days=1)
+        return self._emprestimos.vencendo_entre(fim=limite)
+
+    def emprestimos_a_vencer(self, data_referencia, dias):
+        inicio = para_data(data_referencia)
+        return self._emprestimos.vencendo_entre(inicio, inicio + timedelta(days=dias))
+
+    def contagem_atrasos_por_usuario(self, data_referencia):
+        contagem = {}
+        for emprestimo in self.emprestimos_atrasados(data_referencia):
+            matricula = emprestimo.usuario.matricula
+            contagem[matricula] = contagem.get(matricula, 0) + 1
+        return contagem
+
+    # --- listagens sob demanda ---
+
+    def _posicao_no_catalogo(self, cursor):
+        # Cursor de itens: uma posição do catálogo (0 = início) ou o texto
+        # "posição.remoções" devolvido por pagina_itens, que é corrigido
+        # pelas remoções feitas no catálogo depois da página
+        if not isinstance(cursor, str):
+            return cursor
+        try:
+            posicao, remocoes = (int(parte) for parte in cursor.split("."))
+        except ValueError:
+            raise ValueError("Cursor inválido.")
+        with self._trava_catalogo:
+            if posicao < 0 or not 0 <= remocoes <= len(self._remocoes_catalogo):
+                raise ValueError("Cursor inválido.")
+            for removida in itertools.islice(self._remocoes_catalogo, remocoes, None):
+                if removida < posicao:
+                    posicao -= 1
+        return posicao
+
+    def _cursor_catalogo(self, posicao):
+        return f"{posicao}.{len(self._remocoes_catalogo)}"
+
+    def _itens_filtrados(self, cursor, tipo, disponivel, genero):
+        chave_genero = genero.casefold() if genero else None
+        for posicao, item in _a_partir_de(self.catalogo, self._posicao_no_catalogo(cursor)):
+            if tipo is not None and tipo_item(item) != tipo:
+                continue
+            if disponivel is not None and (isinstance(item, ItemEmprestavel) and item.esta_disponivel()) != disponivel:
+                continue
+            if chave_genero is not None and getattr(item, "genero", "").casefold() != chave_genero:
+                continue
+            yield posicao, item
+
+    def iterar_itens(self, tipo=None, disponivel=None, genero=None, cursor=0):
+        # tipo: "livro", "revista", "dvd"; cursor: como em pagina_itens
+        for _, item in self._itens_filtrados(cursor, tipo, disponivel, genero):
+            yield item
+
+    def pagina_itens(self, cursor=0, por_pagina=20, tipo=None, disponivel=None, genero=None):
+        pares = ((self._cursor_catalogo(posicao), item)
+                 for posicao, item in self._itens_filtrados(cursor, tipo, disponivel, genero))
+        return _pagina_de(pares, por_pagina)
+
+    def iterar_usuarios(self, cursor=0):
+        for _, usuario in _a_partir_de(self.usuarios_registrados, cursor):
+            yield usuario
+
+    def pagina_usuarios(self, cursor=0, por_pagina=20):
+        return _pagina_de(_a_partir_de(self.usuarios_registrados, cursor), por_pagina)
+
+    def iterar_emprestimos_ativos(self, matricula=None):
+        # Em ordem de devolução prevista, uma data por vez
+        if matricula is not None:
+            yield from sorted(self._emprestimos.do_usuario(matricula),
+                              key=lambda e: (e.data_devolucao_prevista, e.sequencia))
+            return
+        yield from self._emprestimos.iterar_por_vencimento()
+
+    def pagina_emprestimos_ativos(self, cursor=0, por_pagina=20, matricula=None):
+        # O cursor é a chave (vencimento, sequência) do primeiro empréstimo
+        # da página: a próxima começa direto nele, e devoluções ou novos
+        # empréstimos entre uma página e outra não fazem pular nem repetir
+        data, sequencia = _ler_cursor_emprestimo(cursor)
+        if matricula is not None:
+            emprestimos = self.iterar_emprestimos_ativos(matricula)
+            if data is not None:
+                emprestimos = (emprestimo for emprestimo in emprestimos
+                               if (emprestimo.data_devolucao_prevista, emprestimo.sequencia) >= (data, sequencia))
+        else:
+            emprestimos = self._emprestimos.iterar_por_vencimento(data, sequencia_inicial=sequencia)
+        return _pagina_de(((_cursor_emprestimo(emprestimo), emprestimo) for emprestimo in emprestimos), por_pagina)
+
+    @staticmethod
+    def _chave_titulo(titulo):
+        return titulo.casefold()
 
     def adicionar_item_catalogo(self, item):
         if not isinstance(item, ItemBibliografico):
             raise TypeError("Só é possível adicionar Itens Bibliográficos ao catálogo.")
-        self.catalogo.append(item)
+        with self._trava_catalogo:
+            self._internar_item(item)
+            self.catalogo.append(item)
+            self._itens_por_titulo.setdefault(self._chave_titulo(item.get_titulo()), []).append(item)
+            self._indice_busca.adicionar(item)
+            self._indice_trigramas.adicionar(item.get_titulo())
+            self._registrar_mutacao("adicionar_item", item)
 
     def remover_item_catalogo(self, item_titulo):
-        item_encontrado = self.buscar_item_por_titulo(item_titulo)
-        if item_encontrado:
-            self.catalogo.remove(item_encontrado)
-            return True
-        return False
+        with self._trava_catalogo:
+            item_encontrado = self.buscar_item_por_titulo(item_titulo)
+            if item_encontrado:
+                posicao = self.catalogo.index(item_encontrado)
+                del self.catalogo[posicao]
+                self._remocoes_catalogo.append(posicao)
+                chave = self._chave_titulo(item_titulo)
+                itens = self._itens_por_titulo[chave]
+                itens.remove(item_encontrado)
+                if not itens:
+                    del self._itens_por_titulo[chave]
+                self._indice_busca.remover(item_encontrado)
+                self._indice_trigramas.remover(item_encontrado.get_titulo())
+                if isinstance(item_encontrado, Livro):
+                    self.autores.remover_item(item_encontrado)
+                self._registrar_mutacao("remover_item", item_titulo)
+                return True
+            return False
+
+    def _internar_item(self, item):
+        _internar_textos(item)
+        if isinstance(item, Livro):
+            self.autores.adicionar_item(item)
+
+    def itens_do_autor(self, nome, email=None):
+        with self._trava_catalogo:
+            return self.autores.itens_do_autor(nome, email)
+
+    def importar_itens(self, registros):
+        relatorio = RelatorioImportacao()
+        novos = []
+        for numero, registro in enumerate(registros, start=1):
+            try:
+                item = registro if isinstance(registro, ItemBibliografico) else item_de_registro(registro)
+            except (ValueError, TypeError, AttributeError) as e:
+                relatorio.registrar_erro(numero, str(e))
+                continue
+            novos.append(item)
+        # Os índices são atualizados uma única vez, ao final do lote
+        with self._trava_catalogo:
+            for item in novos:
+                self._internar_item(item)
+            self.catalogo.extend(novos)
+            indice = self._itens_por_titulo
+            for item in novos:
+                indice.setdefault(self._chave_titulo(item.get_titulo()), []).append(item)
+            self._indice_busca.adicionar_varios(novos)
+            self._indice_trigramas.adicionar_varios(item.get_titulo() for item in novos)
+            if novos:
+                self._registrar_mutacao("importar_itens", novos)
+        relatorio.importados = len(novos)
+        return relatorio
+
+    def importar_usuarios(self, registros):
+        relatorio = RelatorioImportacao()
+        validos = []
+        for numero, registro in enumerate(registros, start=1):
+            try:
+                usuario = registro if isinstance(registro, Usuario) else usuario_de_registro(registro)
+            except (ValueError, TypeError, AttributeError) as e:
+                relatorio.registrar_erro(numero, str(e))
+                continue
+            validos.append((numero, usuario))
+        novos = {}
+        with self._trava_usuarios:
+            for numero, usuario in validos:
+                if usuario.matricula in self._usuarios_por_matricula or usuario.matricula in novos:
+                    relatorio.registrar_erro(numero, "Usuário com esta matrícula já registrado.")
+                    continue
+                novos[usuario.matricula] = usuario
+            self.usuarios_registrados.extend(novos.values())
+            self._usuarios_por_matricula.update(novos)
+            if novos:
+                self._registrar_mutacao("importar_usuarios", list(novos.values()))
+        relatorio.erros.sort()
+        relatorio.importados = len(novos)
+        return relatorio
 
     def registrar_usuario(self, usuario):
         if not isinstance(usuario, Usuario):
             raise TypeError("Só é possível registrar Usuários.")
-        if any(u.matricula == usuario.matricula for u in self.usuarios_registrados):
-            raise ValueError("Usuário com esta matrícula já registrado.")
-        self.usuarios_registrados.append(usuario)
+        with self._trava_usuarios:
+            if usuario.matricula in self._usuarios_por_matricula:
+                raise ValueError("Usuário com esta matrícula já registrado.")
+            self.usuarios_registrados.append(usuario)
+            self._usuarios_por_matricula[usuario.matricula] = usuario
+            self._registrar_mutacao("registrar_usuario", usuario)
 
     def buscar_item_por_titulo(self, titulo):
-        for item in self.catalogo:
-            if item.get_titulo().lower() == titulo.lower():
-                return item
+        itens = self._itens_por_titulo.get(self._chave_titulo(titulo))
+        if itens:
+            return itens[0]
         return None
 
+    def buscar_itens(self, consulta, pagina=1, por_pagina=10):
+        # Busca por palavras (ou início de palavras) em título, autor, gênero,
+        # ISBN, diretor e editora, sem diferenciar acentos
+        return self._indice_busca.buscar(consulta, pagina, por_pagina)
+
+    def completar_termo(self, prefixo, limite=10):
+        return self._indice_busca.completar(prefixo, limite)
+
+    def sugerir_titulos(self, titulo, limite=5):
+        # Títulos mais próximos de um título digitado com erro
+        return self._indice_trigramas.sugerir(titulo, limite)
+
     def buscar_usuario_por_matricula(self, matricula):
-        for usuario in self.usuarios_registrados:
-            if usuario.matricula == matricula:
-                return usuario
+        return self._usuarios_por_matricula.get(matricula)
+
+    def _verificar_limites(self, usuario, item):
+        # Consulta só os contadores do registro, sem percorrer empréstimos
+        matricula = usuario.matricula
+        maximo = self.config.get_max_livros_por_usuario()
+        if self._emprestimos.quantidade_do_usuario(matricula) >= maximo:
+            return Recusa(f"Limite de {maximo} empréstimo(s) por usuário atingido.")
+        tipo = tipo_item(item)
+        limite_tipo = self.config.get_limite_por_tipo(tipo)
+        if limite_tipo is not None and self._emprestimos.quantidade_do_usuario(matricula, tipo) >= limite_tipo:
+            return Recusa(f"Limite de {limite_tipo} empréstimo(s) do tipo '{tipo}' por usuário atingido.")
         return None
 
-    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista):
+    def _ainda_no_catalogo(self, titulo_item, item):
+        # O item é buscado antes da sua trava: a remoção pode ter acontecido
+        # entre as duas, e a operação não deve valer para um item que saiu.
+        # Vai direto ao índice, sem passar por métricas ou cache da instância.
+        return Biblioteca.buscar_item_por_titulo(self, titulo_item) is item
+
+    def adicionar_exemplares(self, titulo_item, quantidade=1, data_referencia=None):
+        item = self.buscar_item_por_titulo(titulo_item)
+        if not item:
+            return False
+        if not isinstance(item, ItemEmprestavel):
+            raise TypeError("Este tipo de item não possui exemplares para empréstimo.")
+        data = para_data(data_referencia) if data_referencia is not None else date.today()
+        with self._travas_itens.travar(item):
+            if not self._ainda_no_catalogo(titulo_item, item):
+                return False
+            item.adicionar_exemplares(quantidade)
+            # Os novos exemplares atendem primeiro quem está na fila
+            while item.esta_disponivel() and self._atender_fila(item, data):
+                pass
+            self._registrar_mutacao("adicionar_exemplares", titulo_item, quantidade, data)
+        return True
+
+    # --- reservas ---
+
+    def _atender_fila(self, item, data_referencia):
+        # Separa um exemplar livre para a próxima reserva (com a trava do item)
+        if not item.esta_disponivel():
+            return None
+        reserva = self._reservas.proxima(item)
+        if reserva is None:
+            return None
+        self._reservas.separar(reserva, item.emprestar(), self.config.data_limite_retirada(data_referencia))
+        return reserva
+
+    def reservar_item(self, matricula_usuario, titulo_item, data_reserva):
+        self.expirar_reservas(data_reserva)
         usuario = self.buscar_usuario_por_matricula(matricula_usuario)
         item = self.buscar_item_por_titulo(titulo_item)
 
         if not usuario:
-            return "Usuário não encontrado."
+            return Recusa("Usuário não encontrado.")
         if not item:
-            return "Item não encontrado no catálogo."
-        if not isinstance(item, (Livro, DVD)): # Exemplo: Revistas não podem ser emprestadas
-            return "Este tipo de item não pode ser emprestado."
-        if not item.esta_disponivel():
-            return f"Item '{item.get_titulo()}' não está disponível para empréstimo."
+            return Recusa("Item não encontrado no catálogo.")
+        if not isinstance(item, ItemEmprestavel):
+            return Recusa("Este tipo de item não pode ser reservado.")
 
-        if usuario.pegar_livro_emprestado(item):
-            novo_emprestimo = Emprestimo(usuario, item, data_emprestimo, data_devolucao_prevista)
-            self.emprestimos_ativos.append(novo_emprestimo)
-            return f"Empréstimo de '{item.get_titulo()}' para '{usuario.nome}' realizado com sucesso."
-        else:
-            return "Falha ao realizar empréstimo (verificar disponibilidade)."
+        with self._travas_usuarios.travar(usuario.matricula), self._travas_itens.travar(item):
+            if not self._ainda_no_catalogo(titulo_item, item):
+                return Recusa("Item não encontrado no catálogo.")
+            if self._emprestimos.buscar(usuario.matricula, item):
+                return Recusa(f"Usuário já possui um exemplar de '{item.get_titulo()}'.")
+            if self._reservas.buscar(usuario.matricula, item):
+                return Recusa(f"Usuário já possui uma reserva de '{item.get_titulo()}'.")
+            if item.esta_disponivel():
+                return Recusa(f"Item '{item.get_titulo()}' está disponível; não é preciso reservar.")
+            reserva = Reserva(usuario, item, data_reserva)
+            self._reservas.adicionar(reserva)
+            self._registrar_mutacao("reserva", reserva)
+            posicao = self._reservas.posicao(reserva)
+        return f"Reserva de '{item.get_titulo()}' para '{usuario.nome}' registrada. Posição na fila: {posicao}."
+
+    def consultar_reserva(self, matricula_usuario, titulo_item):
+        item = self.buscar_item_por_titulo(titulo_item)
+        return self._reservas.buscar(matricula_usuario, item) if item else None
+
+    def posicao_na_fila(self, matricula_usuario, titulo_item):
+        # 1 = próxima a ser atendida; 0 = exemplar já separado; None = sem reserva
+        reserva = self.consultar_reserva(matricula_usuario, titulo_item)
+        return self._reservas.posicao(reserva) if reserva else None
+
+    def cancelar_reserva(self, matricula_usuario, titulo_item, data_cancelamento):
+        item = self.buscar_item_por_titulo(titulo_item)
+        if not item:
+            return Recusa("Reserva não encontrada.")
+        with self._travas_usuarios.travar(matricula_usuario), self._travas_itens.travar(item):
+            reserva = self._reservas.buscar(matricula_usuario, item)
+            if not reserva:
+                return Recusa("Reserva não encontrada.")
+            separada = reserva.situacao == Reserva.SEPARADA
+            self._reservas.encerrar(reserva, Reserva.CANCELADA)
+            if separada:
+                item.devolver(reserva.exemplar)
+                self._atender_fila(item, para_data(data_cancelamento))
+            self._registrar_mutacao("cancelar_reserva", matricula_usuario, titulo_item, data_cancelamento)
+        return f"Reserva de '{item.get_titulo()}' cancelada."
+
+    def expirar_reservas(self, data_referencia):
+        # Retiradas não feitas no prazo: o exemplar passa para a próxima
+        # reserva da fila ou volta ao acervo. Só o heap de prazos é consultado.
+        data = para_data(data_referencia)
+        expiradas = []
+        for reserva in self._reservas.vencidas(data):
+            item = reserva.item
+            with self._travas_itens.travar(item):
+                if reserva.situacao != Reserva.SEPARADA:
+                    continue
+                self._reservas.encerrar(reserva, Reserva.EXPIRADA)
+                item.devolver(reserva.exemplar)
+                self._atender_fila(item, data)
+            expiradas.append(reserva)
+        if expiradas:
+            self._registrar_mutacao("expirar_reservas", data)
+        return expiradas
+
+    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista=None,
+                            exemplar=None):
+        self.expirar_reservas(data_emprestimo)
+        usuario = self.buscar_usuario_por_matricula(matricula_usuario)
+        item = self.buscar_item_por_titulo(titulo_item)
+
+        if not usuario:
+            return Recusa("Usuário não encontrado.")
+        if not item:
+            return Recusa("Item não encontrado no catálogo.")
+        if not isinstance(item, ItemEmprestavel): # Exemplo: Revistas não podem ser emprestadas
+            return Recusa("Este tipo de item não pode ser emprestado.")
+
+        with self._travas_usuarios.travar(usuario.matricula), self._travas_itens.travar(item):
+            if not self._ainda_no_catalogo(titulo_item, item):
+                return Recusa("Item não encontrado no catálogo.")
+            reserva = self._reservas.buscar(usuario.matricula, item)
+            separada = reserva is not None and reserva.situacao == Reserva.SEPARADA
+            if not separada and not item.esta_disponivel():
+                return Recusa(f"Item '{item.get_titulo()}' não está disponível para empréstimo.")
+            if self._emprestimos.buscar(usuario.matricula, item):
+                return Recusa(f"Usuário já possui um exemplar de '{item.get_titulo()}'.")
+            recusa = self._verificar_limites(usuario, item)
+            if recusa:
+                return recusa
+            if data_devolucao_prevista is None:
+                data_devolucao_prevista = self.config.data_devolucao_padrao(tipo_item(item), data_emprestimo)
+            if separada:
+                # Retirada da reserva: o exemplar separado volta ao acervo e sai em seguida
+                exemplar = reserva.exemplar
+                item.devolver(exemplar)
+
+            retirado = usuario.pegar_livro_emprestado(item, exemplar)
+            if retirado:
+                if reserva is not None:
+                    self._reservas.encerrar(reserva, Reserva.ATENDIDA)
+                novo_emprestimo = Emprestimo(usuario, item, data_emprestimo, data_devolucao_prevista, retirado)
+                self._emprestimos.adicionar(novo_emprestimo)
+                self._registrar_mutacao("emprestimo", novo_emprestimo)
+                return f"Empréstimo de '{item.get_titulo()}' para '{usuario.nome}' realizado com sucesso."
+            elif exemplar is not None:
+                return Recusa(f"Exemplar {exemplar} de '{item.get_titulo()}' não está disponível para empréstimo.")
+            else:
+                return Recusa("Falha ao realizar empréstimo (verificar disponibilidade).")
 
     def registrar_devolucao_item(self, matricula_usuario, titulo_item, data_devolucao_real):
-        emprestimo_ativo = None
-        for emp in self.emprestimos_ativos:
-            if emp.usuario.matricula == matricula_usuario and \
-               emp.item.get_titulo() == titulo_item and \
-               not emp.devolvido:
-                emprestimo_ativo = emp
-                break
-        
-        if not emprestimo_ativo:
-            return "Empréstimo não encontrado ou já devolvido."
-
-        usuario = emprestimo_ativo.usuario
-        item = emprestimo_ativo.item
-        
-        usuario.devolver_livro(item) 
-        
-        return emprestimo_ativo.registrar_devolucao(data_devolucao_real)
+        self.expirar_reservas(data_devolucao_real)
+        with self._travas_usuarios.travar(matricula_usuario):
+            emprestimo_ativo = self._emprestimos.buscar_por_titulo(matricula_usuario, titulo_item)
+
+            if not emprestimo_ativo:
+                return Recusa("Empréstimo não encontrado ou já devolvido.")
+
+            usuario = emprestimo_ativo.usuario
+            item = emprestimo_ativo.item
+
+            with self._travas_itens.travar(item):
+                # O exemplar volta à pilha em registrar_devolucao
+                usuario.remover_livro_emprestado(item)
+                self._emprestimos.encerrar(emprestimo_ativo)
+                mensagem = emprestimo_ativo.registrar_devolucao(data_devolucao_real)
+                # Consulta O(1) à fila do item; havendo reserva, o exemplar fica separado
+                reserva = self._atender_fila(item, para_data(data_devolucao_real))
+                self._registrar_mutacao("devolucao", emprestimo_ativo, data_devolucao_real)
+            if reserva:
+                mensagem += f" Exemplar separado para a reserva de {reserva.usuario.nome}."
+            return mensagem
 
 class ConfiguracaoBiblioteca:
-    def __init__(self, max_livros_por_usuario=5, dias_emprestimo_padrao=14):
+    def __init__(self, max_livros_por_usuario=5, dias_emprestimo_padrao=14, limites_por_tipo=None, dias_por_tipo=None,
+                 dias_retirada_reserva=3):
         self.max_livros_por_usuario = max_livros_por_usuario
         self.dias_emprestimo_padrao = dias_emprestimo_padrao
+        self.dias_retirada_reserva = dias_retirada_reserva
+        # Regras por tipo de item ("livro", "dvd"); tipos ausentes usam os valores gerais
+        self.limites_por_tipo = dict(limites_por_tipo or {})
+        self.dias_por_tipo = dict(dias_por_tipo or {})
 
     def get_max_livros_por_usuario(self):
         return self.max_livros_por_usuario
@@ -228,4 +1314,29 @@ class ConfiguracaoBiblioteca:
     def set_max_livros_por_usuario(self, novo_maximo):
         if not isinstance(novo_maximo, int) or novo_maximo < 0:
             raise ValueError("Número máximo de livros inválido.")
-        self.max_livros_por_usuario = novo_maximo
\ No newline at end of file
+        self.max_livros_por_usuario = novo_maximo
+
+    def get_limite_por_tipo(self, tipo):
+        return self.limites_por_tipo.get(tipo)
+
+    def set_limite_por_tipo(self, tipo, novo_maximo):
+        if novo_maximo is None:
+            self.limites_por_tipo.pop(tipo, None)
+            return
+        if not isinstance(novo_maximo, int) or novo_maximo < 0:
+            raise ValueError("Número máximo de itens inválido.")
+        self.limites_por_tipo[tipo] = novo_maximo
+
+    def get_dias_emprestimo(self, tipo=None):
+        return self.dias_por_tipo.get(tipo, self.dias_emprestimo_padrao)
+
+    def set_dias_emprestimo(self, tipo, dias):
+        if not isinstance(dias, int) or dias <= 0:
+            raise ValueError("Número de dias de empréstimo inválido.")
+        self.dias_por_tipo[tipo] = dias
+
+    def data_devolucao_padrao(self, tipo, data_emprestimo):
+        return para_data(data_emprestimo) + timedelta(days=self.get_dias_emprestimo(tipo))
+
+    def data_limite_retirada(self, data_separacao):
+        return para_data(data_separacao) + timedelta(days=self.dias_retirada_reserva)
@@ -0,0 +1,416 @@
+import functools
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from biblioteca_models import (
+    Biblioteca, Emprestimo, ItemEmprestavel, Reserva, item_de_registro, item_para_registro, para_data,
+    usuario_de_registro, usuario_para_registro
+)
+from catalogo_mapeado import CatalogoMapeado, exportar_catalogo
+
+ARQUIVO_SNAPSHOT = "snapshot.json"
+ARQUIVO_CATALOGO = "catalogo.bin"
+PREFIXO_DIARIO = "diario-"
+
+
+def _mutacao(metodo):
+    # A operação roda sob as travas por usuário e por item da Biblioteca; aqui
+    # ela só passa pela porta que a compactação fecha para copiar o estado
+    @functools.wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        with self._porta():
+            return metodo(self, *args, **kwargs)
+    return envoltorio
+
+
+def _mutacao_de_cadastro(metodo):
+    # Itens e usuários novos ficam visíveis antes de chegarem ao diário. Com
+    # a trava do diário durante o cadastro (já serializado pela trava do
+    # catálogo ou dos usuários), um empréstimo que enxergue o item ou o
+    # usuário novo é gravado depois dele.
+    @functools.wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        with self._porta(), self._trava_diario:
+            return metodo(self, *args, **kwargs)
+    return envoltorio
+
+
+def _nome_segmento(inicio):
+    return f"{PREFIXO_DIARIO}{inicio:012d}.jsonl"
+
+
+def abrir_catalogo_mapeado(diretorio):
+    # Catálogo do último snapshot, somente leitura, para processos que só
+    # consultam títulos: abre sem ler o snapshot nem reproduzir o diário
+    caminho = os.path.join(diretorio, ARQUIVO_CATALOGO)
+    if not os.path.exists(caminho):
+        return None
+    return CatalogoMapeado(caminho)
+
+
+class BibliotecaPersistente(Biblioteca):
+    # Estado = último snapshot + diário (journal) de alterações posteriores.
+    # O diário é dividido em segmentos; a compactação abre um segmento novo,
+    # grava o snapshot em segundo plano e só então apaga os segmentos antigos.
+
+    def __init__(self, nome, diretorio, limite_diario=10000, sincronizar=False, config=None):
+        super().__init__(nome, config)
+        self.diretorio = diretorio
+        self.limite_diario = limite_diario
+        self.sincronizar = sincronizar
+        # Protege só a sequência e a escrita no diário
+        self._trava_diario = threading.RLock()
+        # Porta das mutações: a compactação a fecha e espera as em andamento
+        self._condicao = threading.Condition()
+        self._porta_fechada = False
+        self._em_andamento = 0
+        self._compactacao_pendente = False
+        self._trava_compactacao = threading.Lock()
+        self._local = threading.local()
+        # id(item) -> total de exemplares no momento da última captura, para os
+        # itens que ganharam exemplares depois dela (ver adicionar_exemplares)
+        self._exemplares_congelados = {}
+        self._sequencia = 0
+        self._entradas_desde_snapshot = 0
+        self._reproduzindo = False
+        self._compactacao = None
+        self._diario = None
+        os.makedirs(diretorio, exist_ok=True)
+        self._carregar()
+        # Gravado a cada compactação ao lado do snapshot; reflete o catálogo
+        # do último snapshot, não as mudanças que ainda estão só no diário
+        self.catalogo_mapeado = abrir_catalogo_mapeado(diretorio)
+        self._abrir_segmento()
+
+    adicionar_item_catalogo = _mutacao_de_cadastro(Biblioteca.adicionar_item_catalogo)
+    registrar_usuario = _mutacao_de_cadastro(Biblioteca.registrar_usuario)
+    importar_itens = _mutacao_de_cadastro(Biblioteca.importar_itens)
+    importar_usuarios = _mutacao_de_cadastro(Biblioteca.importar_usuarios)
+    realizar_emprestimo = _mutacao(Biblioteca.realizar_emprestimo)
+    registrar_devolucao_item = _mutacao(Biblioteca.registrar_devolucao_item)
+    reservar_item = _mutacao(Biblioteca.reservar_item)
+    cancelar_reserva = _mutacao(Biblioteca.cancelar_reserva)
+    expirar_reservas = _mutacao(Biblioteca.expirar_reservas)
+
+    def adicionar_exemplares(self, titulo_item, quantidade=1, data_referencia=None):
+        # O snapshot lê o total de exemplares depois de a porta reabrir; o
+        # total da captura fica guardado antes da primeira mudança
+        with self._porta():
+            item = Biblioteca.buscar_item_por_titulo(self, titulo_item)
+            if isinstance(item, ItemEmprestavel):
+                self._exemplares_congelados.setdefault(id(item), item.get_total_exemplares())
+            return Biblioteca.adicionar_exemplares(self, titulo_item, quantidade, data_referencia)
+
+    def remover_item_catalogo(self, item_titulo):
+        # Com a trava do item, um empréstimo que já achou o item termina (e
+        # vai para o diário) antes da remoção. Ordem das travas: usuário,
+        # item, diário, catálogo.
+        with self._porta():
+            item = self.buscar_item_por_titulo(item_titulo)
+            if item is None:
+                return False
+            with self._travas_itens.travar(item), self._trava_diario:
+                return Biblioteca.remover_item_catalogo(self, item_titulo)
+
+    @contextmanager
+    def _porta(self):
+        # Chamadas aninhadas (expirar_reservas dentro de um empréstimo) já
+        # estão do lado de dentro
+        profundidade = getattr(self._local, "profundidade", 0)
+        if not profundidade:
+            with self._condicao:
+                while self._porta_fechada:
+                    self._condicao.wait()
+                self._em_andamento += 1
+        self._local.profundidade = profundidade + 1
+        try:
+            yield
+        finally:
+            self._local.profundidade = profundidade
+            if not profundidade:
+                with self._condicao:
+                    self._em_andamento -= 1
+                    if not self._em_andamento:
+                        self._condicao.notify_all()
+                    compactar = self._compactacao_pendente
+                    self._compactacao_pendente = False
+                if compactar:
+                    self.compactar()
+
+    def _verificar_limites(self, usuario, item):
+        # Empréstimos do diário já foram aceitos, mesmo que os limites tenham mudado
+        if self._reproduzindo:
+            return None
+        return super()._verificar_limites(usuario, item)
+
+    # --- diário ---
+
+    def _segmentos(self):
+        return sorted(nome for nome in os.listdir(self.diretorio)
+                      if nome.startswith(PREFIXO_DIARIO) and nome.endswith(".jsonl"))
+
+    def _abrir_segmento(self):
+        caminho = os.path.join(self.diretorio, _nome_segmento(self._sequencia + 1))
+        self._diario = open(caminho, "a", encoding="utf-8")
+
+    def _registrar_mutacao(self, operacao, *argumentos):
+        if self._reproduzindo:
+            return
+        if operacao == "adicionar_item":
+            dados = item_para_registro(argumentos[0])
+        elif operacao == "remover_item":
+            dados = argumentos[0]
+        elif operacao == "adicionar_exemplares":
+            titulo, quantidade, data = argumentos
+            dados = [titulo, quantidade, data.isoformat()]
+        elif operacao == "registrar_usuario":
+            dados = usuario_para_registro(argumentos[0])
+        elif operacao == "importar_itens":
+            dados = [item_para_registro(item) for item in argumentos[0]]
+        elif operacao == "importar_usuarios":
+            dados = [usuario_para_registro(usuario) for usuario in argumentos[0]]
+        elif operacao == "emprestimo":
+            emprestimo = argumentos[0]
+            dados = [emprestimo.usuario.matricula, emprestimo.item.get_titulo(),
+                     emprestimo.data_emprestimo.isoformat(), emprestimo.data_devolucao_prevista.isoformat(),
+                     emprestimo.exemplar]
+        elif operacao == "devolucao":
+            emprestimo, data_devolucao_real = argumentos
+            dados = [emprestimo.usuario.matricula, emprestimo.item.get_titulo(), str(data_devolucao_real)]
+        elif operacao == "reserva":
+            reserva = argumentos[0]
+            dados = [reserva.usuario.matricula, reserva.item.get_titulo(), reserva.data_reserva.isoformat()]
+        elif operacao == "cancelar_reserva":
+            matricula, titulo, data = argumentos
+            dados = [matricula, titulo, str(data)]
+        elif operacao == "expirar_reservas":
+            dados = argumentos[0].isoformat()
+        else:
+            raise ValueError(f"Operação desconhecida: {operacao}")
+
+        with self._trava_diario:
+            self._sequencia += 1
+            entrada = {"seq": self._sequencia, "op": operacao, "dados": dados}
+            self._diario.write(json.dumps(entrada, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._diario.flush()
+            if self.sincronizar:
+                os.fsync(self._diario.fileno())
+            self._entradas_desde_snapshot += 1
+            cheio = self._entradas_desde_snapshot >= self.limite_diario
+        if cheio:
+            # A compactação espera as mutações em andamento, inclusive esta:
+            # roda quando ela sair da porta
+            with self._condicao:
+                self._compactacao_pendente = True
+        # Eventos só depois do diário: o que o assinante vê já está gravado
+        super()._registrar_mutacao(operacao, *argumentos)
+
+    def _aplicar(self, operacao, dados):
+        if operacao == "adicionar_item":
+            Biblioteca.adicionar_item_catalogo(self, item_de_registro(dados))
+        elif operacao == "remover_item":
+            Biblioteca.remover_item_catalogo(self, dados)
+        elif operacao == "registrar_usuario":
+            Biblioteca.registrar_usuario(self, usuario_de_registro(dados))
+        elif operacao == "importar_itens":
+            Biblioteca.importar_itens(self, dados)
+        elif operacao == "importar_usuarios":
+            Biblioteca.importar_usuarios(self, dados)
+        elif operacao == "adicionar_exemplares":
+            Biblioteca.adicionar_exemplares(self, *dados)
+        elif operacao == "emprestimo":
+            Biblioteca.realizar_emprestimo(self, *dados)
+        elif operacao == "devolucao":
+            Biblioteca.registrar_devolucao_item(self, *dados)
+        elif operacao == "reserva":
+            Biblioteca.reservar_item(self, *dados)
+        elif operacao == "cancelar_reserva":
+            Biblioteca.cancelar_reserva(self, *dados)
+        elif operacao == "expirar_reservas":
+            Biblioteca.expirar_reservas(self, dados)
+        else:
+            raise ValueError(f"Operação desconhecida no diário: {operacao}")
+
+    # --- carga ---
+
+    def _carregar(self):
+        self._reproduzindo = True
+        try:
+            caminho_snapshot = os.path.join(self.diretorio, ARQUIVO_SNAPSHOT)
+            if os.path.exists(caminho_snapshot):
+                with open(caminho_snapshot, encoding="utf-8") as arquivo:
+                    self._restaurar_snapshot(json.load(arquivo))
+            for nome in self._segmentos():
+                with open(os.path.join(self.diretorio, nome), encoding="utf-8") as arquivo:
+                    for linha in arquivo:
+                        try:
+                            entrada = json.loads(linha)
+                        except ValueError:
+                            # Linha incompleta no fim do diário (queda durante a escrita)
+                            break
+                        if entrada["seq"] <= self._sequencia:
+                            continue
+                        self._aplicar(entrada["op"], entrada["dados"])
+                        self._sequencia = entrada["seq"]
+                        self._entradas_desde_snapshot += 1
+        finally:
+            self._reproduzindo = False
+
+    def _restaurar_snapshot(self, snapshot):
+        self._sequencia = snapshot["seq"]
+        Biblioteca.importar_itens(self, snapshot["catalogo"])
+        Biblioteca.importar_usuarios(self, snapshot["usuarios"])
+        for registro in snapshot["emprestimos"]:
+            usuario = self.buscar_usuario_por_matricula(registro["matricula"])
+            indice = registro.get("item_indice")
+            item = self.catalogo[indice] if indice is not None else item_de_registro(registro["item"])
+            exemplar = usuario.pegar_livro_emprestado(item, registro.get("exemplar"))
+            if exemplar:
+                self._emprestimos.adicionar(Emprestimo(usuario, item, registro["data_emprestimo"],
+                                                       registro["data_devolucao_prevista"], exemplar))
+        for registro in snapshot.get("reservas", []):
+            usuario = self.buscar_usuario_por_matricula(registro["matricula"])
+            reserva = Reserva(usuario, self.catalogo[registro["item_indice"]], registro["data_reserva"])
+            if registro["situacao"] == Reserva.SEPARADA:
+                reserva.situacao = Reserva.SEPARADA
+                reserva.exemplar = reserva.item.emprestar(registro["exemplar"])
+                reserva.data_limite_retirada = para_data(registro["data_limite_retirada"])
+            self._reservas.adicionar(reserva)
+
+    # --- compactação ---
+
+    def compactar(self, aguardar=False):
+        if getattr(self._local, "profundidade", 0):
+            # Chamada de dentro de uma mutação: fica para a saída da porta
+            with self._condicao:
+                self._compactacao_pendente = True
+            return
+        # Uma compactação por vez, até a thread dela ter sido iniciada
+        with self._trava_compactacao:
+            with self._condicao:
+                self._porta_fechada = True
+                while self._em_andamento:
+                    self._condicao.wait()
+            try:
+                compactacao, nova = self._capturar_e_compactar()
+            finally:
+                with self._condicao:
+                    self._porta_fechada = False
+                    self._condicao.notify_all()
+            if nova:
+                # Iniciada com a porta já aberta: a thread nova costuma ficar
+                # com o GIL por um intervalo de troca inteiro antes de start() voltar
+                compactacao.start()
+        if aguardar:
+            compactacao.join()
+
+    def _capturar_e_compactar(self):
+        # Com a porta fechada nenhuma mutação está pela metade. Ela só fica
+        # fechada para trocar o segmento do diário e copiar as listas (cópias
+        # em C, sem percorrer os objetos) e as reservas ativas; o resto é
+        # lido pela thread de compactação com as operações já liberadas.
+        with self._trava_diario:
+            if self._compactacao is not None and self._compactacao.is_alive():
+                return self._compactacao, False
+            catalogo = list(self.catalogo)
+            # Do item, só o total de exemplares muda depois do cadastro
+            congelados = self._exemplares_congelados = {}
+            usuarios = list(self.usuarios_registrados)
+            emprestimos = list(self._emprestimos)
+            # Reservas mudam de situação; guardam-se os valores do momento
+            reservas = [(reserva.usuario.matricula, reserva.item, reserva.data_reserva, reserva.situacao,
+                         reserva.exemplar, reserva.data_limite_retirada) for reserva in self._reservas]
+            sequencia = self._sequencia
+            self._diario.close()
+            self._abrir_segmento()
+            self._entradas_desde_snapshot = 0
+            self._compactacao = threading.Thread(
+                target=self._gravar_snapshot,
+                args=(sequencia, catalogo, congelados, usuarios, emprestimos, reservas),
+                daemon=True,
+            )
+        return self._compactacao, True
+
+    def _gravar_snapshot(self, sequencia, catalogo, congelados, usuarios, emprestimos, reservas):
+        posicoes = {id(item): indice for indice, item in enumerate(catalogo)}
+        totais = [self._total_capturado(item, congelados) for item in catalogo]
+        registros_emprestimos = []
+        for emprestimo in emprestimos:
+            registro = {
+                "matricula": emprestimo.usuario.matricula,
+                "item_indice": posicoes.get(id(emprestimo.item)),
+                "data_emprestimo": emprestimo.data_emprestimo.isoformat(),
+                "data_devolucao_prevista": emprestimo.data_devolucao_prevista.isoformat(),
+                "exemplar": emprestimo.exemplar,
+            }
+            if registro["item_indice"] is None:
+                registro["item"] = item_para_registro(emprestimo.item)
+            registros_emprestimos.append(registro)
+        registros_reservas = []
+        for matricula, item, data_reserva, situacao, exemplar, data_limite in reservas:
+            if id(item) not in posicoes:
+                continue # item removido do catálogo
+            registros_reservas.append({
+                "matricula": matricula,
+                "item_indice": posicoes[id(item)],
+                "data_reserva": data_reserva.isoformat(),
+                "situacao": situacao,
+                "exemplar": exemplar,
+                "data_limite_retirada": data_limite.isoformat() if data_limite else None,
+            })
+        snapshot = {
+            "seq": sequencia,
+            "nome": self.nome,
+            "catalogo": [self._registro_snapshot(item, total) for item, total in zip(catalogo, totais)],
+            "usuarios": [usuario_para_registro(usuario) for usuario in usuarios],
+            "emprestimos": registros_emprestimos,
+            "reservas": registros_reservas,
+        }
+
+        caminho = os.path.join(self.diretorio, ARQUIVO_SNAPSHOT)
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(snapshot, arquivo, ensure_ascii=False, separators=(",", ":"))
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, caminho)
+        # Quem ainda tem o catálogo anterior mapeado continua lendo o anterior
+        exportar_catalogo(catalogo, os.path.join(self.diretorio, ARQUIVO_CATALOGO), totais)
+        self.catalogo_mapeado = CatalogoMapeado(os.path.join(self.diretorio, ARQUIVO_CATALOGO))
+
+        # Segmentos cujas entradas já estão no snapshot podem ser descartados
+        segmento_atual = _nome_segmento(sequencia + 1)
+        for nome in self._segmentos():
+            if nome < segmento_atual:
+                os.remove(os.path.join(self.diretorio, nome))
+
+    @staticmethod
+    def _total_capturado(item, congelados):
+        if not isinstance(item, ItemEmprestavel):
+            return None
+        # O total atual é lido antes de consultar os congelados: se uma
+        # adição já mudou o item, o total da captura já está lá
+        total = item.get_total_exemplares()
+        return congelados.get(id(item), total)
+
+    @staticmethod
+    def _registro_snapshot(item, total):
+        registro = item_para_registro(item)
+        if total is not None:
+            registro["exemplares"] = total
+        return registro
+
+    def fechar(self):
+        if self._compactacao is not None:
+            self._compactacao.join()
+        with self._trava_diario:
+            if self._diario is not None:
+                self._diario.flush()
+                os.fsync(self._diario.fileno())
+                self._diario.close()
+                self._diario = None
+        if self.catalogo_mapeado is not None:
+            self.catalogo_mapeado.fechar()
+            self.catalogo_mapeado = None
@@ -0,0 +1,332 @@
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+from biblioteca_models import (
+    ConfiguracaoBiblioteca, Emprestimo, ItemBibliografico, Recusa, RelatorioImportacao, Usuario, para_data,
+    item_de_registro, item_de_registro_com_estado, item_para_registro, usuario_de_registro
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS itens (
+    id INTEGER PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    titulo TEXT NOT NULL,
+    titulo_chave TEXT NOT NULL,
+    ano_publicacao INTEGER NOT NULL,
+    isbn TEXT,
+    genero TEXT,
+    autor_nome TEXT,
+    autor_email TEXT,
+    autor_biografia TEXT,
+    edicao TEXT,
+    editora TEXT,
+    duracao_minutos INTEGER,
+    diretor TEXT,
+    exemplares INTEGER NOT NULL DEFAULT 1,
+    exemplares_disponiveis INTEGER NOT NULL DEFAULT 1,
+    removido INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_itens_titulo ON itens (titulo_chave, id) WHERE removido = 0;
+CREATE TABLE IF NOT EXISTS usuarios (
+    matricula TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    email TEXT NOT NULL,
+    ordem INTEGER NOT NULL
+);
+-- Sem este índice, o MAX(ordem) de cada inclusão percorre a tabela inteira
+CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_ordem ON usuarios (ordem);
+CREATE TABLE IF NOT EXISTS emprestimos (
+    id INTEGER PRIMARY KEY,
+    matricula TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    data_emprestimo TEXT NOT NULL,
+    data_devolucao_prevista TEXT NOT NULL,
+    data_devolucao_real TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_usuario
+    ON emprestimos (matricula, item_id) WHERE data_devolucao_real IS NULL;
+CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_item
+    ON emprestimos (item_id) WHERE data_devolucao_real IS NULL;
+"""
+
+COLUNAS_ITEM = ("tipo", "titulo", "titulo_chave", "ano_publicacao", "isbn", "genero",
+                "autor_nome", "autor_email", "autor_biografia", "edicao", "editora",
+                "duracao_minutos", "diretor", "exemplares")
+
+# Comandos fixos: o sqlite3 mantém cada um preparado no cache da conexão
+# Um item novo entra com todos os exemplares disponíveis
+SQL_INSERIR_ITEM = (f"INSERT INTO itens ({', '.join(COLUNAS_ITEM)}, exemplares_disponiveis) "
+                    f"VALUES ({', '.join('?' for _ in COLUNAS_ITEM)}, ?)")
+SQL_BUSCAR_ITEM = ("SELECT * FROM itens WHERE titulo_chave = ? AND removido = 0 "
+                   "ORDER BY id LIMIT 1")
+SQL_REMOVER_ITEM = "UPDATE itens SET removido = 1 WHERE id = ?"
+SQL_LISTAR_ITENS = "SELECT * FROM itens WHERE removido = 0 ORDER BY id"
+SQL_INSERIR_USUARIO = ("INSERT INTO usuarios (matricula, nome, email, ordem) "
+                       "VALUES (?, ?, ?, (SELECT COALESCE(MAX(ordem), 0) + 1 FROM usuarios))")
+SQL_BUSCAR_USUARIO = "SELECT matricula, nome, email FROM usuarios WHERE matricula = ?"
+SQL_LISTAR_USUARIOS = "SELECT matricula, nome, email FROM usuarios ORDER BY ordem"
+SQL_OCUPAR_ITEM = ("UPDATE itens SET exemplares_disponiveis = exemplares_disponiveis - 1 "
+                   "WHERE id = ? AND exemplares_disponiveis > 0")
+SQL_LIBERAR_ITEM = ("UPDATE itens SET exemplares_disponiveis = exemplares_disponiveis + 1 "
+                    "WHERE id = ? AND exemplares_disponiveis < exemplares")
+SQL_ADICIONAR_EXEMPLARES = ("UPDATE itens SET exemplares = exemplares + ?, "
+                            "exemplares_disponiveis = exemplares_disponiveis + ? WHERE id = ?")
+SQL_POSSUI_EMPRESTIMO = ("SELECT 1 FROM emprestimos WHERE matricula = ? AND item_id = ? "
+                         "AND data_devolucao_real IS NULL LIMIT 1")
+SQL_CONTAR_EMPRESTIMOS = "SELECT COUNT(*) FROM emprestimos WHERE matricula = ? AND data_devolucao_real IS NULL"
+SQL_CONTAR_EMPRESTIMOS_TIPO = (
+    "SELECT COUNT(*) FROM emprestimos e JOIN itens i ON i.id = e.item_id "
+    "WHERE e.matricula = ? AND e.data_devolucao_real IS NULL AND i.tipo = ?"
+)
+SQL_INSERIR_EMPRESTIMO = ("INSERT INTO emprestimos (matricula, item_id, data_emprestimo, "
+                          "data_devolucao_prevista) VALUES (?, ?, ?, ?)")
+SQL_BUSCAR_EMPRESTIMO_ATIVO = (
+    "SELECT e.id, e.item_id, i.titulo, u.nome FROM emprestimos e "
+    "JOIN itens i ON i.id = e.item_id JOIN usuarios u ON u.matricula = e.matricula "
+    "WHERE e.matricula = ? AND i.titulo_chave = ? AND e.data_devolucao_real IS NULL LIMIT 1"
+)
+SQL_ENCERRAR_EMPRESTIMO = "UPDATE emprestimos SET data_devolucao_real = ? WHERE id = ?"
+SQL_LISTAR_EMPRESTIMOS_ATIVOS = (
+    "SELECT e.data_emprestimo, e.data_devolucao_prevista, u.matricula, u.nome, u.email, i.* "
+    "FROM emprestimos e JOIN usuarios u ON u.matricula = e.matricula "
+    "JOIN itens i ON i.id = e.item_id WHERE e.data_devolucao_real IS NULL ORDER BY e.id"
+)
+
+TIPOS_EMPRESTAVEIS = ("livro", "dvd")
+
+
+class PoolConexoes:
+    def __init__(self, caminho, tamanho=4):
+        if tamanho <= 0:
+            raise ValueError("Tamanho do pool inválido.")
+        if caminho == ":memory:":
+            # Cada conexão teria o seu próprio banco em memória
+            raise ValueError("O pool exige um banco de dados em arquivo.")
+        self._conexoes = queue.Queue()
+        self._todas = []
+        for _ in range(tamanho):
+            conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None,
+                                      cached_statements=128, timeout=30)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexoes.put(conexao)
+            self._todas.append(conexao)
+
+    @contextmanager
+    def conexao(self):
+        conexao = self._conexoes.get()
+        try:
+            yield conexao
+        finally:
+            self._conexoes.put(conexao)
+
+    @contextmanager
+    def transacao(self):
+        # BEGIN IMMEDIATE reserva a escrita já no início, evitando que duas
+        # transações leiam a mesma disponibilidade e tentem gravar depois.
+        with self.conexao() as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                yield conexao
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+            else:
+                conexao.execute("COMMIT")
+
+    def fechar(self):
+        for conexao in self._todas:
+            conexao.close()
+
+
+def _valores_item(item):
+    registro = item_para_registro(item)
+    registro["titulo_chave"] = item.get_titulo().casefold()
+    registro.setdefault("exemplares", 1) # Revistas e itens genéricos não são emprestados
+    return tuple(registro.get(coluna) for coluna in COLUNAS_ITEM) + (registro["exemplares"],)
+
+
+def _migrar_esquema(conexao):
+    # Bancos criados antes da contagem de exemplares só tinham a coluna
+    # disponivel (um exemplar por item)
+    colunas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(itens)")}
+    if "exemplares" not in colunas:
+        conexao.execute("ALTER TABLE itens ADD COLUMN exemplares INTEGER NOT NULL DEFAULT 1")
+        conexao.execute("ALTER TABLE itens ADD COLUMN exemplares_disponiveis INTEGER NOT NULL DEFAULT 1")
+        if "disponivel" in colunas:
+            conexao.execute("UPDATE itens SET exemplares_disponiveis = disponivel")
+
+
+def _item_de_linha(linha):
+    return item_de_registro_com_estado({chave: linha[chave] for chave in linha.keys()})
+
+
+class BibliotecaSQLite:
+    # Mesma interface pública de Biblioteca, com o estado no SQLite.
+    # Os objetos devolvidos pelas buscas são cópias dos registros do banco.
+    # Ainda não há reservas nem números de exemplar: o banco guarda só
+    # quantos exemplares de cada item estão livres.
+
+    def __init__(self, nome, caminho, tamanho_pool=4, config=None):
+        self.nome = nome
+        self.caminho = caminho
+        # Lida a cada empréstimo, como em Biblioteca
+        self.config = config if config is not None else ConfiguracaoBiblioteca()
+        self._pool = PoolConexoes(caminho, tamanho_pool)
+        with self._pool.conexao() as conexao:
+            conexao.executescript(ESQUEMA)
+        with self._pool.transacao() as conexao:
+            _migrar_esquema(conexao)
+
+    def fechar(self):
+        self._pool.fechar()
+
+    @property
+    def catalogo(self):
+        with self._pool.conexao() as conexao:
+            return [_item_de_linha(linha) for linha in conexao.execute(SQL_LISTAR_ITENS)]
+
+    @property
+    def usuarios_registrados(self):
+        with self._pool.conexao() as conexao:
+            return [Usuario(linha["nome"], linha["email"], linha["matricula"])
+                    for linha in conexao.execute(SQL_LISTAR_USUARIOS)]
+
+    @property
+    def emprestimos_ativos(self):
+        emprestimos = []
+        with self._pool.conexao() as conexao:
+            for linha in conexao.execute(SQL_LISTAR_EMPRESTIMOS_ATIVOS):
+                usuario = Usuario(linha["nome"], linha["email"], linha["matricula"])
+                emprestimos.append(Emprestimo(usuario, _item_de_linha(linha),
+                                              linha["data_emprestimo"], linha["data_devolucao_prevista"]))
+        return emprestimos
+
+    def adicionar_item_catalogo(self, item):
+        if not isinstance(item, ItemBibliografico):
+            raise TypeError("Só é possível adicionar Itens Bibliográficos ao catálogo.")
+        with self._pool.transacao() as conexao:
+            conexao.execute(SQL_INSERIR_ITEM, _valores_item(item))
+
+    def remover_item_catalogo(self, item_titulo):
+        with self._pool.transacao() as conexao:
+            linha = conexao.execute(SQL_BUSCAR_ITEM, (item_titulo.casefold(),)).fetchone()
+            if linha is None:
+                return False
+            conexao.execute(SQL_REMOVER_ITEM, (linha["id"],))
+            return True
+
+    def registrar_usuario(self, usuario):
+        if not isinstance(usuario, Usuario):
+            raise TypeError("Só é possível registrar Usuários.")
+        try:
+            with self._pool.transacao() as conexao:
+                conexao.execute(SQL_INSERIR_USUARIO, (usuario.matricula, usuario.nome, usuario.email))
+        except sqlite3.IntegrityError:
+            raise ValueError("Usuário com esta matrícula já registrado.")
+
+    def importar_itens(self, registros):
+        relatorio = RelatorioImportacao()
+        valores = []
+        for numero, registro in enumerate(registros, start=1):
+            try:
+                item = registro if isinstance(registro, ItemBibliografico) else item_de_registro(registro)
+            except (ValueError, TypeError, AttributeError) as e:
+                relatorio.registrar_erro(numero, str(e))
+                continue
+            valores.append(_valores_item(item))
+        with self._pool.transacao() as conexao:
+            conexao.executemany(SQL_INSERIR_ITEM, valores)
+        relatorio.importados = len(valores)
+        return relatorio
+
+    def importar_usuarios(self, registros):
+        relatorio = RelatorioImportacao()
+        with self._pool.transacao() as conexao:
+            for numero, registro in enumerate(registros, start=1):
+                try:
+                    usuario = registro if isinstance(registro, Usuario) else usuario_de_registro(registro)
+                    conexao.execute(SQL_INSERIR_USUARIO, (usuario.matricula, usuario.nome, usuario.email))
+                except sqlite3.IntegrityError:
+                    relatorio.registrar_erro(numero, "Usuário com esta matrícula já registrado.")
+                    continue
+                except (ValueError, TypeError, AttributeError) as e:
+                    relatorio.registrar_erro(numero, str(e))
+                    continue
+                relatorio.importados += 1
+        return relatorio
+
+    def buscar_item_por_titulo(self, titulo):
+        with self._pool.conexao() as conexao:
+            linha = conexao.execute(SQL_BUSCAR_ITEM, (titulo.casefold(),)).fetchone()
+        return _item_de_linha(linha) if linha is not None else None
+
+    def buscar_usuario_por_matricula(self, matricula):
+        with self._pool.conexao() as conexao:
+            linha = conexao.execute(SQL_BUSCAR_USUARIO, (matricula,)).fetchone()
+        if linha is None:
+            return None
+        return Usuario(linha["nome"], linha["email"], linha["matricula"])
+
+    def _verificar_limites(self, conexao, matricula, tipo):
+        # Mesmas regras e mensagens de Biblioteca._verificar_limites
+        maximo = self.config.get_max_livros_por_usuario()
+        if conexao.execute(SQL_CONTAR_EMPRESTIMOS, (matricula,)).fetchone()[0] >= maximo:
+            return Recusa(f"Limite de {maximo} empréstimo(s) por usuário atingido.")
+        limite_tipo = self.config.get_limite_por_tipo(tipo)
+        if (limite_tipo is not None
+                and conexao.execute(SQL_CONTAR_EMPRESTIMOS_TIPO, (matricula, tipo)).fetchone()[0] >= limite_tipo):
+            return Recusa(f"Limite de {limite_tipo} empréstimo(s) do tipo '{tipo}' por usuário atingido.")
+        return None
+
+    def adicionar_exemplares(self, titulo_item, quantidade=1):
+        if not isinstance(quantidade, int) or quantidade < 1:
+            raise ValueError("Quantidade de exemplares inválida")
+        with self._pool.transacao() as conexao:
+            item = conexao.execute(SQL_BUSCAR_ITEM, (titulo_item.casefold(),)).fetchone()
+            if item is None:
+                return False
+            if item["tipo"] not in TIPOS_EMPRESTAVEIS:
+                raise TypeError("Este tipo de item não possui exemplares para empréstimo.")
+            conexao.execute(SQL_ADICIONAR_EXEMPLARES, (quantidade, quantidade, item["id"]))
+            return True
+
+    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista=None):
+        with self._pool.transacao() as conexao:
+            usuario = conexao.execute(SQL_BUSCAR_USUARIO, (matricula_usuario,)).fetchone()
+            item = conexao.execute(SQL_BUSCAR_ITEM, (titulo_item.casefold(),)).fetchone()
+
+            if not usuario:
+                return Recusa("Usuário não encontrado.")
+            if not item:
+                return Recusa("Item não encontrado no catálogo.")
+            if item["tipo"] not in TIPOS_EMPRESTAVEIS:
+                return Recusa("Este tipo de item não pode ser emprestado.")
+            # BEGIN IMMEDIATE já reservou a escrita: nada muda entre estas
+            # verificações e a atualização abaixo
+            if item["exemplares_disponiveis"] <= 0:
+                return Recusa(f"Item '{item['titulo']}' não está disponível para empréstimo.")
+            if conexao.execute(SQL_POSSUI_EMPRESTIMO, (matricula_usuario, item["id"])).fetchone():
+                return Recusa(f"Usuário já possui um exemplar de '{item['titulo']}'.")
+            recusa = self._verificar_limites(conexao, matricula_usuario, item["tipo"])
+            if recusa:
+                return recusa
+            if data_devolucao_prevista is None:
+                data_devolucao_prevista = self.config.data_devolucao_padrao(item["tipo"], data_emprestimo)
+            conexao.execute(SQL_OCUPAR_ITEM, (item["id"],))
+            conexao.execute(SQL_INSERIR_EMPRESTIMO, (matricula_usuario, item["id"],
+                                                     para_data(data_emprestimo).isoformat(),
+                                                     para_data(data_devolucao_prevista).isoformat()))
+            return f"Empréstimo de '{item['titulo']}' para '{usuario['nome']}' realizado com sucesso."
+
+    def registrar_devolucao_item(self, matricula_usuario, titulo_item, data_devolucao_real):
+        with self._pool.transacao() as conexao:
+            emprestimo = conexao.execute(SQL_BUSCAR_EMPRESTIMO_ATIVO,
+                                         (matricula_usuario, titulo_item.casefold())).fetchone()
+            if not emprestimo:
+                return Recusa("Empréstimo não encontrado ou já devolvido.")
+            conexao.execute(SQL_ENCERRAR_EMPRESTIMO, (str(data_devolucao_real), emprestimo["id"]))
+            conexao.execute(SQL_LIBERAR_ITEM, (emprestimo["item_id"],))
+            return f"Item {emprestimo['titulo']} devolvido por {emprestimo['nome']} em {data_devolucao_real}."
@@ -0,0 +1,214 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from biblioteca_models import Biblioteca
+from indice_busca import PALAVRAS_VAZIAS, IndiceBusca, normalizar, tokenizar, trigramas
+
+CAPACIDADE_PADRAO = 1024
+# Importações maiores que isso limpam o cache em vez de testar entrada por entrada
+LIMITE_INVALIDACAO_PRECISA = 64
+# buscar_item_por_titulo já é uma consulta a dicionário, mais barata que o
+# próprio cache; pode ser incluída em operacoes se for preciso
+OPERACOES_EM_CACHE = ("buscar_itens", "completar_termo", "sugerir_titulos")
+
+
+def _termos_consulta(consulta):
+    # Os mesmos termos que IndiceBusca.buscar exige de cada resultado
+    termos = tokenizar(consulta)
+    if any(termo not in PALAVRAS_VAZIAS for termo in termos):
+        termos = [termo for termo in termos if termo not in PALAVRAS_VAZIAS]
+    return termos
+
+
+class _ItemAlterado:
+    # O que as entradas do cache consultam sobre um item incluído ou removido
+    __slots__ = ("chave_titulo", "tokens", "trigramas")
+
+    def __init__(self, item):
+        self.chave_titulo = Biblioteca._chave_titulo(item.get_titulo())
+        self.tokens = tuple(IndiceBusca._tokens_do_item(item))
+        self.trigramas = trigramas(normalizar(item.get_titulo()))
+
+    def tem_prefixo(self, termo):
+        return any(token.startswith(termo) for token in self.tokens)
+
+
+def _dependencia(operacao, argumentos):
+    # Devolve a função que diz se um item alterado pode mudar o resultado
+    if operacao == "buscar_item_por_titulo":
+        chave = Biblioteca._chave_titulo(argumentos[0])
+        return lambda alterado: alterado.chave_titulo == chave
+    if operacao == "buscar_itens":
+        termos = _termos_consulta(argumentos[0])
+        return lambda alterado: bool(termos) and all(alterado.tem_prefixo(termo) for termo in termos)
+    if operacao == "completar_termo":
+        termos = tokenizar(argumentos[0])
+        return lambda alterado: bool(termos) and alterado.tem_prefixo(termos[-1])
+    grams = trigramas(normalizar(argumentos[0]))
+    return lambda alterado: not grams.isdisjoint(alterado.trigramas)
+
+
+class CacheBusca:
+    # Cache LRU (com validade opcional em segundos) dos resultados das buscas
+    # da Biblioteca. Incluir ou remover um item descarta só as entradas cujo
+    # resultado ele poderia mudar: a do título, as buscas cujos termos todos
+    # aparecem no item, os prefixos de completar_termo e as sugestões que
+    # compartilham um trigrama com o título. A mudança no total do catálogo,
+    # que mexe levemente na pontuação de outras buscas, não invalida nada.
+    #
+    # Os resultados guardam os próprios objetos do catálogo, e não cópias:
+    # esta_disponivel() é sempre lido na hora, então empréstimos e devoluções
+    # não deixam nenhuma entrada desatualizada.
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO, ttl=None, relogio=time.monotonic):
+        if not isinstance(capacidade, int) or capacidade < 1:
+            raise ValueError("Capacidade do cache inválida.")
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.acertos = 0
+        self.faltas = 0
+        self.despejos = 0
+        self.expiradas = 0
+        self.invalidacoes = 0
+        self._relogio = relogio
+        self._entradas = OrderedDict()
+        # Muda a cada invalidação: um resultado calculado antes dela não é guardado
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, chave):
+        # Devolve (encontrado, valor, geração)
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                if entrada[2] is None or entrada[2] > self._relogio():
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return True, entrada[0], self._geracao
+                del self._entradas[chave]
+                self.expiradas += 1
+            self.faltas += 1
+            return False, None, self._geracao
+
+    def guardar(self, chave, valor, geracao, dependencia):
+        validade = self._relogio() + self.ttl if self.ttl is not None else None
+        with self._trava:
+            if geracao != self._geracao:
+                return False
+            self._entradas[chave] = (valor, dependencia, validade)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.despejos += 1
+            return True
+
+    def invalidar_itens(self, itens):
+        if len(itens) > LIMITE_INVALIDACAO_PRECISA:
+            self.limpar()
+            return
+        alterados = [_ItemAlterado(item) for item in itens]
+        with self._trava:
+            self._geracao += 1
+            afetadas = [chave for chave, (_, dependencia, _) in self._entradas.items()
+                        if any(dependencia(alterado) for alterado in alterados)]
+            for chave in afetadas:
+                del self._entradas[chave]
+            self.invalidacoes += len(afetadas)
+
+    def limpar(self):
+        with self._trava:
+            self._geracao += 1
+            self.invalidacoes += len(self._entradas)
+            self._entradas.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.faltas
+            return {
+                "tamanho": len(self._entradas),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": self.acertos / consultas if consultas else None,
+                "despejos": self.despejos,
+                "expiradas": self.expiradas,
+                "invalidacoes": self.invalidacoes,
+            }
+
+
+def _em_cache(metodo, operacao, cache):
+    @functools.wraps(metodo)
+    def envoltorio(*args, **kwargs):
+        if kwargs:
+            # Chamadas com argumentos nomeados (raras) não passam pelo cache
+            return metodo(*args, **kwargs)
+        chave = (operacao,) + args
+        encontrado, resultado, geracao = cache.obter(chave)
+        if encontrado:
+            return resultado
+        resultado = metodo(*args)
+        cache.guardar(chave, resultado, geracao, _dependencia(operacao, args))
+        return resultado
+    envoltorio.metodo_original = metodo
+    envoltorio.cache = cache
+    return envoltorio
+
+
+def ativar_cache(biblioteca, cache=None, operacoes=OPERACOES_EM_CACHE):
+    # Como metricas.instrumentar, troca os métodos desta instância. Se
+    # buscar_item_por_titulo estiver em cache, o empréstimo também passa por
+    # ele e recebe o mesmo objeto que o índice devolveria.
+    if getattr(biblioteca, "cache_busca", None) is not None:
+        return biblioteca.cache_busca
+    registrar_mutacao = getattr(biblioteca, "_registrar_mutacao", None)
+    if registrar_mutacao is None:
+        raise TypeError("O cache de buscas precisa de uma Biblioteca em memória.")
+    cache = cache if cache is not None else CacheBusca()
+    for operacao in operacoes:
+        metodo = getattr(biblioteca, operacao, None)
+        if metodo is not None:
+            setattr(biblioteca, operacao, _em_cache(metodo, operacao, cache))
+
+    def invalidar(operacao, *argumentos):
+        # Chamado ainda com a trava do catálogo, logo depois da inclusão
+        if operacao == "adicionar_item":
+            cache.invalidar_itens(argumentos)
+        elif operacao == "importar_itens":
+            cache.invalidar_itens(argumentos[0])
+        registrar_mutacao(operacao, *argumentos)
+    invalidar.metodo_original = registrar_mutacao
+    invalidar.cache = cache
+    biblioteca._registrar_mutacao = invalidar
+
+    # A mutação "remover_item" traz só o título; o item sai do cache aqui
+    remover_item_catalogo = biblioteca.remover_item_catalogo
+
+    @functools.wraps(remover_item_catalogo)
+    def remover(item_titulo):
+        item = biblioteca._itens_por_titulo.get(Biblioteca._chave_titulo(item_titulo), [None])[0]
+        removido = remover_item_catalogo(item_titulo)
+        if removido:
+            cache.invalidar_itens([item])
+        return removido
+    remover.metodo_original = remover_item_catalogo
+    remover.cache = cache
+    biblioteca.remover_item_catalogo = remover
+
+    biblioteca.cache_busca = cache
+    return cache
+
+
+def desativar_cache(biblioteca):
+    for nome, valor in list(vars(biblioteca).items()):
+        if getattr(valor, "cache", None) is biblioteca.cache_busca and hasattr(valor, "metodo_original"):
+            original = valor.metodo_original
+            if getattr(original, "__func__", None) is getattr(type(biblioteca), nome, None):
+                delattr(biblioteca, nome)
+            else:
+                setattr(biblioteca, nome, original)
+    biblioteca.cache_busca = None
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from biblioteca_models import Autor, Biblioteca, Livro, Usuario
+from servidor import iniciar_servidor_em_thread
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def biblioteca_sintetica(quantidade_itens, quantidade_usuarios):
+    biblioteca = Biblioteca("Biblioteca de Carga")
+    autor = Autor("Autor Sintético", "autor@example.com")
+    biblioteca.importar_itens(Livro(f"Livro {i}", 2000, f"ISBN-{i}", autor) for i in range(quantidade_itens))
+    biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"leitor{i}@example.com", f"U{i}")
+                                 for i in range(quantidade_usuarios))
+    return biblioteca
+
+
+async def _cliente(host, porta, requisicoes, quantidade_itens, quantidade_usuarios, semente, latencias, erros):
+    gerador = random.Random(semente)
+    leitor, escritor = await asyncio.open_connection(host, porta, limit=1024 * 1024)
+    try:
+        for numero in range(requisicoes):
+            sorteio = gerador.random()
+            titulo = f"Livro {gerador.randrange(quantidade_itens)}"
+            matricula = f"U{gerador.randrange(quantidade_usuarios)}"
+            if sorteio < 0.8:
+                requisicao = {"op": "buscar_item_por_titulo", "args": [titulo]}
+            elif sorteio < 0.9:
+                requisicao = {"op": "realizar_emprestimo", "args": [matricula, titulo, "2024-01-01", "2024-01-15"]}
+            else:
+                requisicao = {"op": "registrar_devolucao_item", "args": [matricula, titulo, "2024-01-10"]}
+            requisicao["id"] = numero
+            inicio = time.perf_counter()
+            escritor.write((json.dumps(requisicao, ensure_ascii=False) + "\n").encode("utf-8"))
+            await escritor.drain()
+            resposta = json.loads(await leitor.readline())
+            latencias.append(time.perf_counter() - inicio)
+            if not resposta["ok"]:
+                erros.append(resposta["erro"])
+    finally:
+        escritor.close()
+
+
+async def gerar_carga(host, porta, conexoes, requisicoes, quantidade_itens, quantidade_usuarios):
+    latencias = []
+    erros = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        _cliente(host, porta, requisicoes, quantidade_itens, quantidade_usuarios, semente, latencias, erros)
+        for semente in range(conexoes)
+    ))
+    duracao = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "requisicoes": len(latencias),
+        "erros": len(erros),
+        "duracao_s": duracao,
+        "requisicoes_por_segundo": len(latencias) / duracao if duracao else 0.0,
+        "latencia_p50_ms": percentil(latencias, 50) * 1000,
+        "latencia_p99_ms": percentil(latencias, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerador de carga para o servidor da biblioteca")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--conexoes", type=int, default=50)
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições por conexão")
+    parser.add_argument("--itens", type=int, default=10000)
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--embutido", action="store_true",
+                        help="sobe um servidor local com dados sintéticos em vez de usar --host/--porta")
+    parser.add_argument("--threads", type=int, default=8, help="threads do servidor embutido")
+    argumentos = parser.parse_args()
+
+    host, porta = argumentos.host, argumentos.porta
+    if argumentos.embutido:
+        host = "127.0.0.1"
+        # Servidor em outra thread, com laço de eventos próprio, para que o
+        # gerador de carga não dispute o mesmo laço.
+        servidor = iniciar_servidor_em_thread(biblioteca_sintetica(argumentos.itens, argumentos.usuarios),
+                                              max_threads=argumentos.threads)
+        porta = servidor.porta
+
+    resultado = asyncio.run(gerar_carga(host, porta, argumentos.conexoes, argumentos.requisicoes,
+                                        argumentos.itens, argumentos.usuarios))
+    print(f"Requisições: {resultado['requisicoes']} ({resultado['erros']} com erro)")
+    print(f"Duração: {resultado['duracao_s']:.2f} s")
+    print(f"Vazão: {resultado['requisicoes_por_segundo']:.0f} req/s")
+    print(f"Latência p50: {resultado['latencia_p50_ms']:.2f} ms | p99: {resultado['latencia_p99_ms']:.2f} ms")
@@ -0,0 +1,217 @@
+import mmap
+import os
+import struct
+import zlib
+
+from biblioteca_models import DVD, Autor, Biblioteca, ItemBibliografico, Livro, Revista, tipo_item
+
+# Layout do arquivo (little-endian):
+#   cabeçalho | registros de tamanho fixo | índice de títulos | tabela de strings
+# Cada registro guarda tipo, ano, exemplares, duração e até seis referências
+# (deslocamento, tamanho) para strings UTF-8 da tabela, que guarda cada texto
+# repetido (autor, gênero, editora) uma única vez. O índice é uma tabela hash
+# de endereçamento aberto com (crc32 do título normalizado, registro + 1).
+MAGICO = b"BIBCAT\x00\x01"
+VERSAO = 1
+CABECALHO = struct.Struct("<8sIIIIQQQQ")
+REGISTRO = struct.Struct("<BxxxiII12I")
+POSICAO_HASH = struct.Struct("<II")
+SEM_TEXTO = 0xFFFFFFFF
+
+TIPOS = ("item", "livro", "revista", "dvd")
+# Campos de texto de cada tipo, na ordem das referências do registro
+CAMPOS_TEXTO = {
+    "item": ("titulo",),
+    "livro": ("titulo", "isbn", "genero", "autor_nome", "autor_email", "autor_biografia"),
+    "revista": ("titulo", "edicao", "editora"),
+    "dvd": ("titulo", "diretor"),
+}
+
+
+def _hash_titulo(titulo):
+    # Estável entre processos, ao contrário de hash()
+    return zlib.crc32(Biblioteca._chave_titulo(titulo).encode("utf-8"))
+
+
+def _textos_do_item(item, tipo):
+    if tipo == "livro":
+        return (item.titulo, item.isbn, item.genero, item.autor.nome, item.autor.email, item.autor.biografia)
+    if tipo == "revista":
+        return (item.titulo, item.edicao, item.editora)
+    if tipo == "dvd":
+        return (item.titulo, item.diretor)
+    return (item.titulo,)
+
+
+def exportar_catalogo(itens, caminho, exemplares=None):
+    # itens: uma Biblioteca (usa o catálogo dela) ou qualquer iterável de
+    # itens. Grava num arquivo temporário e o renomeia ao final, de modo que
+    # processos com o arquivo antigo aberto continuam lendo o antigo.
+    # exemplares: totais na ordem dos itens, no lugar dos atuais (a
+    # compactação grava os totais da captura, não os de agora).
+    if isinstance(itens, Biblioteca):
+        itens = itens.catalogo
+    if exemplares is not None:
+        exemplares = iter(exemplares)
+    strings = bytearray()
+    deslocamentos = {}
+    registros = bytearray()
+    hashes = []
+
+    def guardar(texto):
+        if texto is None:
+            return SEM_TEXTO, 0
+        if not isinstance(texto, str):
+            texto = str(texto)
+        referencia = deslocamentos.get(texto)
+        if referencia is None:
+            dados = texto.encode("utf-8")
+            referencia = deslocamentos[texto] = (len(strings), len(dados))
+            strings.extend(dados)
+        return referencia
+
+    for item in itens:
+        if not isinstance(item, ItemBibliografico):
+            raise TypeError("Só é possível exportar Itens Bibliográficos.")
+        tipo = tipo_item(item)
+        referencias = []
+        for texto in _textos_do_item(item, tipo):
+            referencias.extend(guardar(texto))
+        referencias.extend((SEM_TEXTO, 0) * (6 - len(referencias) // 2))
+        total = next(exemplares) if exemplares is not None else None
+        if total is None:
+            total = item.get_total_exemplares() if tipo in ("livro", "dvd") else 0
+        duracao = item.duracao_minutos if tipo == "dvd" else 0
+        registros.extend(REGISTRO.pack(TIPOS.index(tipo), item.ano_publicacao, total, duracao, *referencias))
+        hashes.append(_hash_titulo(item.titulo))
+
+    quantidade = len(hashes)
+    capacidade = 8
+    while capacidade < quantidade * 2:
+        capacidade *= 2
+    tabela = [(0, 0)] * capacidade
+    mascara = capacidade - 1
+    for posicao, valor in enumerate(hashes):
+        # Sondagem linear; títulos repetidos ficam depois do primeiro, que é
+        # o devolvido pela busca, como em Biblioteca.buscar_item_por_titulo
+        indice = valor & mascara
+        while tabela[indice][1]:
+            indice = (indice + 1) & mascara
+        tabela[indice] = (valor, posicao + 1)
+
+    inicio_registros = CABECALHO.size
+    inicio_hash = inicio_registros + len(registros)
+    inicio_strings = inicio_hash + capacidade * POSICAO_HASH.size
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(CABECALHO.pack(MAGICO, VERSAO, quantidade, capacidade, 0, inicio_registros, inicio_hash,
+                                     inicio_strings, len(strings)))
+        arquivo.write(registros)
+        arquivo.write(b"".join(POSICAO_HASH.pack(*posicao) for posicao in tabela))
+        arquivo.write(strings)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+    return quantidade
+
+
+class CatalogoMapeado:
+    # Catálogo somente leitura aberto com mmap: abrir não lê o arquivo, e os
+    # processos que abrem o mesmo arquivo compartilham as páginas em cache
+    # do sistema. Cada consulta decodifica só o registro que precisa e
+    # devolve um objeto novo (Livro, DVD, Revista), sem estado de empréstimo.
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, "rb") as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magico, versao, self._quantidade, self._capacidade, _, self._inicio_registros, self._inicio_hash,
+             self._inicio_strings, tamanho_strings) = CABECALHO.unpack_from(self._mapa, 0)
+            if magico != MAGICO or versao != VERSAO:
+                raise ValueError("Arquivo não é um catálogo exportado por exportar_catalogo.")
+            if self._inicio_strings + tamanho_strings > len(self._mapa):
+                raise ValueError("Arquivo de catálogo truncado.")
+        except (ValueError, struct.error):
+            self._mapa.close()
+            raise
+        self._mascara = self._capacidade - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+    def fechar(self):
+        self._mapa.close()
+
+    def __len__(self):
+        return self._quantidade
+
+    def __iter__(self):
+        for posicao in range(self._quantidade):
+            yield self.item(posicao)
+
+    def _texto(self, deslocamento, tamanho):
+        if deslocamento == SEM_TEXTO:
+            return None
+        inicio = self._inicio_strings + deslocamento
+        return str(self._mapa[inicio:inicio + tamanho], "utf-8")
+
+    def _titulo(self, posicao):
+        deslocamento, tamanho = struct.unpack_from("<II", self._mapa,
+                                                   self._inicio_registros + posicao * REGISTRO.size + 16)
+        return self._texto(deslocamento, tamanho)
+
+    def registro(self, posicao):
+        # Mesmo formato de item_para_registro
+        if not 0 <= posicao < self._quantidade:
+            raise IndexError("Posição fora do catálogo.")
+        tipo, ano, exemplares, duracao, *referencias = REGISTRO.unpack_from(
+            self._mapa, self._inicio_registros + posicao * REGISTRO.size)
+        tipo = TIPOS[tipo]
+        registro = {"tipo": tipo, "ano_publicacao": ano}
+        for numero, campo in enumerate(CAMPOS_TEXTO[tipo]):
+            registro[campo] = self._texto(referencias[2 * numero], referencias[2 * numero + 1])
+        if tipo == "dvd":
+            registro["duracao_minutos"] = duracao
+        if tipo in ("livro", "dvd"):
+            registro["exemplares"] = exemplares
+        return registro
+
+    def item(self, posicao):
+        registro = self.registro(posicao)
+        tipo = registro["tipo"]
+        if tipo == "livro":
+            autor = Autor(registro["autor_nome"], registro["autor_email"], registro["autor_biografia"])
+            return Livro(registro["titulo"], registro["ano_publicacao"], registro["isbn"], autor, registro["genero"],
+                         registro["exemplares"])
+        if tipo == "revista":
+            return Revista(registro["titulo"], registro["ano_publicacao"], registro["edicao"], registro["editora"])
+        if tipo == "dvd":
+            return DVD(registro["titulo"], registro["ano_publicacao"], registro["duracao_minutos"],
+                       registro["diretor"], registro["exemplares"])
+        return ItemBibliografico(registro["titulo"], registro["ano_publicacao"])
+
+    def posicao_do_titulo(self, titulo):
+        chave = Biblioteca._chave_titulo(titulo)
+        valor = zlib.crc32(chave.encode("utf-8"))
+        indice = valor & self._mascara
+        while True:
+            hash_posicao, registro = POSICAO_HASH.unpack_from(self._mapa,
+                                                              self._inicio_hash + indice * POSICAO_HASH.size)
+            if not registro:
+                return None
+            # O título só é decodificado quando o hash coincide
+            if hash_posicao == valor and Biblioteca._chave_titulo(self._titulo(registro - 1)) == chave:
+                return registro - 1
+            indice = (indice + 1) & self._mascara
+
+    def buscar_item_por_titulo(self, titulo):
+        posicao = self.posicao_do_titulo(titulo)
+        return self.item(posicao) if posicao is not None else None
+
+    def titulos(self):
+        for posicao in range(self._quantidade):
+            yield self._titulo(posicao)
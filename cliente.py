@@ -0,0 +1,208 @@
+import json
+import socket
+import threading
+
+from biblioteca_models import (
+    Emprestimo, PaginaCursor, Recusa, item_de_registro_com_estado, item_para_registro,
+    usuario_de_registro, usuario_para_registro
+)
+from indice_busca import PaginaResultados
+
+ERROS_REMOTOS = {"ValueError": ValueError, "TypeError": TypeError}
+TAMANHO_PAGINA_REMOTA = 200
+
+
+class ConfiguracaoRemota:
+    # A ConfiguracaoBiblioteca do servidor, com a mesma interface: cada
+    # leitura consulta o servidor, e as alterações valem para todos os
+    # clientes a partir da próxima operação.
+
+    def __init__(self, biblioteca):
+        self._biblioteca = biblioteca
+
+    def _registro(self):
+        return self._biblioteca._chamar("configuracoes")
+
+    @property
+    def max_livros_por_usuario(self):
+        return self._registro()["max_livros_por_usuario"]
+
+    @property
+    def dias_emprestimo_padrao(self):
+        return self._registro()["dias_emprestimo_padrao"]
+
+    @property
+    def dias_retirada_reserva(self):
+        return self._registro()["dias_retirada_reserva"]
+
+    @property
+    def limites_por_tipo(self):
+        return self._registro()["limites_por_tipo"]
+
+    @property
+    def dias_por_tipo(self):
+        return self._registro()["dias_por_tipo"]
+
+    def get_max_livros_por_usuario(self):
+        return self.max_livros_por_usuario
+
+    def set_max_livros_por_usuario(self, novo_maximo):
+        self._biblioteca._chamar("set_max_livros_por_usuario", novo_maximo)
+
+    def get_limite_por_tipo(self, tipo):
+        return self.limites_por_tipo.get(tipo)
+
+    def set_limite_por_tipo(self, tipo, novo_maximo):
+        self._biblioteca._chamar("set_limite_por_tipo", tipo, novo_maximo)
+
+    def get_dias_emprestimo(self, tipo=None):
+        registro = self._registro()
+        return registro["dias_por_tipo"].get(tipo, registro["dias_emprestimo_padrao"])
+
+    def set_dias_emprestimo(self, tipo, dias):
+        self._biblioteca._chamar("set_dias_emprestimo", tipo, dias)
+
+
+class BibliotecaRemota:
+    # Cliente síncrono de servidor.ServidorBiblioteca com a mesma interface
+    # usada pelo menu de main.py. Os objetos devolvidos são cópias locais.
+
+    def __init__(self, host="127.0.0.1", porta=8765, timeout=30):
+        self.nome = f"{host}:{porta}"
+        self.config = ConfiguracaoRemota(self)
+        self._socket = socket.create_connection((host, porta), timeout=timeout)
+        self._arquivo = self._socket.makefile("rwb")
+        self._trava = threading.Lock()
+        self._proximo_id = 0
+
+    def _chamar(self, operacao, *argumentos):
+        with self._trava:
+            self._proximo_id += 1
+            requisicao = {"id": self._proximo_id, "op": operacao, "args": list(argumentos)}
+            self._arquivo.write((json.dumps(requisicao, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._arquivo.flush()
+            linha = self._arquivo.readline()
+        if not linha:
+            raise ConnectionError("Conexão com o servidor encerrada.")
+        resposta = json.loads(linha)
+        if not resposta["ok"]:
+            raise ERROS_REMOTOS.get(resposta.get("tipo"), RuntimeError)(resposta["erro"])
+        if resposta.get("recusado") and isinstance(resposta["resultado"], str):
+            return Recusa(resposta["resultado"])
+        return resposta["resultado"]
+
+    def fechar(self):
+        self._arquivo.close()
+        self._socket.close()
+
+    @property
+    def catalogo(self):
+        return [item_de_registro_com_estado(registro) for registro in self._chamar("listar_itens")]
+
+    @property
+    def usuarios_registrados(self):
+        return [usuario_de_registro(registro) for registro in self._chamar("listar_usuarios")]
+
+    @staticmethod
+    def _emprestimo_de_registro(registro):
+        return Emprestimo(usuario_de_registro(registro["usuario"]),
+                          item_de_registro_com_estado(registro["item"]),
+                          registro["data_emprestimo"], registro["data_devolucao_prevista"],
+                          registro.get("exemplar"))
+
+    @property
+    def emprestimos_ativos(self):
+        return [self._emprestimo_de_registro(registro) for registro in self._chamar("listar_emprestimos_ativos")]
+
+    # --- listagens sob demanda: uma requisição por página ---
+
+    def _pagina(self, operacao, converter, cursor, por_pagina, *argumentos):
+        resultado = self._chamar(operacao, cursor, por_pagina, *argumentos)
+        return PaginaCursor([converter(registro) for registro in resultado["itens"]], resultado["proximo_cursor"])
+
+    def _iterar(self, operacao, converter, cursor, *argumentos):
+        while cursor is not None:
+            pagina = self._pagina(operacao, converter, cursor, TAMANHO_PAGINA_REMOTA, *argumentos)
+            yield from pagina.itens
+            cursor = pagina.proximo_cursor
+
+    def pagina_itens(self, cursor=0, por_pagina=20, tipo=None, disponivel=None, genero=None):
+        filtros = {"tipo": tipo, "disponivel": disponivel, "genero": genero}
+        return self._pagina("pagina_itens", item_de_registro_com_estado, cursor, por_pagina, filtros)
+
+    def iterar_itens(self, tipo=None, disponivel=None, genero=None, cursor=0):
+        filtros = {"tipo": tipo, "disponivel": disponivel, "genero": genero}
+        return self._iterar("pagina_itens", item_de_registro_com_estado, cursor, filtros)
+
+    def pagina_usuarios(self, cursor=0, por_pagina=20):
+        return self._pagina("pagina_usuarios", usuario_de_registro, cursor, por_pagina)
+
+    def iterar_usuarios(self, cursor=0):
+        return self._iterar("pagina_usuarios", usuario_de_registro, cursor)
+
+    def pagina_emprestimos_ativos(self, cursor=0, por_pagina=20, matricula=None):
+        return self._pagina("pagina_emprestimos_ativos", self._emprestimo_de_registro, cursor, por_pagina, matricula)
+
+    def iterar_emprestimos_ativos(self, matricula=None):
+        return self._iterar("pagina_emprestimos_ativos", self._emprestimo_de_registro, 0, matricula)
+
+    def emprestimos_atrasados(self, data_referencia):
+        return [self._emprestimo_de_registro(registro)
+                for registro in self._chamar("emprestimos_atrasados", str(data_referencia))]
+
+    def adicionar_item_catalogo(self, item):
+        self._chamar("adicionar_item_catalogo", item_para_registro(item))
+
+    def remover_item_catalogo(self, item_titulo):
+        return self._chamar("remover_item_catalogo", item_titulo)
+
+    def adicionar_exemplares(self, titulo_item, quantidade=1, data_referencia=None):
+        if data_referencia is not None:
+            data_referencia = str(data_referencia)
+        return self._chamar("adicionar_exemplares", titulo_item, quantidade, data_referencia)
+
+    def registrar_usuario(self, usuario):
+        self._chamar("registrar_usuario", usuario_para_registro(usuario))
+
+    def buscar_item_por_titulo(self, titulo):
+        registro = self._chamar("buscar_item_por_titulo", titulo)
+        return item_de_registro_com_estado(registro) if registro else None
+
+    def buscar_itens(self, consulta, pagina=1, por_pagina=10):
+        resultado = self._chamar("buscar_itens", consulta, pagina, por_pagina)
+        return PaginaResultados([item_de_registro_com_estado(registro) for registro in resultado["itens"]],
+                                resultado["total"], resultado["pagina"], resultado["por_pagina"],
+                                resultado.get("truncado", False))
+
+    def sugerir_titulos(self, titulo, limite=5):
+        return self._chamar("sugerir_titulos", titulo, limite)
+
+    def itens_do_autor(self, nome, email=None):
+        return [item_de_registro_com_estado(registro) for registro in self._chamar("itens_do_autor", nome, email)]
+
+    def buscar_usuario_por_matricula(self, matricula):
+        registro = self._chamar("buscar_usuario_por_matricula", matricula)
+        return usuario_de_registro(registro) if registro else None
+
+    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista=None,
+                            exemplar=None):
+        if data_devolucao_prevista is not None:
+            data_devolucao_prevista = str(data_devolucao_prevista)
+        return self._chamar("realizar_emprestimo", matricula_usuario, titulo_item,
+                            str(data_emprestimo), data_devolucao_prevista, exemplar)
+
+    def registrar_devolucao_item(self, matricula_usuario, titulo_item, data_devolucao_real):
+        return self._chamar("registrar_devolucao_item", matricula_usuario, titulo_item, str(data_devolucao_real))
+
+    def reservar_item(self, matricula_usuario, titulo_item, data_reserva):
+        return self._chamar("reservar_item", matricula_usuario, titulo_item, str(data_reserva))
+
+    def cancelar_reserva(self, matricula_usuario, titulo_item, data_cancelamento):
+        return self._chamar("cancelar_reserva", matricula_usuario, titulo_item, str(data_cancelamento))
+
+    def posicao_na_fila(self, matricula_usuario, titulo_item):
+        return self._chamar("posicao_na_fila", matricula_usuario, titulo_item)
+
+    def metricas(self):
+        # Texto no formato do Prometheus gerado pelo servidor
+        return self._chamar("metricas")
@@ -0,0 +1,180 @@
+import itertools
+import json
+import queue
+import threading
+from datetime import datetime
+
+
+class Evento:
+    # Cada alteração da biblioteca vira um evento tipado; os dados são cópias
+    # em dicionário, e não os objetos vivos, que continuam mudando.
+    __slots__ = ("sequencia", "momento", "dados")
+    tipo = "evento"
+
+    def __init__(self, dados, sequencia=0, momento=None):
+        self.sequencia = sequencia
+        self.momento = momento or datetime.now()
+        self.dados = dados
+
+    def __repr__(self):
+        return f"{type(self).__name__}(seq={self.sequencia}, dados={self.dados!r})"
+
+    def para_registro(self):
+        return {"seq": self.sequencia, "tipo": self.tipo, "momento": self.momento.isoformat(), "dados": self.dados}
+
+
+class ItemAdicionado(Evento):
+    __slots__ = ()
+    tipo = "item_adicionado"
+
+
+class ItensImportados(Evento):
+    __slots__ = ()
+    tipo = "itens_importados"
+
+
+class ItemRemovido(Evento):
+    __slots__ = ()
+    tipo = "item_removido"
+
+
+class ExemplaresAdicionados(Evento):
+    __slots__ = ()
+    tipo = "exemplares_adicionados"
+
+
+class UsuarioRegistrado(Evento):
+    __slots__ = ()
+    tipo = "usuario_registrado"
+
+
+class UsuariosImportados(Evento):
+    __slots__ = ()
+    tipo = "usuarios_importados"
+
+
+class EmprestimoRealizado(Evento):
+    __slots__ = ()
+    tipo = "emprestimo_realizado"
+
+
+class ItemDevolvido(Evento):
+    __slots__ = ()
+    tipo = "item_devolvido"
+
+
+class ReservaRegistrada(Evento):
+    __slots__ = ()
+    tipo = "reserva_registrada"
+
+
+class ReservaCancelada(Evento):
+    __slots__ = ()
+    tipo = "reserva_cancelada"
+
+
+class ReservasExpiradas(Evento):
+    __slots__ = ()
+    tipo = "reservas_expiradas"
+
+
+class Assinatura:
+    __slots__ = ("funcao", "tipos")
+
+    def __init__(self, funcao, tipos=None):
+        self.funcao = funcao
+        self.tipos = tuple(tipos) if tipos else None
+
+    def aceita(self, evento):
+        return self.tipos is None or isinstance(evento, self.tipos)
+
+
+class BarramentoEventos:
+    # Fila limitada + uma thread despachante. Quem publica nunca espera por
+    # um assinante lento: com a fila cheia o evento é descartado e contado.
+    # A thread só é criada quando aparece o primeiro assinante.
+
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self.descartados = 0
+        self.falhas = 0
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._assinaturas = ()
+        self._sequencia = itertools.count(1)
+        self._trava = threading.Lock()
+        self._despachante = None
+
+    def tem_assinantes(self):
+        return bool(self._assinaturas)
+
+    def assinar(self, funcao, tipos=None):
+        assinatura = Assinatura(funcao, tipos)
+        with self._trava:
+            # Tupla trocada por inteiro: o despachante lê sem travar
+            self._assinaturas = self._assinaturas + (assinatura,)
+            if self._despachante is None:
+                self._despachante = threading.Thread(target=self._despachar, daemon=True)
+                self._despachante.start()
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._trava:
+            self._assinaturas = tuple(a for a in self._assinaturas if a is not assinatura)
+
+    def publicar(self, classe_evento, dados):
+        if not self._assinaturas:
+            return None
+        evento = classe_evento(dados, next(self._sequencia))
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+            return None
+        return evento
+
+    def _despachar(self):
+        while True:
+            evento = self._fila.get()
+            try:
+                if evento is None:
+                    return
+                for assinatura in self._assinaturas:
+                    if assinatura.aceita(evento):
+                        try:
+                            assinatura.funcao(evento)
+                        except Exception:
+                            # Um assinante com erro não derruba os demais
+                            self.falhas += 1
+            finally:
+                self._fila.task_done()
+
+    def aguardar(self):
+        # Bloqueia até que todos os eventos já publicados tenham sido entregues
+        if self._despachante is not None:
+            self._fila.join()
+
+    def fechar(self):
+        # Entrega o que já está na fila e encerra a thread despachante
+        with self._trava:
+            despachante, self._despachante = self._despachante, None
+        if despachante is not None:
+            self._fila.put(None)
+            despachante.join()
+        with self._trava:
+            self._assinaturas = ()
+
+
+class ArquivoEventos:
+    # Assinante que grava os eventos em JSON Lines, um por linha, para
+    # processamento posterior em lote
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def __call__(self, evento):
+        self._arquivo.write(json.dumps(evento.para_registro(), ensure_ascii=False, default=str) + "\n")
+        self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
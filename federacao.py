@@ -0,0 +1,347 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from biblioteca_models import Biblioteca, ItemEmprestavel, usuario_de_registro, usuario_para_registro
+from indice_busca import PaginaResultados
+
+TTL_CACHE_PADRAO = 5.0
+TEMPO_LIMITE_PADRAO = 10.0
+
+
+class CacheTTL:
+    # Resultados de consultas guardados por alguns segundos. Uma entrada
+    # vencida só é descartada quando alguém a procura de novo.
+    def __init__(self, ttl=TTL_CACHE_PADRAO, relogio=time.monotonic):
+        self.ttl = ttl
+        self.acertos = 0
+        self.faltas = 0
+        self._relogio = relogio
+        self._entradas = {}
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] > self._relogio():
+                self.acertos += 1
+                return True, entrada[1]
+            if entrada is not None:
+                del self._entradas[chave]
+            self.faltas += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        if self.ttl <= 0:
+            return
+        with self._trava:
+            self._entradas[chave] = (self._relogio() + self.ttl, valor)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+
+class ItemFederado:
+    # Um título e as agências que têm o item, na ordem de cadastro delas
+    def __init__(self, item, agencias):
+        self.item = item
+        self.agencias = agencias
+
+    def __repr__(self):
+        return f"ItemFederado({self.item.get_titulo()!r}, {self.agencias!r})"
+
+
+class ResultadoFederado:
+    # Respostas por agência; as que falharam ou não responderam a tempo
+    # ficam em falhas (agência -> mensagem) em vez de derrubar a consulta
+    def __init__(self, respostas, falhas):
+        self.respostas = respostas
+        self.falhas = falhas
+
+
+class ResultadoOperacao:
+    # Resultado de um empréstimo ou devolução feito pela federação. O
+    # sucesso vem de uma consulta aos empréstimos ativos da agência, não do
+    # texto da mensagem; agencia é onde a operação foi (ou seria) feita.
+    def __init__(self, sucesso, mensagem, agencia=None):
+        self.sucesso = sucesso
+        self.mensagem = mensagem
+        self.agencia = agencia
+
+    def __str__(self):
+        return self.mensagem
+
+    def __repr__(self):
+        return f"ResultadoOperacao({self.sucesso!r}, {self.mensagem!r}, {self.agencia!r})"
+
+
+class FederacaoBibliotecas:
+    # Fachada sobre várias agências (Biblioteca, BibliotecaRemota ou outra
+    # implementação da mesma interface). As consultas vão a todas as
+    # agências ao mesmo tempo, num pool de threads, e esperam no máximo
+    # tempo_limite: a demora é a da agência mais lenta, não a soma de todas.
+    #
+    # Buscas ficam em cache por ttl_cache segundos. Empréstimos e devoluções
+    # nunca usam o cache e o limpam ao terminar. Um usuário pertence à
+    # agência onde está registrado; para emprestar um item de outra agência,
+    # a federação registra lá uma cópia do usuário e faz o empréstimo nela.
+
+    def __init__(self, agencias=None, ttl_cache=TTL_CACHE_PADRAO, tempo_limite=TEMPO_LIMITE_PADRAO, threads=None):
+        self._agencias = dict(agencias or {})
+        self.tempo_limite = tempo_limite
+        self.cache = CacheTTL(ttl_cache)
+        self._threads = threads
+        self._executor = None
+        self._trava = threading.Lock()
+        # (matrícula, título normalizado) -> agência que emprestou o item
+        self._emprestimos_roteados = {}
+        # (agência, matrícula) das cópias de usuários registradas pela federação
+        self._visitantes = set()
+
+    @property
+    def agencias(self):
+        return list(self._agencias)
+
+    def agencia(self, nome):
+        return self._agencias[nome]
+
+    def adicionar_agencia(self, nome, biblioteca):
+        with self._trava:
+            if nome in self._agencias:
+                raise ValueError(f"Agência '{nome}' já faz parte da federação.")
+            self._agencias[nome] = biblioteca
+        self.cache.limpar()
+
+    def remover_agencia(self, nome):
+        with self._trava:
+            biblioteca = self._agencias.pop(nome, None)
+            self._visitantes = {(agencia, matricula) for agencia, matricula in self._visitantes if agencia != nome}
+        self.cache.limpar()
+        return biblioteca
+
+    def fechar(self):
+        with self._trava:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pool(self):
+        with self._trava:
+            if self._executor is None:
+                threads = self._threads or min(32, max(4, len(self._agencias)))
+                self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="federacao")
+            return self._executor
+
+    def consultar(self, operacao, *argumentos, agencias=None):
+        # Chama operacao(*argumentos) em cada agência ao mesmo tempo
+        return self._executar(lambda biblioteca: getattr(biblioteca, operacao)(*argumentos), agencias)
+
+    def _executar(self, funcao, agencias=None):
+        # Chama funcao(agência) em cada agência ao mesmo tempo. Uma chamada
+        # que passa do tempo limite continua rodando na thread do pool: só
+        # a resposta dela é descartada.
+        nomes = list(agencias) if agencias is not None else list(self._agencias)
+        pool = self._pool()
+        futuros = {pool.submit(funcao, self._agencias[nome]): nome for nome in nomes}
+        concluidos, pendentes = wait(futuros, timeout=self.tempo_limite)
+        respostas, falhas = {}, {}
+        for futuro in concluidos:
+            nome = futuros[futuro]
+            try:
+                respostas[nome] = futuro.result()
+            except Exception as e:
+                falhas[nome] = f"{type(e).__name__}: {e}"
+        for futuro in pendentes:
+            futuro.cancel()
+            falhas[futuros[futuro]] = "Tempo limite esgotado."
+        # Respostas na ordem das agências, não na de chegada
+        return ResultadoFederado({nome: respostas[nome] for nome in nomes if nome in respostas}, falhas)
+
+    def _consultar_em_cache(self, chave, operacao, *argumentos):
+        encontrado, resultado = self.cache.obter(chave)
+        if encontrado:
+            return resultado
+        resultado = self.consultar(operacao, *argumentos)
+        # Uma resposta incompleta não fica em cache
+        if not resultado.falhas:
+            self.cache.guardar(chave, resultado)
+        return resultado
+
+    # --- consultas ---
+
+    def buscar_item_por_titulo(self, titulo):
+        chave = ("titulo", Biblioteca._chave_titulo(titulo))
+        resultado = self._consultar_em_cache(chave, "buscar_item_por_titulo", titulo)
+        agencias = [nome for nome, item in resultado.respostas.items() if item is not None]
+        if not agencias:
+            return None
+        return ItemFederado(resultado.respostas[agencias[0]], agencias)
+
+    def buscar_itens(self, consulta, pagina=1, por_pagina=10):
+        # Cada agência devolve as suas primeiras pagina * por_pagina posições;
+        # os resultados são intercalados por posição e os títulos repetidos
+        # viram um só ItemFederado. O total é uma estimativa: duplicatas fora
+        # da janela consultada não são descontadas.
+        chave = ("busca", consulta, pagina, por_pagina)
+        encontrado, pagina_federada = self.cache.obter(chave)
+        if encontrado:
+            return pagina_federada
+        resultado = self.consultar("buscar_itens", consulta, 1, pagina * por_pagina)
+        por_titulo = {}
+        posicao = 0
+        listas = [(nome, resposta.itens) for nome, resposta in resultado.respostas.items()]
+        while any(posicao < len(itens) for _, itens in listas):
+            for nome, itens in listas:
+                if posicao < len(itens):
+                    item = itens[posicao]
+                    chave_titulo = Biblioteca._chave_titulo(item.get_titulo())
+                    federado = por_titulo.get(chave_titulo)
+                    if federado is None:
+                        por_titulo[chave_titulo] = ItemFederado(item, [nome])
+                    else:
+                        federado.agencias.append(nome)
+            posicao += 1
+        repetidos = sum(len(federado.agencias) - 1 for federado in por_titulo.values())
+        total = sum(resposta.total for resposta in resultado.respostas.values()) - repetidos
+        itens = list(por_titulo.values())[(pagina - 1) * por_pagina:pagina * por_pagina]
+        truncado = any(resposta.truncado for resposta in resultado.respostas.values())
+        pagina_federada = PaginaResultados(itens, total, pagina, por_pagina, truncado)
+        if not resultado.falhas:
+            self.cache.guardar(chave, pagina_federada)
+        return pagina_federada
+
+    def sugerir_titulos(self, titulo, limite=5):
+        resultado = self._consultar_em_cache(("sugestoes", titulo, limite), "sugerir_titulos", titulo, limite)
+        sugestoes = {}
+        for sugestoes_agencia in resultado.respostas.values():
+            for sugestao in sugestoes_agencia:
+                sugestoes.setdefault(Biblioteca._chave_titulo(sugestao), sugestao)
+        return list(sugestoes.values())[:limite]
+
+    def buscar_usuario_por_matricula(self, matricula):
+        # Devolve (agência de origem, usuário), ignorando as cópias que a
+        # federação registrou em outras agências
+        resultado = self._consultar_em_cache(("matricula", matricula), "buscar_usuario_por_matricula", matricula)
+        for nome, usuario in resultado.respostas.items():
+            if usuario is not None and (nome, matricula) not in self._visitantes:
+                return nome, usuario
+        return None, None
+
+    # --- empréstimos entre agências ---
+
+    def _candidatas(self, titulo, agencia_usuario):
+        # Consulta a disponibilidade agora, sem cache: um resultado velho
+        # mandaria o empréstimo para uma agência sem exemplares livres
+        resultado = self.consultar("buscar_item_por_titulo", titulo)
+        encontradas = {nome: item for nome, item in resultado.respostas.items() if item is not None}
+        disponiveis = [nome for nome, item in encontradas.items()
+                       if isinstance(item, ItemEmprestavel) and item.esta_disponivel()]
+        # A agência do próprio usuário vem primeiro
+        disponiveis.sort(key=lambda nome: nome != agencia_usuario)
+        return encontradas, disponiveis
+
+    def _registrar_visitante(self, nome_agencia, usuario):
+        biblioteca = self._agencias[nome_agencia]
+        if biblioteca.buscar_usuario_por_matricula(usuario.matricula) is None:
+            with self._trava:
+                self._visitantes.add((nome_agencia, usuario.matricula))
+            try:
+                biblioteca.registrar_usuario(usuario_de_registro(usuario_para_registro(usuario)))
+            except ValueError:
+                pass # Registrado por outro empréstimo ao mesmo tempo
+
+    @staticmethod
+    def _emprestimo_ativo(biblioteca, matricula, titulo):
+        # Consulta somente leitura: o empréstimo ativo do usuário para o
+        # título nessa agência, ou None. Títulos comparados como na
+        # devolução da Biblioteca (RegistroEmprestimos.buscar_por_titulo).
+        chave = Biblioteca._chave_titulo(titulo)
+        for emprestimo in biblioteca.iterar_emprestimos_ativos(matricula):
+            if Biblioteca._chave_titulo(emprestimo.item.get_titulo()) == chave:
+                return emprestimo
+        return None
+
+    def realizar_emprestimo(self, matricula_usuario, titulo_item, data_emprestimo, data_devolucao_prevista=None,
+                            agencia=None):
+        # Sem agência indicada, empresta da agência do usuário se ela tiver
+        # o item livre; senão, da primeira que tiver. Cada agência aplica os
+        # seus próprios limites. Devolve um ResultadoOperacao.
+        origem, usuario = self.buscar_usuario_por_matricula(matricula_usuario)
+        if usuario is None:
+            return ResultadoOperacao(False, "Usuário não encontrado.")
+        if agencia is not None:
+            if agencia not in self._agencias:
+                raise ValueError(f"Agência '{agencia}' não faz parte da federação.")
+            candidatas = [agencia]
+        else:
+            encontradas, candidatas = self._candidatas(titulo_item, origem)
+            if not encontradas:
+                return ResultadoOperacao(False, "Item não encontrado em nenhuma agência.")
+            if not candidatas:
+                # Nenhuma tem exemplar livre: a agência do item explica o motivo
+                candidatas = [origem if origem in encontradas else next(iter(encontradas))]
+        resultado = None
+        for nome in candidatas:
+            biblioteca = self._agencias[nome]
+            if nome != origem:
+                self._registrar_visitante(nome, usuario)
+            anterior = self._emprestimo_ativo(biblioteca, matricula_usuario, titulo_item)
+            mensagem = biblioteca.realizar_emprestimo(matricula_usuario, titulo_item, data_emprestimo,
+                                                      data_devolucao_prevista)
+            # Um empréstimo que já existia antes não conta como sucesso
+            if anterior is None and self._emprestimo_ativo(biblioteca, matricula_usuario, titulo_item) is not None:
+                self.cache.limpar()
+                with self._trava:
+                    self._emprestimos_roteados[(matricula_usuario, Biblioteca._chave_titulo(titulo_item))] = nome
+                return ResultadoOperacao(True, mensagem if nome == origem else f"{mensagem} Agência: {nome}.", nome)
+            resultado = ResultadoOperacao(False, mensagem, nome)
+            # Outra pessoa levou o último exemplar nesse meio tempo: tenta a próxima
+        return resultado
+
+    def _agencias_com_emprestimo(self, matricula_usuario, titulo_item, agencias):
+        resultado = self._executar(
+            lambda biblioteca: self._emprestimo_ativo(biblioteca, matricula_usuario, titulo_item) is not None,
+            agencias)
+        return [nome for nome, tem in resultado.respostas.items() if tem], resultado.falhas
+
+    def registrar_devolucao_item(self, matricula_usuario, titulo_item, data_devolucao_real, agencia=None):
+        # Primeiro descobre, só com consultas, a única agência com o
+        # empréstimo; a devolução é feita só nela. Uma agência sem resposta
+        # impede a devolução, já que o empréstimo pode estar justamente nela.
+        # Devolve um ResultadoOperacao.
+        chave = (matricula_usuario, Biblioteca._chave_titulo(titulo_item))
+        if agencia is not None:
+            if agencia not in self._agencias:
+                raise ValueError(f"Agência '{agencia}' não faz parte da federação.")
+            nomes = [agencia]
+        else:
+            with self._trava:
+                roteada = self._emprestimos_roteados.get(chave)
+            # Empréstimo feito direto numa agência: procura em todas
+            nomes = [roteada] if roteada in self._agencias else list(self._agencias)
+        donas, falhas = self._agencias_com_emprestimo(matricula_usuario, titulo_item, nomes)
+        if not donas and not falhas and agencia is None and len(nomes) < len(self._agencias):
+            # A agência anotada já não tem o empréstimo (foi devolvido direto nela)
+            donas, falhas = self._agencias_com_emprestimo(matricula_usuario, titulo_item, list(self._agencias))
+        if falhas:
+            detalhes = "; ".join(f"{nome}: {falha}" for nome, falha in falhas.items())
+            return ResultadoOperacao(False, f"Não foi possível consultar todas as agências ({detalhes}).")
+        if not donas:
+            return ResultadoOperacao(False, "Empréstimo não encontrado ou já devolvido.")
+        if len(donas) > 1:
+            return ResultadoOperacao(
+                False, f"Empréstimo encontrado em mais de uma agência ({', '.join(donas)}); indique a agência.")
+        nome = donas[0]
+        biblioteca = self._agencias[nome]
+        mensagem = biblioteca.registrar_devolucao_item(matricula_usuario, titulo_item, data_devolucao_real)
+        if self._emprestimo_ativo(biblioteca, matricula_usuario, titulo_item) is not None:
+            return ResultadoOperacao(False, mensagem, nome)
+        with self._trava:
+            if self._emprestimos_roteados.get(chave) == nome:
+                del self._emprestimos_roteados[chave]
+        self.cache.limpar()
+        return ResultadoOperacao(True, mensagem, nome)
@@ -0,0 +1,296 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+PESOS_CAMPOS = {
+    "titulo": 3.0,
+    "autor": 2.0,
+    "diretor": 2.0,
+    "editora": 1.5,
+    "genero": 1.0,
+    "isbn": 1.0,
+}
+PESO_PREFIXO = 0.5
+# Ignoradas na consulta quando há outros termos (continuam no índice)
+PALAVRAS_VAZIAS = frozenset({"a", "as", "o", "os", "de", "da", "das", "do", "dos", "e",
+                             "em", "no", "na", "nos", "nas", "um", "uma", "the", "of"})
+_PADRAO_TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    # Remove acentos ("Anéis" -> "aneis") e ignora maiúsculas/minúsculas
+    if texto.isascii():
+        return texto.casefold()
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def tokenizar(texto):
+    return _PADRAO_TOKEN.findall(normalizar(texto))
+
+
+@lru_cache(maxsize=65536)
+def _tokens_campo(texto):
+    # Autores, gêneros e editoras se repetem muito entre os itens
+    return tuple(tokenizar(texto))
+
+
+class PaginaResultados:
+    # Com truncado, algum termo tinha mais expansões de prefixo que
+    # max_expansoes: total é só um limite inferior e as páginas seguintes
+    # podem não trazer todos os itens que casam com a consulta
+    def __init__(self, itens, total, pagina, por_pagina, truncado=False):
+        self.itens = itens
+        self.total = total
+        self.pagina = pagina
+        self.por_pagina = por_pagina
+        self.truncado = truncado
+
+    @property
+    def total_paginas(self):
+        return max(1, math.ceil(self.total / self.por_pagina))
+
+
+class IndiceBusca:
+    # Índice invertido: token -> {item: peso}. O vocabulário fica também em
+    # uma lista ordenada, o que permite achar todos os tokens com um dado
+    # prefixo por busca binária (digitação incremental).
+
+    def __init__(self, max_expansoes=64):
+        self.max_expansoes = max_expansoes
+        self._postings = {}
+        self._vocabulario = []
+        self._tokens_por_item = {}
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens_por_item)
+
+    @staticmethod
+    def _tokens_do_item(item):
+        pesos = {}
+        for campo, valor in item.get_campos_busca().items():
+            if not valor or not isinstance(valor, str):
+                continue
+            peso = PESOS_CAMPOS.get(campo, 1.0)
+            tokens = _tokens_campo(valor) if campo != "titulo" else tokenizar(valor)
+            if campo == "isbn":
+                # Permite buscar o ISBN com ou sem hífens
+                tokens = tokens + ("".join(tokens),)
+            for token in tokens:
+                pesos[token] = max(pesos.get(token, 0.0), peso)
+        return pesos
+
+    def adicionar(self, item):
+        self.adicionar_varios([item])
+
+    def adicionar_varios(self, itens):
+        entradas = [(item, self._tokens_do_item(item)) for item in itens]
+        with self._trava:
+            novos_tokens = []
+            for item, pesos in entradas:
+                if item in self._tokens_por_item:
+                    continue
+                self._tokens_por_item[item] = pesos
+                for token, peso in pesos.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = {}
+                        novos_tokens.append(token)
+                    postings[item] = peso
+            if len(novos_tokens) <= 16:
+                for token in novos_tokens:
+                    bisect.insort(self._vocabulario, token)
+            else:
+                # Em lote, reordenar uma vez sai mais barato que inserir um a um
+                self._vocabulario.extend(novos_tokens)
+                self._vocabulario.sort()
+
+    def remover(self, item):
+        with self._trava:
+            pesos = self._tokens_por_item.pop(item, None)
+            if pesos is None:
+                return
+            for token in pesos:
+                postings = self._postings[token]
+                del postings[item]
+                if not postings:
+                    del self._postings[token]
+                    posicao = bisect.bisect_left(self._vocabulario, token)
+                    del self._vocabulario[posicao]
+
+    def _expandir(self, prefixo):
+        # Devolve (expansões, truncado); truncado indica que havia mais
+        # tokens com o prefixo além dos max_expansoes devolvidos
+        inicio = bisect.bisect_left(self._vocabulario, prefixo)
+        fim = min(inicio + self.max_expansoes, len(self._vocabulario))
+        expansoes = []
+        for posicao in range(inicio, fim):
+            token = self._vocabulario[posicao]
+            if not token.startswith(prefixo):
+                return expansoes, False
+            expansoes.append(token)
+        truncado = fim < len(self._vocabulario) and self._vocabulario[fim].startswith(prefixo)
+        return expansoes, truncado
+
+    def completar(self, prefixo, limite=10):
+        termos = tokenizar(prefixo)
+        if not termos:
+            return []
+        with self._trava:
+            expansoes, _ = self._expandir(termos[-1])
+            expansoes.sort(key=lambda token: -len(self._postings[token]))
+        return expansoes[:limite]
+
+    def buscar(self, consulta, pagina=1, por_pagina=10):
+        if pagina < 1 or por_pagina < 1:
+            raise ValueError("Paginação inválida.")
+        termos = tokenizar(consulta)
+        if any(termo not in PALAVRAS_VAZIAS for termo in termos):
+            termos = [termo for termo in termos if termo not in PALAVRAS_VAZIAS]
+        if not termos:
+            return PaginaResultados([], 0, pagina, por_pagina)
+
+        with self._trava:
+            total_itens = len(self._tokens_por_item) or 1
+            expandidos = []
+            truncado = False
+            for termo in termos:
+                tokens, termo_truncado = self._expandir(termo)
+                if not tokens:
+                    return PaginaResultados([], 0, pagina, por_pagina)
+                truncado = truncado or termo_truncado
+                expandidos.append((sum(len(self._postings[t]) for t in tokens), termo, tokens))
+            # Todos os termos precisam aparecer (exatos ou como prefixo); o
+            # termo mais raro vem primeiro e define os candidatos.
+            expandidos.sort(key=lambda entrada: entrada[0])
+
+            pontuacoes = None
+            for _, termo, tokens in expandidos:
+                pesos_termo = {}
+                for token in tokens:
+                    postings = self._postings[token]
+                    fator = (1.0 if token == termo else PESO_PREFIXO) * math.log(1 + total_itens / len(postings))
+                    if pontuacoes is None or len(postings) <= len(pontuacoes):
+                        pares = postings.items()
+                    else:
+                        pares = ((item, postings[item]) for item in pontuacoes if item in postings)
+                    for item, peso in pares:
+                        pontos = peso * fator
+                        if pontos > pesos_termo.get(item, 0.0):
+                            pesos_termo[item] = pontos
+                if pontuacoes is None:
+                    pontuacoes = pesos_termo
+                else:
+                    pontuacoes = {item: pontos + pesos_termo[item]
+                                  for item, pontos in pontuacoes.items() if item in pesos_termo}
+                if not pontuacoes:
+                    break
+
+        total = len(pontuacoes)
+        melhores = heapq.nlargest(pagina * por_pagina, pontuacoes.items(),
+                                  key=lambda par: (par[1], -len(par[0].get_titulo())))
+        itens = [item for item, _ in melhores[(pagina - 1) * por_pagina:]]
+        return PaginaResultados(itens, total, pagina, por_pagina, truncado)
+
+
+def distancia_edicao(a, b):
+    # Levenshtein com duas linhas da matriz
+    if len(a) < len(b):
+        a, b = b, a
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        atual = [i]
+        for j, cb in enumerate(b, start=1):
+            atual.append(min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        anterior = atual
+    return anterior[-1]
+
+
+def trigramas(texto):
+    preenchido = f"  {texto} "
+    return {preenchido[i:i + 3] for i in range(len(preenchido) - 2)}
+
+
+class IndiceTrigramas:
+    # Sugestões do tipo "você quis dizer": os títulos que compartilham mais
+    # trigramas com a consulta viram candidatos e só eles são comparados
+    # por distância de edição, sem percorrer o catálogo inteiro.
+
+    def __init__(self, candidatos_por_sugestao=10, limite_frequencia=1000):
+        self.candidatos_por_sugestao = candidatos_por_sugestao
+        self.limite_frequencia = limite_frequencia
+        self._postings = {}
+        self._titulos = {}
+        self._trava = threading.Lock()
+
+    def adicionar(self, titulo):
+        self.adicionar_varios([titulo])
+
+    def adicionar_varios(self, titulos):
+        with self._trava:
+            for titulo in titulos:
+                chave = normalizar(titulo)
+                entrada = self._titulos.get(chave)
+                if entrada is not None:
+                    entrada[1] += 1
+                    continue
+                grams = trigramas(chave)
+                self._titulos[chave] = [titulo, 1, len(grams)]
+                for gram in grams:
+                    self._postings.setdefault(gram, set()).add(chave)
+
+    def remover(self, titulo):
+        chave = normalizar(titulo)
+        with self._trava:
+            entrada = self._titulos.get(chave)
+            if entrada is None:
+                return
+            entrada[1] -= 1
+            if entrada[1]:
+                return
+            del self._titulos[chave]
+            for gram in trigramas(chave):
+                chaves = self._postings[gram]
+                chaves.discard(chave)
+                if not chaves:
+                    del self._postings[gram]
+
+    def sugerir(self, titulo, limite=5, similaridade_minima=0.3):
+        chave = normalizar(titulo)
+        grams = trigramas(chave)
+        if not grams:
+            return []
+        with self._trava:
+            postings = self._postings
+            presentes = sorted((g for g in grams if g in postings), key=lambda g: len(postings[g]))
+            if not presentes:
+                return []
+            # Candidatos vêm apenas dos trigramas mais raros; trigramas muito
+            # comuns (" de", "ão ") só entram na contagem final.
+            raros = [g for g in presentes if len(postings[g]) <= self.limite_frequencia]
+            candidatos = set()
+            for gram in raros:
+                candidatos.update(postings[gram])
+            if not raros:
+                # Consulta só com trigramas comuns: restringe pela interseção
+                candidatos = set(postings[presentes[0]])
+                for gram in presentes[1:]:
+                    if len(candidatos) <= self.limite_frequencia:
+                        break
+                    candidatos = candidatos.intersection(postings[gram]) or candidatos
+            similares = []
+            for candidato in candidatos:
+                comuns = sum(1 for gram in presentes if candidato in postings[gram])
+                # Coeficiente de Dice entre os conjuntos de trigramas
+                dice = 2 * comuns / (len(grams) + self._titulos[candidato][2])
+                if dice >= similaridade_minima:
+                    similares.append((dice, candidato))
+            melhores = heapq.nlargest(limite * self.candidatos_por_sugestao, similares)
+            exibicao = {candidato: self._titulos[candidato][0] for _, candidato in melhores}
+        ordenados = sorted((distancia_edicao(chave, candidato), -dice, candidato) for dice, candidato in melhores)
+        return [exibicao[candidato] for _, _, candidato in ordenados[:limite]]
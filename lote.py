@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from biblioteca_models import Biblioteca
+from cliente import BibliotecaRemota
+from servidor import OperacoesBiblioteca
+
+TAMANHO_BUFFER = 1000
+COMANDO_INVALIDO = "(comando inválido)"
+
+
+class ResumoLote:
+    # erros inclui as recusas (empréstimo acima do limite, usuário
+    # inexistente...), que o servidor responde com ok e "recusado"
+    def __init__(self):
+        self.comandos = 0
+        self.erros = 0
+        self.recusas = 0
+        self.duracao_s = 0.0
+        self.por_operacao = {}
+
+    def registrar(self, operacao, ok, recusado=False):
+        self.comandos += 1
+        contagem = self.por_operacao.setdefault(operacao, [0, 0])
+        contagem[0] += 1
+        if recusado:
+            self.recusas += 1
+        if not ok or recusado:
+            self.erros += 1
+            contagem[1] += 1
+
+    def combinar(self, outro):
+        # A duração não é somada: lotes em paralelo se sobrepõem no tempo
+        self.comandos += outro.comandos
+        self.erros += outro.erros
+        self.recusas += outro.recusas
+        for operacao, (comandos, erros) in outro.por_operacao.items():
+            contagem = self.por_operacao.setdefault(operacao, [0, 0])
+            contagem[0] += comandos
+            contagem[1] += erros
+
+    @property
+    def por_segundo(self):
+        return self.comandos / self.duracao_s if self.duracao_s else 0.0
+
+    def texto(self):
+        linhas = [f"Comandos: {self.comandos} ({self.erros} com erro, {self.recusas} recusado(s)) "
+                  f"em {self.duracao_s:.2f} s ({self.por_segundo:.0f} comandos/s)"]
+        for operacao, (comandos, erros) in sorted(self.por_operacao.items()):
+            linhas.append(f"  {operacao}: {comandos}" + (f" ({erros} com erro)" if erros else ""))
+        return "\n".join(linhas)
+
+
+def executar_lote(biblioteca, linhas, saida=None, nome_lote=None, tamanho_buffer=TAMANHO_BUFFER):
+    # Cada linha é uma requisição no formato do servidor: {"op": ..., "args": [...]}.
+    # Linhas vazias e iniciadas por '#' são ignoradas. As respostas saem em
+    # JSON Lines, na ordem dos comandos, com o número da linha como "id"
+    # quando a requisição não traz um; a saída é gravada em blocos.
+    operacoes = OperacoesBiblioteca(biblioteca)
+    resumo = ResumoLote()
+    pendentes = []
+    inicio = time.perf_counter()
+    for numero, linha in enumerate(linhas, start=1):
+        linha = linha.strip()
+        if not linha or linha.startswith("#"):
+            continue
+        try:
+            requisicao = json.loads(linha)
+            if not isinstance(requisicao, dict):
+                raise ValueError("Comando deve ser um objeto JSON.")
+        except ValueError as e:
+            resposta = {"id": numero, "ok": False, "erro": str(e), "tipo": type(e).__name__}
+            resumo.registrar(COMANDO_INVALIDO, False)
+        else:
+            requisicao.setdefault("id", numero)
+            resposta = operacoes.executar(requisicao)
+            resumo.registrar(str(requisicao.get("op") or COMANDO_INVALIDO), resposta["ok"],
+                             resposta.get("recusado", False))
+        if saida is not None:
+            if nome_lote is not None:
+                resposta["lote"] = nome_lote
+            pendentes.append(json.dumps(resposta, ensure_ascii=False))
+            if len(pendentes) >= tamanho_buffer:
+                saida.write("\n".join(pendentes) + "\n")
+                pendentes.clear()
+    if pendentes:
+        saida.write("\n".join(pendentes) + "\n")
+    resumo.duracao_s = time.perf_counter() - inicio
+    return resumo
+
+
+def _executar_arquivo(caminho, caminho_saida, servidor, config):
+    # Roda em um processo separado, com uma biblioteca em memória só sua
+    # (ou uma conexão própria com o servidor)
+    biblioteca = BibliotecaRemota(*servidor) if servidor else Biblioteca("Biblioteca em Lote", config)
+    try:
+        with open(caminho, encoding="utf-8") as entrada, \
+                (open(caminho_saida, "w", encoding="utf-8") if caminho_saida else nullcontext()) as saida:
+            return executar_lote(biblioteca, entrada, saida, nome_lote=os.path.basename(caminho))
+    finally:
+        if servidor:
+            biblioteca.fechar()
+
+
+def executar_em_paralelo(caminhos, saida=None, processos=None, servidor=None, config=None):
+    # Lotes independentes, um por arquivo, distribuídos entre processos. As
+    # respostas de cada lote vão para um arquivo temporário e são juntadas
+    # em saida na ordem dos arquivos; os resumos são somados. Sem servidor,
+    # cada lote usa uma Biblioteca vazia com a configuração config.
+    resumo = ResumoLote()
+    with tempfile.TemporaryDirectory() as diretorio:
+        saidas = [os.path.join(diretorio, f"{numero}.jsonl") if saida is not None else None
+                  for numero in range(len(caminhos))]
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            parciais = list(executor.map(_executar_arquivo, caminhos, saidas, [servidor] * len(caminhos),
+                                         [config] * len(caminhos)))
+        resumo.duracao_s = time.perf_counter() - inicio
+        for parcial, caminho_saida in zip(parciais, saidas):
+            resumo.combinar(parcial)
+            if caminho_saida is not None:
+                with open(caminho_saida, encoding="utf-8") as arquivo:
+                    shutil.copyfileobj(arquivo, saida)
+    return resumo
+
+
+def executar_arquivos(biblioteca, caminhos, saida=None):
+    # Arquivos em sequência sobre a mesma biblioteca; "-" lê a entrada padrão
+    resumo = ResumoLote()
+    inicio = time.perf_counter()
+    for caminho in caminhos:
+        with (open(caminho, encoding="utf-8") if caminho != "-" else nullcontext(sys.stdin)) as entrada:
+            resumo.combinar(executar_lote(biblioteca, entrada, saida))
+    resumo.duracao_s = time.perf_counter() - inicio
+    return resumo
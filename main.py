@@ -1,8 +1,18 @@
 from biblioteca_models import (
-    Pessoa, Autor, Usuario, ItemBibliografico, Livro, Revista, DVD,
+    Pessoa, Autor, Usuario, ItemBibliografico, ItemEmprestavel, Livro, Revista, DVD,
     Emprestimo, Biblioteca, ConfiguracaoBiblioteca
 )
-from datetime import datetime, timedelta
+from biblioteca_persistencia import BibliotecaPersistente
+from cliente import BibliotecaRemota
+from eventos import ArquivoEventos
+from metricas import instrumentar
+from perfilamento import RegistroOperacoesLentas, monitorar
+from lote import executar_arquivos, executar_em_paralelo
+from datetime import date
+import argparse
+import sys
+
+TAMANHO_PAGINA = 20
 
 def exibir_menu():
 
@@ -13,6 +23,7 @@ def exibir_menu():
     print("4. Listar Todos os Itens do Catálogo")
     print("5. Buscar Item por Título")
     print("6. Remover Item do Catálogo")
+    print("17. Adicionar Exemplares de um Item")
     print("-------------------------------------------")
     print("7. Registrar Novo Usuário")
     print("8. Listar Usuários Registrados")
@@ -21,9 +32,18 @@ def exibir_menu():
     print("10. Realizar Empréstimo")
     print("11. Registrar Devolução")
     print("12. Listar Empréstimos Ativos")
+    print("16. Listar Empréstimos Atrasados")
+    print("18. Reservar Item")
+    print("19. Consultar Posição na Fila de Reserva")
+    print("20. Cancelar Reserva")
     print("-------------------------------------------")
     print("13. Ver Configurações da Biblioteca")
     print("14. Alterar Máximo de Livros por Usuário (Config.)")
+    print("21. Ver Métricas de Desempenho")
+    print("22. Operações Lentas e Perfilamento")
+    print("-------------------------------------------")
+    print("15. Pesquisar no Catálogo (título, autor, gênero, ISBN...)")
+    print("23. Listar Itens de um Autor")
     print("-------------------------------------------")
     print("0. Sair")
     print("-------------------------------------------")
@@ -38,9 +58,10 @@ def adicionar_livro(biblioteca):
         email_autor = input("Email do Autor: ")
         bio_autor = input("Biografia do Autor (opcional): ")
         genero = input("Gênero (opcional): ")
+        exemplares = int(input("Quantidade de exemplares (padrão 1): ") or 1)
 
         autor = Autor(nome_autor, email_autor, bio_autor)
-        livro = Livro(titulo, ano, isbn, autor, genero if genero else "Não especificado")
+        livro = Livro(titulo, ano, isbn, autor, genero if genero else "Não especificado", exemplares)
         biblioteca.adicionar_item_catalogo(livro)
         print(f"Livro '{titulo}' adicionado com sucesso!")
     except ValueError as e:
@@ -71,8 +92,9 @@ def adicionar_dvd(biblioteca):
         ano = int(input("Ano de Lançamento: "))
         duracao = int(input("Duração (minutos): "))
         diretor = input("Diretor: ")
+        exemplares = int(input("Quantidade de exemplares (padrão 1): ") or 1)
 
-        dvd = DVD(titulo, ano, duracao, diretor)
+        dvd = DVD(titulo, ano, duracao, diretor, exemplares)
         biblioteca.adicionar_item_catalogo(dvd)
         print(f"DVD '{titulo}' adicionado com sucesso!")
     except ValueError as e:
@@ -80,15 +102,37 @@ def adicionar_dvd(biblioteca):
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}")
 
+def exibir_paginado(registros, formatar, mensagem_vazia):
+    # Os registros vêm de um gerador: a primeira página aparece sem esperar
+    # pelo resto. Cada página é montada em memória e escrita de uma só vez.
+    total = 0
+    pagina = []
+    for registro in registros:
+        if pagina and len(pagina) == TAMANHO_PAGINA:
+            sys.stdout.write("".join(pagina))
+            pagina.clear()
+            if input("-- Enter para continuar, 'q' para parar -- ").strip().lower() == "q":
+                return total
+        total += 1
+        pagina.append(formatar(total, registro))
+    sys.stdout.write("".join(pagina))
+    if not total:
+        print(mensagem_vazia)
+    return total
+
+def texto_disponibilidade(item):
+    return (f"   Disponível: {'Sim' if item.esta_disponivel() else 'Não'} "
+            f"({item.get_exemplares_disponiveis()} de {item.get_total_exemplares()} exemplar(es))\n")
+
+def formatar_item(numero, item):
+    texto = f"{numero}. {item}\n"
+    if isinstance(item, ItemEmprestavel):
+        texto += texto_disponibilidade(item)
+    return texto
+
 def listar_itens_catalogo(biblioteca):
     print("\n--- Catálogo da Biblioteca ---")
-    if not biblioteca.catalogo:
-        print("Nenhum item no catálogo.")
-        return
-    for i, item in enumerate(biblioteca.catalogo):
-        print(f"{i+1}. {item}")
-        if isinstance(item, Livro):
-            print(f"   Disponível: {'Sim' if item.esta_disponivel() else 'Não'}")
+    exibir_paginado(biblioteca.iterar_itens(), formatar_item, "Nenhum item no catálogo.")
 
 def buscar_item(biblioteca):
     print("\n--- Buscar Item por Título ---")
@@ -97,10 +141,46 @@ def buscar_item(biblioteca):
     if item:
         print("Item encontrado:")
         print(item)
-        if isinstance(item, Livro):
-             print(f"   Disponível: {'Sim' if item.esta_disponivel() else 'Não'}")
+        if isinstance(item, ItemEmprestavel):
+            sys.stdout.write(texto_disponibilidade(item))
     else:
         print(f"Item com título '{titulo_busca}' não encontrado.")
+        sugestoes = biblioteca.sugerir_titulos(titulo_busca)
+        if sugestoes:
+            print("Você quis dizer:")
+            for sugestao in sugestoes:
+                print(f"   - {sugestao}")
+
+def pesquisar_catalogo(biblioteca):
+    print("\n--- Pesquisar no Catálogo ---")
+    consulta = input("Termos da pesquisa: ")
+    pagina = 1
+    while True:
+        try:
+            resultados = biblioteca.buscar_itens(consulta, pagina)
+        except ValueError as e:
+            print(f"Erro na pesquisa: {e}")
+            return
+        if not resultados.total:
+            print(f"Nenhum item encontrado para '{consulta}'.")
+            return
+        if resultados.truncado:
+            print(f"Página {resultados.pagina} de pelo menos {resultados.total_paginas} "
+                  f"(pelo menos {resultados.total} itens; use um prefixo mais longo para ver todos)")
+        else:
+            print(f"Página {resultados.pagina} de {resultados.total_paginas} ({resultados.total} itens)")
+        for i, item in enumerate(resultados.itens, start=(pagina - 1) * resultados.por_pagina + 1):
+            print(f"{i}. {item}")
+        if pagina >= resultados.total_paginas or input("Próxima página? (s/n): ").strip().lower() != "s":
+            return
+        pagina += 1
+
+def listar_itens_do_autor(biblioteca):
+    print("\n--- Itens de um Autor ---")
+    nome = input("Nome do Autor: ")
+    email = input("Email do Autor (opcional): ").strip() or None
+    exibir_paginado(biblioteca.itens_do_autor(nome, email), formatar_item,
+                    f"Nenhum item de '{nome}' no catálogo.")
 
 def remover_item(biblioteca):
     print("\n--- Remover Item do Catálogo ---")
@@ -110,6 +190,18 @@ def remover_item(biblioteca):
     else:
         print(f"Item '{titulo_remove}' não encontrado ou não pôde ser removido.")
 
+def adicionar_exemplares(biblioteca):
+    print("\n--- Adicionar Exemplares ---")
+    titulo = input("Título do item: ")
+    try:
+        quantidade = int(input("Quantidade de novos exemplares: "))
+        if biblioteca.adicionar_exemplares(titulo, quantidade):
+            print(f"{quantidade} exemplar(es) de '{titulo}' adicionado(s) com sucesso!")
+        else:
+            print(f"Item com título '{titulo}' não encontrado.")
+    except (ValueError, TypeError) as e:
+        print(f"Erro ao adicionar exemplares: {e}")
+
 def registrar_usuario(biblioteca):
     print("\n--- Registrar Novo Usuário ---")
     try:
@@ -127,11 +219,8 @@ def registrar_usuario(biblioteca):
 
 def listar_usuarios(biblioteca):
     print("\n--- Usuários Registrados ---")
-    if not biblioteca.usuarios_registrados:
-        print("Nenhum usuário registrado.")
-        return
-    for i, usuario in enumerate(biblioteca.usuarios_registrados):
-        print(f"{i+1}. {usuario}")
+    exibir_paginado(biblioteca.iterar_usuarios(), lambda numero, usuario: f"{numero}. {usuario}\n",
+                    "Nenhum usuário registrado.")
 
 def buscar_usuario(biblioteca):
     print("\n--- Buscar Usuário por Matrícula ---")
@@ -143,50 +232,195 @@ def buscar_usuario(biblioteca):
     else:
         print(f"Usuário com matrícula '{matricula_busca}' não encontrado.")
 
-def realizar_emprestimo(biblioteca, config_biblioteca):
+def realizar_emprestimo(biblioteca):
     print("\n--- Realizar Empréstimo ---")
     matricula_usuario = input("Matrícula do Usuário: ")
     titulo_item = input("Título do Item a ser emprestado: ")
     
-    # Data de empréstimo e devolução (simplificado)
-    data_emprestimo_str = datetime.now().strftime("%Y-%m-%d")
-    data_devolucao_prevista_str = (datetime.now() + timedelta(days=config_biblioteca.dias_emprestimo_padrao)).strftime("%Y-%m-%d")
-    
-    print(f"Data do Empréstimo: {data_emprestimo_str}")
-    print(f"Data Prevista para Devolução: {data_devolucao_prevista_str}")
+    # A devolução prevista segue os dias de empréstimo configurados para o tipo do item
+    data_emprestimo = date.today()
+    print(f"Data do Empréstimo: {data_emprestimo}")
 
-    resultado = biblioteca.realizar_emprestimo(matricula_usuario, titulo_item, data_emprestimo_str, data_devolucao_prevista_str)
+    resultado = biblioteca.realizar_emprestimo(matricula_usuario, titulo_item, data_emprestimo)
     print(resultado)
 
 def registrar_devolucao(biblioteca):
     print("\n--- Registrar Devolução ---")
     matricula_usuario = input("Matrícula do Usuário que está devolvendo: ")
     titulo_item = input("Título do Item devolvido: ")
-    data_devolucao_real_str = datetime.now().strftime("%Y-%m-%d")
-    print(f"Data da Devolução: {data_devolucao_real_str}")
+    data_devolucao_real = date.today()
+    print(f"Data da Devolução: {data_devolucao_real}")
 
-    resultado = biblioteca.registrar_devolucao_item(matricula_usuario, titulo_item, data_devolucao_real_str)
+    resultado = biblioteca.registrar_devolucao_item(matricula_usuario, titulo_item, data_devolucao_real)
     print(resultado)
 
+def reservar_item(biblioteca):
+    print("\n--- Reservar Item ---")
+    matricula_usuario = input("Matrícula do Usuário: ")
+    titulo_item = input("Título do Item a ser reservado: ")
+    print(biblioteca.reservar_item(matricula_usuario, titulo_item, date.today()))
+
+def consultar_reserva(biblioteca):
+    print("\n--- Consultar Posição na Fila de Reserva ---")
+    matricula_usuario = input("Matrícula do Usuário: ")
+    titulo_item = input("Título do Item reservado: ")
+    posicao = biblioteca.posicao_na_fila(matricula_usuario, titulo_item)
+    if posicao is None:
+        print("Reserva não encontrada.")
+    elif posicao == 0:
+        print("Há um exemplar separado aguardando a retirada.")
+    else:
+        print(f"Posição na fila: {posicao}")
+
+def cancelar_reserva(biblioteca):
+    print("\n--- Cancelar Reserva ---")
+    matricula_usuario = input("Matrícula do Usuário: ")
+    titulo_item = input("Título do Item reservado: ")
+    print(biblioteca.cancelar_reserva(matricula_usuario, titulo_item, date.today()))
+
 def listar_emprestimos_ativos(biblioteca):
     print("\n--- Empréstimos Ativos ---")
-    ativos = [emp for emp in biblioteca.emprestimos_ativos if not emp.devolvido]
-    if not ativos:
-        print("Nenhum empréstimo ativo no momento.")
+    hoje = date.today()
+
+    def formatar(numero, emprestimo):
+        texto = (f"{numero}. Usuário: {emprestimo.usuario.nome} ({emprestimo.usuario.matricula})\n"
+                 f"   Item: {emprestimo.item.get_titulo()} (exemplar {emprestimo.exemplar})\n"
+                 f"   Data Empréstimo: {emprestimo.data_emprestimo}\n"
+                 f"   Devolução Prevista: {emprestimo.data_devolucao_prevista}\n")
+        if emprestimo.esta_atrasado(hoje):
+            texto += "   Status: ATRASADO\n"
+        return texto + "-" * 20 + "\n"
+
+    exibir_paginado(biblioteca.iterar_emprestimos_ativos(), formatar, "Nenhum empréstimo ativo no momento.")
+
+def listar_emprestimos_atrasados(biblioteca):
+    print("\n--- Empréstimos Atrasados ---")
+    hoje = date.today()
+    atrasados = biblioteca.emprestimos_atrasados(hoje)
+    if not atrasados:
+        print("Nenhum empréstimo atrasado.")
         return
-    for i, emprestimo in enumerate(ativos):
-        print(f"{i+1}. Usuário: {emprestimo.usuario.nome} ({emprestimo.usuario.matricula})")
-        print(f"   Item: {emprestimo.item.get_titulo()}")
-        print(f"   Data Empréstimo: {emprestimo.data_emprestimo}")
-        print(f"   Devolução Prevista: {emprestimo.data_devolucao_prevista}")
-        if emprestimo.esta_atrasado(datetime.now().strftime("%Y-%m-%d")):
-            print("   Status: ATRASADO")
-        print("-" * 20)
+    for i, emprestimo in enumerate(atrasados):
+        dias = (hoje - emprestimo.data_devolucao_prevista).days
+        print(f"{i+1}. {emprestimo.item.get_titulo()} - {emprestimo.usuario.nome} ({emprestimo.usuario.matricula})")
+        print(f"   Devolução Prevista: {emprestimo.data_devolucao_prevista} ({dias} dia(s) de atraso)")
+    print(f"Total: {len(atrasados)} empréstimo(s) atrasado(s).")
 
 def ver_configuracoes(config_biblioteca):
     print("\n--- Configurações da Biblioteca ---")
     print(f"Máximo de livros por usuário: {config_biblioteca.get_max_livros_por_usuario()}")
     print(f"Dias de empréstimo padrão: {config_biblioteca.dias_emprestimo_padrao}")
+    for tipo, limite in sorted(config_biblioteca.limites_por_tipo.items()):
+        print(f"Máximo de itens do tipo '{tipo}' por usuário: {limite}")
+    for tipo, dias in sorted(config_biblioteca.dias_por_tipo.items()):
+        print(f"Dias de empréstimo para '{tipo}': {dias}")
+
+def ver_metricas(biblioteca):
+    print("\n--- Métricas de Desempenho ---")
+    if isinstance(biblioteca, BibliotecaRemota):
+        try:
+            sys.stdout.write(biblioteca.metricas())
+        except ValueError as e:
+            print(f"Erro: {e}")
+        return
+    if biblioteca.metricas is None:
+        if input("As métricas estão desativadas. Ativar agora? (s/n): ").strip().lower() == "s":
+            instrumentar(biblioteca)
+            print("Métricas ativadas. As próximas operações serão medidas.")
+        return
+    resumo = biblioteca.metricas.resumo()
+    if not resumo:
+        print("Nenhuma operação medida ainda.")
+    else:
+        print(f"{'Operação':<30} {'Chamadas':>9} {'Erros':>6} {'Média (ms)':>11} {'p99 até (ms)':>13}")
+        for operacao, medida in resumo.items():
+            print(f"{operacao:<30} {medida['chamadas']:>9} {medida['erros']:>6} "
+                  f"{medida['media_s'] * 1000:>11.3f} {medida['p99_s'] * 1000:>13.3f}")
+    for indice in ("titulo", "matricula", "busca_textual"):
+        taxa = biblioteca.metricas.taxa_acerto(indice)
+        if taxa is not None:
+            print(f"Acertos no índice '{indice}': {taxa:.1%}")
+    caminho = input("Exportar no formato do Prometheus para o arquivo (Enter para pular): ").strip()
+    if caminho:
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(biblioteca.metricas.para_prometheus())
+        print(f"Métricas gravadas em {caminho}.")
+
+def ler_limite_ms(atual):
+    texto = input(f"Limite em milissegundos (atual: {atual}): ").strip()
+    if not texto:
+        return atual
+    limite = float(texto)
+    if limite < 0:
+        raise ValueError("O limite não pode ser negativo.")
+    return limite
+
+def configurar_operacoes_lentas(biblioteca, caminho_padrao):
+    print("\n--- Operações Lentas e Perfilamento ---")
+    if isinstance(biblioteca, BibliotecaRemota):
+        print("Disponível apenas para a biblioteca local (no servidor, use servidor.py --lentas).")
+        return
+    try:
+        registro = biblioteca.operacoes_lentas
+        if registro is None:
+            if input("O registro de operações lentas está desligado. Ligar agora? (s/n): ").strip().lower() != "s":
+                return
+            caminho = input(f"Arquivo de registro (Enter para '{caminho_padrao}'): ").strip() or caminho_padrao
+            monitorar(biblioteca, RegistroOperacoesLentas(caminho, ler_limite_ms(50.0)))
+            print(f"Operações lentas serão gravadas em {caminho}.")
+            return
+        print(f"Situação: {'ligado' if registro.ativo else 'desligado'} | Limite: {registro.limite_ms} ms | "
+              f"Perfil: {registro.perfil or 'nenhum'}")
+        print(f"Arquivo: {registro.caminho} ({registro.registradas} operação(ões) registrada(s))")
+        print("1. Ligar/desligar o registro")
+        print("2. Alterar o limite")
+        print("3. Perfil das chamadas lentas (nenhum, cProfile ou tracemalloc)")
+        opcao = input("Escolha uma opção (Enter para voltar): ").strip()
+        if opcao == "1":
+            registro.ativo = not registro.ativo
+            print(f"Registro {'ligado' if registro.ativo else 'desligado'}.")
+        elif opcao == "2":
+            registro.limite_ms = ler_limite_ms(registro.limite_ms)
+            print(f"Limite alterado para {registro.limite_ms} ms.")
+        elif opcao == "3":
+            escolha = input("0. Nenhum  1. cProfile  2. tracemalloc: ").strip()
+            perfis = {"0": None, "1": "cprofile", "2": "tracemalloc"}
+            if escolha not in perfis:
+                print("Opção inválida.")
+                return
+            registro.perfil = perfis[escolha]
+            print(f"Perfil alterado para {registro.perfil or 'nenhum'}.")
+    except ValueError as e:
+        print(f"Erro: {e}")
+
+def encerrar(biblioteca, arquivo_eventos):
+    if getattr(biblioteca, "operacoes_lentas", None) is not None:
+        biblioteca.operacoes_lentas.fechar()
+    if arquivo_eventos is not None:
+        biblioteca.eventos.fechar()
+        arquivo_eventos.fechar()
+    if isinstance(biblioteca, BibliotecaPersistente):
+        biblioteca.compactar(aguardar=True)
+        biblioteca.fechar()
+    elif isinstance(biblioteca, BibliotecaRemota):
+        biblioteca.fechar()
+
+def executar_modo_lote(biblioteca, argumentos, servidor, config=None):
+    # Respostas em JSON Lines na saída (padrão: stdout) e resumo em stderr
+    saida_padrao = argumentos.saida_lote == "-"
+    saida = sys.stdout if saida_padrao else open(argumentos.saida_lote, "w", encoding="utf-8")
+    try:
+        if argumentos.processos > 1:
+            resumo = executar_em_paralelo(argumentos.lote, saida, argumentos.processos, servidor, config)
+        else:
+            resumo = executar_arquivos(biblioteca, argumentos.lote, saida)
+    finally:
+        if saida_padrao:
+            saida.flush()
+        else:
+            saida.close()
+    print(resumo.texto(), file=sys.stderr)
+    return resumo
 
 def alterar_max_livros(config_biblioteca):
     print("\n--- Alterar Máximo de Livros por Usuário ---")
@@ -199,23 +433,70 @@ def alterar_max_livros(config_biblioteca):
 
 
 if __name__ == "__main__":
-    minha_biblioteca = Biblioteca("Biblioteca Comunitária")
+    parser = argparse.ArgumentParser(description="Sistema de Gerenciamento de Biblioteca")
+    parser.add_argument("--dados", help="diretório onde catálogo, usuários e empréstimos são persistidos")
+    parser.add_argument("--servidor", metavar="HOST:PORTA", help="usa um servidor da biblioteca (servidor.py) em vez de dados locais")
+    parser.add_argument("--eventos", metavar="ARQUIVO", help="grava as alterações da biblioteca local em JSON Lines")
+    parser.add_argument("--metricas", action="store_true", help="mede as operações da biblioteca local desde o início")
+    parser.add_argument("--lentas", metavar="ARQUIVO", help="grava as operações mais lentas que --limite-lentas")
+    parser.add_argument("--limite-lentas", type=float, default=50.0, metavar="MS",
+                        help="limite, em milissegundos, para considerar uma operação lenta")
+    parser.add_argument("--lote", metavar="ARQUIVO", nargs="+",
+                        help="executa os comandos (JSON Lines, '-' para a entrada padrão) sem o menu")
+    parser.add_argument("--saida-lote", metavar="ARQUIVO", default="-", help="respostas do modo em lote (padrão: stdout)")
+    parser.add_argument("--processos", type=int, default=1,
+                        help="com --lote, roda cada arquivo como um lote independente em um processo próprio")
+    argumentos = parser.parse_args()
+    if argumentos.processos > 1 and (argumentos.dados or "-" in (argumentos.lote or [])):
+        parser.error("--processos só aceita arquivos de lote e bibliotecas em memória ou --servidor")
+    if argumentos.processos > 1 and (argumentos.metricas or argumentos.eventos or argumentos.lentas):
+        # Cada processo teria a sua própria biblioteca, fora do alcance destas opções
+        parser.error("--metricas, --eventos e --lentas não funcionam com --processos")
+
     config = ConfiguracaoBiblioteca() # Configurações padrão
+    if argumentos.servidor:
+        host, _, porta = argumentos.servidor.rpartition(":")
+        minha_biblioteca = BibliotecaRemota(host or "127.0.0.1", int(porta))
+    elif argumentos.dados:
+        minha_biblioteca = BibliotecaPersistente("Biblioteca Comunitária", argumentos.dados, config=config)
+    else:
+        minha_biblioteca = Biblioteca("Biblioteca Comunitária", config)
+    arquivo_eventos = None
+    if argumentos.eventos and not argumentos.servidor:
+        arquivo_eventos = ArquivoEventos(argumentos.eventos)
+        minha_biblioteca.assinar_eventos(arquivo_eventos)
+    if argumentos.metricas and not argumentos.servidor:
+        instrumentar(minha_biblioteca)
+    if argumentos.lentas and not argumentos.servidor:
+        monitorar(minha_biblioteca, RegistroOperacoesLentas(argumentos.lentas, argumentos.limite_lentas))
+
+    if argumentos.lote:
+        host_porta = (host or "127.0.0.1", int(porta)) if argumentos.servidor else None
+        try:
+            resumo = executar_modo_lote(minha_biblioteca, argumentos, host_porta, config)
+        finally:
+            encerrar(minha_biblioteca, arquivo_eventos)
+        sys.exit(1 if resumo.erros else 0)
+
+    if argumentos.servidor:
+        # Opções 13 e 14 consultam e alteram a configuração do servidor
+        config = minha_biblioteca.config
 
     # dados iniciais para teste rápido
-    try:
-        autor1 = Autor("J.R.R. Tolkien", "tolkien@example.com")
-        livro1 = Livro("O Senhor dos Anéis", 1954, "978-0618260274", autor1, "Fantasia")
-        minha_biblioteca.adicionar_item_catalogo(livro1)
+    if not argumentos.servidor and not minha_biblioteca.catalogo and not minha_biblioteca.usuarios_registrados:
+        try:
+            autor1 = Autor("J.R.R. Tolkien", "tolkien@example.com")
+            livro1 = Livro("O Senhor dos Anéis", 1954, "978-0618260274", autor1, "Fantasia")
+            minha_biblioteca.adicionar_item_catalogo(livro1)
 
-        autor2 = Autor("George Orwell", "orwell@example.com")
-        livro2 = Livro("1984", 1949, "978-0451524935", autor2, "Distopia")
-        minha_biblioteca.adicionar_item_catalogo(livro2)
+            autor2 = Autor("George Orwell", "orwell@example.com")
+            livro2 = Livro("1984", 1949, "978-0451524935", autor2, "Distopia")
+            minha_biblioteca.adicionar_item_catalogo(livro2)
         
-        usuario1 = Usuario("Alice Wonderland", "alice@example.com", "USR001")
-        minha_biblioteca.registrar_usuario(usuario1)
-    except Exception as e:
-        print(f"Erro ao popular dados iniciais: {e}")
+            usuario1 = Usuario("Alice Wonderland", "alice@example.com", "USR001")
+            minha_biblioteca.registrar_usuario(usuario1)
+        except Exception as e:
+            print(f"Erro ao popular dados iniciais: {e}")
 
 
     while True:
@@ -241,7 +522,7 @@ if __name__ == "__main__":
         elif escolha == '9':
             buscar_usuario(minha_biblioteca)
         elif escolha == '10':
-            realizar_emprestimo(minha_biblioteca, config)
+            realizar_emprestimo(minha_biblioteca)
         elif escolha == '11':
             registrar_devolucao(minha_biblioteca)
         elif escolha == '12':
@@ -250,7 +531,26 @@ if __name__ == "__main__":
             ver_configuracoes(config)
         elif escolha == '14':
             alterar_max_livros(config)
+        elif escolha == '15':
+            pesquisar_catalogo(minha_biblioteca)
+        elif escolha == '16':
+            listar_emprestimos_atrasados(minha_biblioteca)
+        elif escolha == '17':
+            adicionar_exemplares(minha_biblioteca)
+        elif escolha == '18':
+            reservar_item(minha_biblioteca)
+        elif escolha == '19':
+            consultar_reserva(minha_biblioteca)
+        elif escolha == '20':
+            cancelar_reserva(minha_biblioteca)
+        elif escolha == '21':
+            ver_metricas(minha_biblioteca)
+        elif escolha == '22':
+            configurar_operacoes_lentas(minha_biblioteca, argumentos.lentas or "operacoes_lentas.log")
+        elif escolha == '23':
+            listar_itens_do_autor(minha_biblioteca)
         elif escolha == '0':
+            encerrar(minha_biblioteca, arquivo_eventos)
             print("Saindo do sistema. Até logo!")
             break
         else:
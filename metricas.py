@@ -0,0 +1,239 @@
+import bisect
+import functools
+import threading
+import time
+
+# Limites superiores (em segundos) das faixas dos histogramas de latência
+LIMITES_LATENCIA = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+OPERACOES_INSTRUMENTADAS = (
+    "realizar_emprestimo", "registrar_devolucao_item", "registrar_usuario",
+    "buscar_item_por_titulo", "buscar_usuario_por_matricula", "buscar_itens", "sugerir_titulos",
+    "adicionar_item_catalogo", "remover_item_catalogo", "reservar_item", "cancelar_reserva",
+)
+# Operação de consulta -> (índice consultado, função que diz se o resultado é um acerto)
+CONSULTAS_INDICES = {
+    "buscar_item_por_titulo": ("titulo", lambda resultado: resultado is not None),
+    "buscar_usuario_por_matricula": ("matricula", lambda resultado: resultado is not None),
+    "buscar_itens": ("busca_textual", lambda resultado: resultado.total > 0),
+    "sugerir_titulos": ("trigramas", bool),
+}
+
+
+class Histograma:
+    __slots__ = ("limites", "contagens", "soma", "total")
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        # Uma faixa a mais para os valores acima do último limite (+Inf)
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def percentil(self, p):
+        # Estimativa pelo limite superior da faixa que contém o percentil
+        if not self.total:
+            return 0.0
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for posicao, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo and contagem:
+                return self.limites[posicao] if posicao < len(self.limites) else float("inf")
+        return float("inf")
+
+
+class Metricas:
+    # Contadores e histogramas em memória. Cada observação custa uma busca
+    # binária e alguns incrementos sob uma trava curta; o texto no formato
+    # do Prometheus só é montado quando alguém pede.
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self._latencias = {}
+        self._erros = {}
+        self._consultas = {}
+        self._alteracoes = {}
+        self._medidores = {}
+        self._trava = threading.Lock()
+
+    def histograma(self, operacao):
+        with self._trava:
+            histograma = self._latencias.get(operacao)
+            if histograma is None:
+                histograma = self._latencias[operacao] = Histograma(self.limites)
+            return histograma
+
+    def observar(self, operacao, duracao, falhou=False):
+        histograma = self.histograma(operacao)
+        with self._trava:
+            histograma.observar(duracao)
+            if falhou:
+                self._erros[operacao] = self._erros.get(operacao, 0) + 1
+
+    def consultas(self, indice):
+        # [acertos, faltas] do índice; a lista é alterada no lugar
+        with self._trava:
+            contagens = self._consultas.get(indice)
+            if contagens is None:
+                contagens = self._consultas[indice] = [0, 0]
+            return contagens
+
+    def contar_consulta(self, indice, acerto):
+        contagens = self.consultas(indice)
+        with self._trava:
+            contagens[0 if acerto else 1] += 1
+
+    def contar_alteracao(self, operacao):
+        with self._trava:
+            self._alteracoes[operacao] = self._alteracoes.get(operacao, 0) + 1
+
+    def registrar_medidor(self, nome, descricao, funcao):
+        # funcao() é chamada só na hora de exportar
+        self._medidores[nome] = (descricao, funcao)
+
+    def taxa_acerto(self, indice):
+        with self._trava:
+            acertos, faltas = self._consultas.get(indice, (0, 0))
+        return acertos / (acertos + faltas) if acertos + faltas else None
+
+    def resumo(self):
+        with self._trava:
+            return {
+                operacao: {
+                    "chamadas": histograma.total,
+                    "erros": self._erros.get(operacao, 0),
+                    "media_s": histograma.soma / histograma.total,
+                    "p50_s": histograma.percentil(50),
+                    "p99_s": histograma.percentil(99),
+                }
+                for operacao, histograma in sorted(self._latencias.items()) if histograma.total
+            }
+
+    def para_prometheus(self, prefixo="biblioteca"):
+        with self._trava:
+            latencias = {operacao: (list(h.contagens), h.soma, h.total) for operacao, h in self._latencias.items()}
+            erros = dict(self._erros)
+            consultas = {indice: tuple(contagens) for indice, contagens in self._consultas.items()}
+            alteracoes = dict(self._alteracoes)
+        linhas = [
+            f"# HELP {prefixo}_operacao_segundos Latência das operações da biblioteca.",
+            f"# TYPE {prefixo}_operacao_segundos histogram",
+        ]
+        for operacao, (contagens, soma, total) in sorted(latencias.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                texto_limite = "+Inf" if limite == float("inf") else repr(limite)
+                linhas.append(f'{prefixo}_operacao_segundos_bucket{{operacao="{operacao}",le="{texto_limite}"}} '
+                              f'{acumulado}')
+            linhas.append(f'{prefixo}_operacao_segundos_sum{{operacao="{operacao}"}} {soma!r}')
+            linhas.append(f'{prefixo}_operacao_segundos_count{{operacao="{operacao}"}} {total}')
+        linhas.append(f"# HELP {prefixo}_operacao_erros_total Operações interrompidas por exceção.")
+        linhas.append(f"# TYPE {prefixo}_operacao_erros_total counter")
+        for operacao, quantidade in sorted(erros.items()):
+            linhas.append(f'{prefixo}_operacao_erros_total{{operacao="{operacao}"}} {quantidade}')
+        linhas.append(f"# HELP {prefixo}_indice_consultas_total Consultas aos índices, por resultado.")
+        linhas.append(f"# TYPE {prefixo}_indice_consultas_total counter")
+        for indice, contagens in sorted(consultas.items()):
+            for resultado, quantidade in zip(("acerto", "falta"), contagens):
+                linhas.append(f'{prefixo}_indice_consultas_total{{indice="{indice}",resultado="{resultado}"}} '
+                              f'{quantidade}')
+        linhas.append(f"# HELP {prefixo}_alteracoes_total Alterações concluídas no estado da biblioteca.")
+        linhas.append(f"# TYPE {prefixo}_alteracoes_total counter")
+        for operacao, quantidade in sorted(alteracoes.items()):
+            linhas.append(f'{prefixo}_alteracoes_total{{operacao="{operacao}"}} {quantidade}')
+        for nome, (descricao, funcao) in sorted(self._medidores.items()):
+            linhas.append(f"# HELP {prefixo}_{nome} {descricao}")
+            linhas.append(f"# TYPE {prefixo}_{nome} gauge")
+            linhas.append(f"{prefixo}_{nome} {funcao()}")
+        return "\n".join(linhas) + "\n"
+
+
+def _medido(metodo, operacao, metricas):
+    histograma = metricas.histograma(operacao)
+    trava = metricas._trava
+    relogio = time.perf_counter
+    indice, acertou = CONSULTAS_INDICES.get(operacao, (None, None))
+    consultas = metricas.consultas(indice) if indice is not None else None
+
+    @functools.wraps(metodo)
+    def envoltorio(*args, **kwargs):
+        inicio = relogio()
+        try:
+            resultado = metodo(*args, **kwargs)
+        except Exception:
+            metricas.observar(operacao, relogio() - inicio, falhou=True)
+            raise
+        duracao = relogio() - inicio
+        if consultas is None:
+            with trava:
+                histograma.observar(duracao)
+        else:
+            posicao = 0 if acertou(resultado) else 1
+            with trava:
+                histograma.observar(duracao)
+                consultas[posicao] += 1
+        return resultado
+    envoltorio.metodo_original = metodo
+    envoltorio.metricas = metricas
+    return envoltorio
+
+
+def instrumentar(biblioteca, metricas=None, operacoes=OPERACOES_INSTRUMENTADAS):
+    # Troca os métodos desta instância (não da classe) por versões medidas.
+    # As chamadas internas passam pelo atributo da instância, então as
+    # buscas feitas dentro de um empréstimo também são contadas.
+    if getattr(biblioteca, "metricas", None) is not None:
+        return biblioteca.metricas
+    metricas = metricas if metricas is not None else Metricas()
+    for operacao in operacoes:
+        metodo = getattr(biblioteca, operacao, None)
+        if metodo is not None:
+            setattr(biblioteca, operacao, _medido(metodo, operacao, metricas))
+
+    registrar_mutacao = getattr(biblioteca, "_registrar_mutacao", None)
+    if registrar_mutacao is not None:
+        def contar_mutacao(operacao, *argumentos):
+            registrar_mutacao(operacao, *argumentos)
+            metricas.contar_alteracao(operacao)
+        contar_mutacao.metodo_original = registrar_mutacao
+        contar_mutacao.metricas = metricas
+        biblioteca._registrar_mutacao = contar_mutacao
+
+    metricas.registrar_medidor("itens_catalogo", "Itens no catálogo.", lambda: len(biblioteca.catalogo))
+    metricas.registrar_medidor("usuarios_registrados", "Usuários registrados.",
+                               lambda: len(biblioteca.usuarios_registrados))
+    if hasattr(biblioteca, "_emprestimos"):
+        metricas.registrar_medidor("emprestimos_ativos", "Empréstimos em aberto.", lambda: len(biblioteca._emprestimos))
+    if hasattr(biblioteca, "_reservas"):
+        metricas.registrar_medidor("reservas_ativas", "Reservas aguardando ou separadas.",
+                                   lambda: len(biblioteca._reservas))
+    if hasattr(biblioteca, "eventos"):
+        metricas.registrar_medidor("eventos_descartados", "Eventos descartados com a fila cheia.",
+                                   lambda: biblioteca.eventos.descartados)
+    cache = getattr(biblioteca, "cache_busca", None)
+    if cache is not None:
+        for nome, descricao in (("acertos", "Buscas respondidas pelo cache."), ("faltas", "Buscas fora do cache."),
+                                ("despejos", "Entradas descartadas por falta de espaço no cache."),
+                                ("invalidacoes", "Entradas descartadas por alterações no catálogo.")):
+            metricas.registrar_medidor(f"cache_busca_{nome}", descricao, lambda nome=nome: getattr(cache, nome))
+    biblioteca.metricas = metricas
+    return metricas
+
+
+def desinstrumentar(biblioteca):
+    # Devolve à instância os métodos que ela tinha antes de instrumentar
+    for nome, valor in list(vars(biblioteca).items()):
+        if getattr(valor, "metricas", None) is biblioteca.metricas and hasattr(valor, "metodo_original"):
+            original = valor.metodo_original
+            if getattr(original, "__func__", None) is getattr(type(biblioteca), nome, None):
+                delattr(biblioteca, nome)
+            else:
+                setattr(biblioteca, nome, original)
+    biblioteca.metricas = None
@@ -0,0 +1,183 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import logging.handlers
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+OPERACOES_MONITORADAS = (
+    "realizar_emprestimo", "registrar_devolucao_item", "registrar_usuario", "adicionar_item_catalogo",
+    "remover_item_catalogo", "importar_itens", "importar_usuarios", "adicionar_exemplares",
+    "buscar_item_por_titulo", "buscar_usuario_por_matricula", "buscar_itens", "sugerir_titulos",
+    "reservar_item", "cancelar_reserva", "expirar_reservas", "emprestimos_atrasados",
+)
+PERFIS = (None, "cprofile", "tracemalloc")
+LIMITE_REPR = 200
+
+
+def _resumir(valor):
+    texto = repr(valor)
+    return texto if len(texto) <= LIMITE_REPR else texto[:LIMITE_REPR] + "..."
+
+
+def tamanhos_colecoes(biblioteca):
+    # Contagens em O(1); emprestimos_ativos montaria uma lista a cada chamada
+    tamanhos = {"catalogo": len(biblioteca.catalogo), "usuarios": len(biblioteca.usuarios_registrados)}
+    if hasattr(biblioteca, "_emprestimos"):
+        tamanhos["emprestimos_ativos"] = len(biblioteca._emprestimos)
+    if hasattr(biblioteca, "_reservas"):
+        tamanhos["reservas_ativas"] = len(biblioteca._reservas)
+    return tamanhos
+
+
+class RegistroOperacoesLentas:
+    # Grava em JSON Lines, num arquivo com rotação, as chamadas que passam do
+    # limite. Limite, perfil e ativação podem mudar a qualquer momento; as
+    # chamadas seguintes já usam os novos valores.
+    #
+    # perfil=None só mede o tempo. "cprofile" perfila a chamada e anexa as
+    # funções mais caras quando ela é lenta; o perfilador é um só por
+    # processo, então chamadas simultâneas em outras threads seguem sem
+    # perfil. "tracemalloc" anexa a memória alocada na chamada e os pontos
+    # que mais cresceram desde a ativação.
+
+    def __init__(self, caminho, limite_ms=50.0, perfil=None, tamanho_maximo=1024 * 1024, copias=3,
+                 funcoes_perfil=15):
+        self.caminho = caminho
+        self.limite_ms = limite_ms
+        self.funcoes_perfil = funcoes_perfil
+        self.ativo = True
+        self.registradas = 0
+        self._perfil = None
+        self._base_memoria = None
+        self._iniciou_tracemalloc = False
+        self._perfilador_livre = threading.Lock()
+        self._local = threading.local()
+        self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._handler = logging.handlers.RotatingFileHandler(caminho, maxBytes=tamanho_maximo,
+                                                             backupCount=copias, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(self._handler)
+        self.perfil = perfil
+
+    @property
+    def perfil(self):
+        return self._perfil
+
+    @perfil.setter
+    def perfil(self, perfil):
+        if perfil not in PERFIS:
+            raise ValueError(f"Perfil inválido: {perfil}. Use um de {PERFIS}.")
+        if perfil == "tracemalloc" and self._perfil != "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._iniciou_tracemalloc = True
+            self._base_memoria = tracemalloc.take_snapshot()
+        elif perfil != "tracemalloc" and self._perfil == "tracemalloc":
+            self._base_memoria = None
+            if self._iniciou_tracemalloc:
+                # Quem ligou o tracemalloc antes continua com ele ligado
+                tracemalloc.stop()
+                self._iniciou_tracemalloc = False
+        self._perfil = perfil
+
+    def fechar(self):
+        self.ativo = False
+        self.perfil = None
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+    def executar(self, biblioteca, operacao, metodo, args, kwargs):
+        # Só a chamada mais externa é medida: as buscas feitas dentro de um
+        # empréstimo aparecem no perfil do empréstimo, não como linhas à parte
+        if not self.ativo or getattr(self._local, "ocupado", False):
+            return metodo(*args, **kwargs)
+        self._local.ocupado = True
+        try:
+            perfil = self._perfil
+            if perfil == "cprofile" and self._perfilador_livre.acquire(blocking=False):
+                try:
+                    perfilador = cProfile.Profile()
+                    inicio = time.perf_counter()
+                    perfilador.enable()
+                    try:
+                        return metodo(*args, **kwargs)
+                    finally:
+                        perfilador.disable()
+                        self._verificar(biblioteca, operacao, args, kwargs, time.perf_counter() - inicio,
+                                        perfilador=perfilador)
+                finally:
+                    self._perfilador_livre.release()
+            if perfil == "tracemalloc" and tracemalloc.is_tracing():
+                antes = tracemalloc.get_traced_memory()[0]
+                inicio = time.perf_counter()
+                try:
+                    return metodo(*args, **kwargs)
+                finally:
+                    duracao = time.perf_counter() - inicio
+                    self._verificar(biblioteca, operacao, args, kwargs, duracao,
+                                    memoria=tracemalloc.get_traced_memory()[0] - antes)
+            inicio = time.perf_counter()
+            try:
+                return metodo(*args, **kwargs)
+            finally:
+                self._verificar(biblioteca, operacao, args, kwargs, time.perf_counter() - inicio)
+        finally:
+            self._local.ocupado = False
+
+    def _verificar(self, biblioteca, operacao, args, kwargs, duracao, perfilador=None, memoria=None):
+        if duracao * 1000 < self.limite_ms:
+            return
+        registro = {
+            "momento": datetime.now().isoformat(timespec="milliseconds"),
+            "operacao": operacao,
+            "duracao_ms": round(duracao * 1000, 3),
+            "limite_ms": self.limite_ms,
+            "argumentos": [_resumir(valor) for valor in args],
+            "argumentos_nomeados": {nome: _resumir(valor) for nome, valor in kwargs.items()},
+            "tamanhos": tamanhos_colecoes(biblioteca),
+            "thread": threading.current_thread().name,
+        }
+        if perfilador is not None:
+            saida = io.StringIO()
+            pstats.Stats(perfilador, stream=saida).sort_stats("cumulative").print_stats(self.funcoes_perfil)
+            registro["perfil"] = saida.getvalue()
+        if memoria is not None:
+            registro["variacao_memoria_bytes"] = memoria
+            if self._base_memoria is not None:
+                diferencas = tracemalloc.take_snapshot().compare_to(self._base_memoria, "lineno")
+                registro["maiores_alocacoes"] = [str(diferenca) for diferenca in diferencas[:10]]
+        self.registradas += 1
+        self._logger.info(json.dumps(registro, ensure_ascii=False))
+
+
+def _monitorado(biblioteca, registro, operacao, metodo):
+    @functools.wraps(metodo)
+    def envoltorio(*args, **kwargs):
+        return registro.executar(biblioteca, operacao, metodo, args, kwargs)
+    return envoltorio
+
+
+def monitorar(biblioteca, registro, operacoes=OPERACOES_MONITORADAS):
+    # Como metricas.instrumentar, troca os métodos desta instância. Depois
+    # de instalado, basta mudar registro.ativo para ligar ou desligar.
+    if getattr(biblioteca, "operacoes_lentas", None) is not None:
+        raise ValueError("A biblioteca já tem um registro de operações lentas.")
+    for operacao in operacoes:
+        metodo = getattr(biblioteca, operacao, None)
+        if metodo is not None:
+            setattr(biblioteca, operacao, _monitorado(biblioteca, registro, operacao, metodo))
+    biblioteca.operacoes_lentas = registro
+    return registro
+
+
+def ler_operacoes_lentas(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from biblioteca_persistencia import BibliotecaPersistente
+from cache_busca import CacheBusca, ativar_cache
+from cliente import BibliotecaRemota
+from eventos import ArquivoEventos
+from metricas import instrumentar
+from perfilamento import PERFIS, RegistroOperacoesLentas, monitorar
+from biblioteca_models import (
+    Biblioteca, Recusa, item_de_registro, item_para_registro_com_estado,
+    usuario_de_registro, usuario_para_registro
+)
+
+LIMITE_LINHA = 1024 * 1024
+
+
+def registro_configuracao(config):
+    return {
+        "max_livros_por_usuario": config.get_max_livros_por_usuario(),
+        "dias_emprestimo_padrao": config.dias_emprestimo_padrao,
+        "dias_retirada_reserva": config.dias_retirada_reserva,
+        "limites_por_tipo": dict(config.limites_por_tipo),
+        "dias_por_tipo": dict(config.dias_por_tipo),
+    }
+
+
+def registro_emprestimo(emprestimo):
+    return {
+        "usuario": usuario_para_registro(emprestimo.usuario),
+        "item": item_para_registro_com_estado(emprestimo.item),
+        "data_emprestimo": emprestimo.data_emprestimo.isoformat(),
+        "data_devolucao_prevista": emprestimo.data_devolucao_prevista.isoformat(),
+        "exemplar": emprestimo.exemplar,
+    }
+
+
+class OperacoesBiblioteca:
+    # Tabela de operações aceitas pelo servidor e pelo modo em lote
+    # (lote.py): cada requisição é {"op": ..., "args": [...]} e cada resposta
+    # {"ok": ..., "resultado"/"erro": ...}, com registros JSON no lugar dos
+    # objetos do modelo. Uma operação que rodou mas foi recusada pelas regras
+    # (Recusa, ou False em remover_item_catalogo e adicionar_exemplares)
+    # responde com ok e "recusado": true.
+
+    def __init__(self, biblioteca):
+        self.biblioteca = biblioteca
+        self._operacoes = {
+            "buscar_item_por_titulo": self._buscar_item_por_titulo,
+            "buscar_usuario_por_matricula": self._buscar_usuario_por_matricula,
+            "buscar_itens": self._buscar_itens,
+            "sugerir_titulos": biblioteca.sugerir_titulos,
+            "itens_do_autor": self._itens_do_autor,
+            "adicionar_item_catalogo": self._adicionar_item_catalogo,
+            "remover_item_catalogo": biblioteca.remover_item_catalogo,
+            "adicionar_exemplares": biblioteca.adicionar_exemplares,
+            "registrar_usuario": self._registrar_usuario,
+            "realizar_emprestimo": biblioteca.realizar_emprestimo,
+            "registrar_devolucao_item": biblioteca.registrar_devolucao_item,
+            "reservar_item": biblioteca.reservar_item,
+            "cancelar_reserva": biblioteca.cancelar_reserva,
+            "posicao_na_fila": biblioteca.posicao_na_fila,
+            "listar_itens": self._listar_itens,
+            "listar_usuarios": self._listar_usuarios,
+            "listar_emprestimos_ativos": self._listar_emprestimos_ativos,
+            "pagina_itens": self._pagina_itens,
+            "pagina_usuarios": self._pagina_usuarios,
+            "pagina_emprestimos_ativos": self._pagina_emprestimos_ativos,
+            "emprestimos_atrasados": self._emprestimos_atrasados,
+            "metricas": self._metricas,
+            "configuracoes": self._configuracoes,
+            "set_max_livros_por_usuario": self._set_max_livros_por_usuario,
+            "set_limite_por_tipo": self._set_limite_por_tipo,
+            "set_dias_emprestimo": self._set_dias_emprestimo,
+        }
+
+    # --- operações ---
+
+    def _buscar_item_por_titulo(self, titulo):
+        item = self.biblioteca.buscar_item_por_titulo(titulo)
+        return item_para_registro_com_estado(item) if item else None
+
+    def _buscar_itens(self, consulta, pagina=1, por_pagina=10):
+        resultados = self.biblioteca.buscar_itens(consulta, pagina, por_pagina)
+        return {"itens": [item_para_registro_com_estado(item) for item in resultados.itens],
+                "total": resultados.total, "pagina": resultados.pagina, "por_pagina": resultados.por_pagina,
+                "truncado": resultados.truncado}
+
+    def _itens_do_autor(self, nome, email=None):
+        return [item_para_registro_com_estado(item) for item in self.biblioteca.itens_do_autor(nome, email)]
+
+    def _buscar_usuario_por_matricula(self, matricula):
+        usuario = self.biblioteca.buscar_usuario_por_matricula(matricula)
+        return usuario_para_registro(usuario) if usuario else None
+
+    def _adicionar_item_catalogo(self, registro):
+        self.biblioteca.adicionar_item_catalogo(item_de_registro(registro))
+
+    def _registrar_usuario(self, registro):
+        self.biblioteca.registrar_usuario(usuario_de_registro(registro))
+
+    def _listar_itens(self):
+        return [item_para_registro_com_estado(item) for item in list(self.biblioteca.catalogo)]
+
+    def _listar_usuarios(self):
+        return [usuario_para_registro(usuario) for usuario in list(self.biblioteca.usuarios_registrados)]
+
+    def _listar_emprestimos_ativos(self):
+        return [registro_emprestimo(emprestimo) for emprestimo in self.biblioteca.emprestimos_ativos]
+
+    @staticmethod
+    def _registro_pagina(pagina, converter):
+        return {"itens": [converter(registro) for registro in pagina.itens], "proximo_cursor": pagina.proximo_cursor}
+
+    def _pagina_itens(self, cursor=0, por_pagina=20, filtros=None):
+        pagina = self.biblioteca.pagina_itens(cursor, por_pagina, **(filtros or {}))
+        return self._registro_pagina(pagina, item_para_registro_com_estado)
+
+    def _pagina_usuarios(self, cursor=0, por_pagina=20):
+        return self._registro_pagina(self.biblioteca.pagina_usuarios(cursor, por_pagina), usuario_para_registro)
+
+    def _pagina_emprestimos_ativos(self, cursor=0, por_pagina=20, matricula=None):
+        pagina = self.biblioteca.pagina_emprestimos_ativos(cursor, por_pagina, matricula)
+        return self._registro_pagina(pagina, registro_emprestimo)
+
+    def _emprestimos_atrasados(self, data_referencia):
+        return [registro_emprestimo(emprestimo) for emprestimo in self.biblioteca.emprestimos_atrasados(data_referencia)]
+
+    # A configuração é lida na hora em cada empréstimo: as alterações valem
+    # para todos os clientes a partir da próxima operação
+
+    def _configuracoes(self):
+        return registro_configuracao(self.biblioteca.config)
+
+    def _set_max_livros_por_usuario(self, novo_maximo):
+        self.biblioteca.config.set_max_livros_por_usuario(novo_maximo)
+
+    def _set_limite_por_tipo(self, tipo, novo_maximo):
+        self.biblioteca.config.set_limite_por_tipo(tipo, novo_maximo)
+
+    def _set_dias_emprestimo(self, tipo, dias):
+        self.biblioteca.config.set_dias_emprestimo(tipo, dias)
+
+    def _metricas(self):
+        if isinstance(self.biblioteca, BibliotecaRemota):
+            # Lote sobre um servidor: as métricas são as dele
+            return self.biblioteca.metricas()
+        if self.biblioteca.metricas is None:
+            raise ValueError("Métricas desativadas no servidor (use --metricas).")
+        return self.biblioteca.metricas.para_prometheus()
+
+    def executar(self, requisicao):
+        identificador = None
+        try:
+            identificador = requisicao.get("id")
+            operacao = self._operacoes.get(requisicao.get("op"))
+            if operacao is None:
+                raise ValueError(f"Operação desconhecida: {requisicao.get('op')}")
+            resultado = operacao(*requisicao.get("args", []))
+            resposta = {"id": identificador, "ok": True, "resultado": resultado}
+            if isinstance(resultado, Recusa) or resultado is False:
+                resposta["recusado"] = True
+            return resposta
+        except Exception as e:
+            # Qualquer falha vira resposta de erro: a conexão (ou o lote) segue
+            return {"id": identificador, "ok": False, "erro": str(e), "tipo": type(e).__name__}
+
+    def executar_linha(self, linha):
+        try:
+            requisicao = json.loads(linha)
+        except ValueError as e:
+            resposta = {"id": None, "ok": False, "erro": str(e), "tipo": type(e).__name__}
+        else:
+            if isinstance(requisicao, dict):
+                resposta = self.executar(requisicao)
+            else:
+                resposta = {"id": None, "ok": False, "erro": "Requisição deve ser um objeto JSON.",
+                            "tipo": "ValueError"}
+        return (json.dumps(resposta, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class ServidorBiblioteca:
+    # Servidor asyncio que atende vários clientes ao mesmo tempo. Cada
+    # requisição é uma linha JSON ({"op": ..., "args": [...]}) e cada resposta
+    # também. As operações da Biblioteca (e a serialização dos resultados)
+    # rodam em um pool de threads para não travar o laço de eventos.
+
+    def __init__(self, biblioteca, host="127.0.0.1", porta=8765, max_threads=8):
+        self.biblioteca = biblioteca
+        self.host = host
+        self.porta = porta
+        self.operacoes = OperacoesBiblioteca(biblioteca)
+        self._executor = ThreadPoolExecutor(max_workers=max_threads)
+        self._servidor = None
+        self._laco = None
+
+    # --- rede ---
+
+    async def _atender(self, leitor, escritor):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    linha = await leitor.readline()
+                except ValueError:
+                    # readline() converte LimitOverrunError em ValueError. O
+                    # resto da linha ainda está no buffer, então a conexão
+                    # não tem como continuar: responde e encerra.
+                    resposta = {"id": None, "ok": False, "tipo": "ValueError",
+                                "erro": f"Requisição maior que o limite de {LIMITE_LINHA} bytes."}
+                    escritor.write((json.dumps(resposta, ensure_ascii=False) + "\n").encode("utf-8"))
+                    await escritor.drain()
+                    break
+                if not linha:
+                    break
+                resposta = await loop.run_in_executor(self._executor, self.operacoes.executar_linha, linha)
+                escritor.write(resposta)
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            escritor.close()
+
+    async def iniciar(self):
+        self._laco = asyncio.get_running_loop()
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta, limit=LIMITE_LINHA)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        return self._servidor
+
+    async def executar(self, ao_iniciar=None):
+        servidor = await self.iniciar()
+        if ao_iniciar is not None:
+            ao_iniciar()
+        async with servidor:
+            try:
+                await servidor.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    async def parar(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    def encerrar(self):
+        # Para um servidor que roda no laço de eventos de outra thread
+        asyncio.run_coroutine_threadsafe(self.parar(), self._laco).result()
+
+
+def iniciar_servidor_em_thread(biblioteca, host="127.0.0.1", porta=0, max_threads=8):
+    servidor = ServidorBiblioteca(biblioteca, host, porta, max_threads)
+    pronto = threading.Event()
+    threading.Thread(target=asyncio.run, args=(servidor.executar(pronto.set),), daemon=True).start()
+    pronto.wait()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor da Biblioteca")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--dados", help="diretório de persistência (ver biblioteca_persistencia)")
+    parser.add_argument("--eventos", metavar="ARQUIVO", help="grava as alterações da biblioteca em JSON Lines")
+    parser.add_argument("--metricas", action="store_true", help="mede as operações (consultáveis pela operação 'metricas')")
+    parser.add_argument("--lentas", metavar="ARQUIVO", help="grava as operações mais lentas que --limite-lentas")
+    parser.add_argument("--limite-lentas", type=float, default=50.0, metavar="MS")
+    parser.add_argument("--perfil", choices=[perfil for perfil in PERFIS if perfil],
+                        help="anexa um perfil (cProfile ou tracemalloc) às operações lentas")
+    parser.add_argument("--cache-busca", type=int, default=0, metavar="ENTRADAS",
+                        help="guarda em cache (LRU) os resultados das buscas textuais e sugestões")
+    argumentos = parser.parse_args()
+
+    if argumentos.dados:
+        biblioteca = BibliotecaPersistente("Biblioteca Comunitária", argumentos.dados)
+    else:
+        biblioteca = Biblioteca("Biblioteca Comunitária")
+    if argumentos.eventos:
+        biblioteca.assinar_eventos(ArquivoEventos(argumentos.eventos))
+    # Cache, métricas e registro de lentidão antes de criar o servidor, que guarda referências aos métodos.
+    # O cache vem primeiro para que as métricas meçam também as buscas respondidas por ele.
+    if argumentos.cache_busca:
+        ativar_cache(biblioteca, CacheBusca(argumentos.cache_busca))
+    if argumentos.metricas:
+        instrumentar(biblioteca)
+    if argumentos.lentas:
+        monitorar(biblioteca, RegistroOperacoesLentas(argumentos.lentas, argumentos.limite_lentas, argumentos.perfil))
+
+    servidor = ServidorBiblioteca(biblioteca, argumentos.host, argumentos.porta, argumentos.threads)
+    print(f"Servidor da biblioteca ouvindo em {argumentos.host}:{argumentos.porta}")
+    try:
+        asyncio.run(servidor.executar())
+    except KeyboardInterrupt:
+        print("Servidor encerrado.")
+    finally:
+        biblioteca.eventos.fechar()
+        if biblioteca.operacoes_lentas is not None:
+            biblioteca.operacoes_lentas.fechar()
+        if isinstance(biblioteca, BibliotecaPersistente):
+            # Como no main: o próximo início carrega só o snapshot
+            biblioteca.compactar(aguardar=True)
+            biblioteca.fechar()
@@ -1,8 +1,34 @@
+import io
+import json
+import os
+import random
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from biblioteca_models import (
     Pessoa, Autor, Usuario, ItemBibliografico, Livro, Revista, DVD,
-    Emprestimo, Biblioteca, ConfiguracaoBiblioteca
+    Emprestimo, Biblioteca, ConfiguracaoBiblioteca, Recusa, Reserva, ler_registros_csv,
+    ler_registros_jsonl, item_para_registro
 )
+from biblioteca_persistencia import BibliotecaPersistente, abrir_catalogo_mapeado
+from biblioteca_sqlite import BibliotecaSQLite
+from benchmark_biblioteca import comparar, executar
+from biblioteca_fragmentada import BibliotecaFragmentada, Fragmento, fragmento_de
+from cache_busca import CacheBusca, ativar_cache, desativar_cache
+from catalogo_mapeado import CatalogoMapeado, exportar_catalogo
+from cliente import BibliotecaRemota
+from federacao import CacheTTL, FederacaoBibliotecas
+from eventos import ArquivoEventos, BarramentoEventos, EmprestimoRealizado, ItemDevolvido
+from metricas import Histograma, desinstrumentar, instrumentar
+from perfilamento import RegistroOperacoesLentas, ler_operacoes_lentas, monitorar
+from lote import executar_em_paralelo, executar_lote
+from servidor import LIMITE_LINHA, OperacoesBiblioteca, iniciar_servidor_em_thread
 
 class TestPessoa(unittest.TestCase):
     def test_criar_pessoa(self):
@@ -74,6 +100,12 @@ class TestUsuario(unittest.TestCase):
     def test_usuario_devolver_livro_nao_emprestado(self):
         self.assertFalse(self.usuario.devolver_livro(self.livro_disponivel))
 
+    def test_modelo_sem_dict_por_instancia(self):
+        for objeto in (self.usuario, self.autor, self.livro_disponivel,
+                       DVD("Filme", 2000, 90, "Diretor"), Revista("Revista", 2000, "1", "Editora")):
+            self.assertFalse(hasattr(objeto, "__dict__"))
+        self.assertEqual(self.usuario.livros_emprestados, [])
+
 
 class TestItemBibliografico(unittest.TestCase):
     def test_criar_item(self):
@@ -111,6 +143,38 @@ class TestLivro(unittest.TestCase):
         self.livro.devolver()
         self.assertTrue(self.livro.esta_disponivel())
 
+    def test_livro_com_exemplares(self):
+        livro = Livro("Best-seller", 2020, "999", self.autor, exemplares=3)
+        retirados = [livro.emprestar() for _ in range(3)]
+        self.assertEqual(sorted(retirados), [1, 2, 3])
+        self.assertFalse(livro.esta_disponivel())
+        self.assertIsNone(livro.emprestar())
+        livro.devolver(2)
+        self.assertEqual(livro.get_exemplares_disponiveis(), 1)
+        self.assertEqual(livro.emprestar(), 2)
+        livro.adicionar_exemplares(2)
+        self.assertEqual((livro.get_total_exemplares(), livro.get_exemplares_disponiveis()), (5, 2))
+        self.assertEqual(livro.emprestar(4), 4)
+        self.assertIsNone(livro.emprestar(4))
+        with self.assertRaises(ValueError):
+            Livro("Titulo", 2000, "123", self.autor, exemplares=0)
+
+    def test_devolver_exemplar_que_nao_esta_emprestado(self):
+        livro = Livro("Best-seller", 2020, "999", self.autor, exemplares=3)
+        livro.emprestar()
+        livro.emprestar()
+        livro.devolver(1)
+        with self.assertRaises(ValueError):
+            livro.devolver(1)
+        with self.assertRaises(ValueError):
+            livro.devolver(3)
+        self.assertEqual(livro.get_exemplares_disponiveis(), 2)
+        self.assertIsNone(livro.emprestar(2))
+        livro.devolver(2)
+        self.assertEqual(livro.get_exemplares_disponiveis(), 3)
+        with self.assertRaises(ValueError):
+            livro.devolver(2)
+
     def test_livro_isbn_invalido(self):
         with self.assertRaises(ValueError):
             Livro("Titulo", 2000, "", self.autor)
@@ -167,6 +231,12 @@ class TestEmprestimo(unittest.TestCase):
         self.emprestimo.devolvido = True
         self.assertFalse(self.emprestimo.esta_atrasado("2023-01-20")) # Não está atrasado se já devolvido
 
+    def test_emprestimo_datas_tipadas(self):
+        self.assertEqual(self.emprestimo.data_devolucao_prevista, date(2023, 1, 15))
+        self.assertTrue(self.emprestimo.esta_atrasado(date(2023, 1, 16)))
+        with self.assertRaises(ValueError):
+            Emprestimo(self.usuario, self.livro, "01/01/2023", "2023-01-15")
+
 
 class TestBiblioteca(unittest.TestCase):
     def setUp(self):
@@ -223,12 +293,1595 @@ class TestBiblioteca(unittest.TestCase):
         resultado = self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
         self.assertIn("devolvido por Winston Smith", resultado)
         self.assertTrue(self.livro1.esta_disponivel())
-        self.assertTrue(self.biblioteca.emprestimos_ativos[0].devolvido)
+        self.assertEqual(self.biblioteca.emprestimos_ativos, [])
+        self.assertTrue(self.biblioteca.historico_emprestimos[0].devolvido)
 
     def test_registrar_devolucao_item_nao_emprestado(self):
         resultado = self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
         self.assertEqual(resultado, "Empréstimo não encontrado ou já devolvido.")
 
+    def test_buscar_item_ignora_maiusculas(self):
+        self.assertIs(self.biblioteca.buscar_item_por_titulo("mATRIX"), self.dvd1)
+
+    def test_remover_item_com_titulo_repetido(self):
+        copia = Livro("1984", 1950, "333", self.autor)
+        self.biblioteca.adicionar_item_catalogo(copia)
+        self.assertTrue(self.biblioteca.remover_item_catalogo("1984"))
+        self.assertIs(self.biblioteca.buscar_item_por_titulo("1984"), copia)
+        self.assertNotIn(self.livro1, self.biblioteca.catalogo)
+
+    def test_devolucao_nao_afeta_outros_emprestimos(self):
+        self.biblioteca.registrar_usuario(self.usuario2)
+        self.biblioteca.adicionar_item_catalogo(self.livro2)
+        self.biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10", "2023-03-24")
+        self.biblioteca.realizar_emprestimo("MINVER002", "A Revolução dos Bichos", "2023-03-10", "2023-03-24")
+        self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
+        ativos = self.biblioteca.emprestimos_ativos
+        self.assertEqual(len(ativos), 1)
+        self.assertIs(ativos[0].usuario, self.usuario2)
+        resultado = self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-16")
+        self.assertEqual(resultado, "Empréstimo não encontrado ou já devolvido.")
+
+    def test_consultas_por_vencimento(self):
+        self.biblioteca.registrar_usuario(self.usuario2)
+        self.biblioteca.adicionar_item_catalogo(self.livro2)
+        self.biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-01", "2023-03-10")
+        livro3 = Livro("Homenagem à Catalunha", 1938, "333", self.autor)
+        self.biblioteca.adicionar_item_catalogo(livro3)
+        self.biblioteca.realizar_emprestimo("MINVER001", "Homenagem à Catalunha", date(2023, 3, 1), date(2023, 3, 20))
+        self.biblioteca.realizar_emprestimo("MINVER002", "A Revolução dos Bichos", "2023-03-01", "2023-03-12")
+
+        atrasados = self.biblioteca.emprestimos_atrasados("2023-03-13")
+        self.assertEqual([e.item for e in atrasados], [self.livro1, self.livro2])
+        self.assertEqual(self.biblioteca.emprestimos_atrasados("2023-03-10"), [])
+        self.assertEqual(self.biblioteca.contagem_atrasos_por_usuario("2023-03-21"),
+                         {"MINVER001": 2, "MINVER002": 1})
+        a_vencer = self.biblioteca.emprestimos_a_vencer("2023-03-12", 8)
+        self.assertEqual([e.item for e in a_vencer], [self.livro2, livro3])
+
+        self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-14")
+        self.assertEqual([e.item for e in self.biblioteca.emprestimos_atrasados("2023-03-14")], [self.livro2])
+
+    def test_limites_de_emprestimo(self):
+        config = ConfiguracaoBiblioteca(max_livros_por_usuario=2, limites_por_tipo={"dvd": 1})
+        biblioteca = Biblioteca("Biblioteca Limitada", config)
+        biblioteca.registrar_usuario(self.usuario1)
+        for i in range(3):
+            biblioteca.adicionar_item_catalogo(Livro(f"Livro {i}", 2000, str(i), self.autor))
+        biblioteca.adicionar_item_catalogo(self.dvd1)
+        biblioteca.adicionar_item_catalogo(DVD("Brazil", 1985, 132, "Terry Gilliam"))
+
+        self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo("MINVER001", "Matrix", "2023-03-10"))
+        self.assertIn("tipo 'dvd'", biblioteca.realizar_emprestimo("MINVER001", "Brazil", "2023-03-10"))
+        self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo("MINVER001", "Livro 0", "2023-03-10"))
+        self.assertIn("Limite de 2", biblioteca.realizar_emprestimo("MINVER001", "Livro 1", "2023-03-10"))
+
+        # A alteração da configuração vale no próximo empréstimo
+        config.set_max_livros_por_usuario(3)
+        self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo("MINVER001", "Livro 1", "2023-03-10"))
+        biblioteca.registrar_devolucao_item("MINVER001", "Matrix", "2023-03-11")
+        self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo("MINVER001", "Brazil", "2023-03-11"))
+        self.assertTrue(self.dvd1.esta_disponivel())
+
+    def test_emprestimo_de_exemplares(self):
+        best_seller = Livro("Best-seller", 2020, "999", self.autor, exemplares=2)
+        self.biblioteca.adicionar_item_catalogo(best_seller)
+        self.biblioteca.registrar_usuario(self.usuario2)
+        self.biblioteca.registrar_usuario(Usuario("O'Brien", "obrien@ex.com", "MINVER003"))
+
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER001", "Best-seller", "2023-03-10"))
+        self.assertIn("já possui", self.biblioteca.realizar_emprestimo("MINVER001", "Best-seller", "2023-03-10"))
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER002", "Best-seller", "2023-03-10"))
+        self.assertIn("não está disponível", self.biblioteca.realizar_emprestimo("MINVER003", "Best-seller", "2023-03-10"))
+        self.assertEqual(sorted(e.exemplar for e in self.biblioteca.emprestimos_ativos), [1, 2])
+
+        self.biblioteca.registrar_devolucao_item("MINVER001", "Best-seller", "2023-03-12")
+        self.assertEqual(best_seller.get_exemplares_disponiveis(), 1)
+        self.assertTrue(self.biblioteca.adicionar_exemplares("Best-seller", 1))
+        self.assertIn("Exemplar 2", self.biblioteca.realizar_emprestimo("MINVER003", "Best-seller", "2023-03-12",
+                                                                          exemplar=2))
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER003", "Best-seller",
+                                                                                  "2023-03-12", exemplar=3))
+        self.assertEqual(len(self.biblioteca.catalogo), 3)
+        self.assertFalse(self.biblioteca.adicionar_exemplares("Livro X"))
+
+    def test_prazo_padrao_por_tipo(self):
+        config = ConfiguracaoBiblioteca(dias_emprestimo_padrao=14, dias_por_tipo={"dvd": 3})
+        biblioteca = Biblioteca("Biblioteca Prazos", config)
+        biblioteca.registrar_usuario(self.usuario1)
+        biblioteca.adicionar_item_catalogo(self.livro1)
+        biblioteca.adicionar_item_catalogo(self.dvd1)
+        biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10")
+        biblioteca.realizar_emprestimo("MINVER001", "Matrix", "2023-03-10")
+        prazos = {e.item.get_titulo(): e.data_devolucao_prevista for e in biblioteca.emprestimos_ativos}
+        self.assertEqual(prazos, {"1984": date(2023, 3, 24), "Matrix": date(2023, 3, 13)})
+
+
+class TestImportacao(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+
+    def test_importar_itens_com_erros(self):
+        relatorio = self.biblioteca.importar_itens([
+            {"tipo": "livro", "titulo": "Dom Casmurro", "ano_publicacao": "1899", "isbn": "111",
+             "autor_nome": "Machado de Assis", "autor_email": "machado@abl.org.br"},
+            {"tipo": "dvd", "titulo": "Matrix", "ano_publicacao": 1999, "duracao_minutos": 0, "diretor": "Wachowskis"},
+            {"tipo": "revista", "titulo": "Piauí", "ano_publicacao": 2023, "edicao": "200", "editora": "Alvinegra"},
+            {"tipo": "livro", "titulo": "Sem Autor", "ano_publicacao": 2000, "isbn": "222",
+             "autor_nome": "Fulano", "autor_email": "sem-arroba"},
+            {"tipo": "mapa", "titulo": "Mapa", "ano_publicacao": 2000},
+        ])
+        self.assertEqual(relatorio.importados, 2)
+        self.assertEqual([numero for numero, _ in relatorio.erros], [2, 4, 5])
+        self.assertEqual(relatorio.erros[0][1], "Duração inválida")
+        self.assertEqual(self.biblioteca.buscar_item_por_titulo("dom casmurro").get_ano_publicacao(), 1899)
+        self.assertIsInstance(self.biblioteca.buscar_item_por_titulo("Piauí"), Revista)
+
+    def test_importar_usuarios_duplicados(self):
+        self.biblioteca.registrar_usuario(Usuario("Ana", "ana@ex.com", "MAT001"))
+        relatorio = self.biblioteca.importar_usuarios([
+            {"nome": "Bia", "email": "bia@ex.com", "matricula": "MAT002"},
+            {"nome": "Ana Clone", "email": "ana2@ex.com", "matricula": "MAT001"},
+            {"nome": "Bia Clone", "email": "bia2@ex.com", "matricula": "MAT002"},
+            {"nome": "", "email": "x@ex.com", "matricula": "MAT003"},
+        ])
+        self.assertEqual(relatorio.importados, 1)
+        self.assertEqual([numero for numero, _ in relatorio.erros], [2, 3, 4])
+        self.assertEqual(self.biblioteca.buscar_usuario_por_matricula("MAT002").nome, "Bia")
+        self.assertEqual(len(self.biblioteca.usuarios_registrados), 2)
+
+    def test_importar_usuarios_csv(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, "usuarios.csv")
+            with open(caminho, "w", encoding="utf-8", newline="") as arquivo:
+                arquivo.write("nome,email,matricula\nJoão,joao@ex.com,MAT010\nMaria,maria@ex.com,MAT011\n")
+            relatorio = self.biblioteca.importar_usuarios(ler_registros_csv(caminho))
+        self.assertEqual(relatorio.importados, 2)
+        self.assertEqual(relatorio.erros, [])
+        self.assertIsNotNone(self.biblioteca.buscar_usuario_por_matricula("MAT011"))
+
+
+class TestBibliotecaPersistente(unittest.TestCase):
+    def setUp(self):
+        self.temporario = tempfile.TemporaryDirectory()
+        self.diretorio = self.temporario.name
+
+    def tearDown(self):
+        self.temporario.cleanup()
+
+    def popular(self, biblioteca):
+        autor = Autor("George Orwell", "go@dystopian.com")
+        biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", autor, "Distopia"))
+        biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowskis"))
+        biblioteca.adicionar_item_catalogo(Revista("Piauí", 2023, "200", "Alvinegra"))
+        biblioteca.registrar_usuario(Usuario("Winston Smith", "winston@ex.com", "MINVER001"))
+        biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10", "2023-03-24")
+        biblioteca.remover_item_catalogo("Piauí")
+
+    def test_reabrir_reproduz_diario(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.popular(biblioteca)
+        biblioteca.fechar()
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual(len(reaberta.catalogo), 2)
+        self.assertIsNone(reaberta.buscar_item_por_titulo("Piauí"))
+        livro = reaberta.buscar_item_por_titulo("1984")
+        self.assertEqual(livro.get_autor_nome(), "George Orwell")
+        self.assertFalse(livro.esta_disponivel())
+        self.assertEqual(len(reaberta.emprestimos_ativos), 1)
+        reaberta.fechar()
+
+    def test_exemplares_sobrevivem_a_reabertura(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        autor = Autor("George Orwell", "go@dystopian.com")
+        biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", autor, exemplares=2))
+        biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(3))
+        biblioteca.realizar_emprestimo("L0", "1984", "2023-03-10")
+        biblioteca.compactar(aguardar=True)
+        biblioteca.adicionar_exemplares("1984", 1)
+        biblioteca.realizar_emprestimo("L1", "1984", "2023-03-10")
+        biblioteca.registrar_devolucao_item("L0", "1984", "2023-03-11")
+        biblioteca.realizar_emprestimo("L2", "1984", "2023-03-11")
+        esperado = sorted((e.usuario.matricula, e.exemplar) for e in biblioteca.emprestimos_ativos)
+        biblioteca.fechar()
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        livro = reaberta.buscar_item_por_titulo("1984")
+        self.assertEqual((livro.get_total_exemplares(), livro.get_exemplares_disponiveis()), (3, 1))
+        self.assertEqual(sorted((e.usuario.matricula, e.exemplar) for e in reaberta.emprestimos_ativos), esperado)
+        reaberta.fechar()
+
+    def test_reservas_sobrevivem_a_reabertura(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        autor = Autor("George Orwell", "go@dystopian.com")
+        biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", autor))
+        biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(3))
+        biblioteca.realizar_emprestimo("L0", "1984", "2023-03-01")
+        biblioteca.reservar_item("L1", "1984", "2023-03-02")
+        biblioteca.reservar_item("L2", "1984", "2023-03-02")
+        biblioteca.compactar(aguardar=True)
+        biblioteca.registrar_devolucao_item("L0", "1984", "2023-03-05")
+        biblioteca.compactar(aguardar=True)
+        biblioteca.expirar_reservas("2023-03-20")
+        biblioteca.fechar()
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertIsNone(reaberta.posicao_na_fila("L1", "1984"))
+        self.assertEqual(reaberta.posicao_na_fila("L2", "1984"), 0)
+        self.assertFalse(reaberta.buscar_item_por_titulo("1984").esta_disponivel())
+        self.assertIn("realizado com sucesso", reaberta.realizar_emprestimo("L2", "1984", "2023-03-21"))
+        reaberta.fechar()
+
+    def test_diario_ignora_limites_atuais(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.popular(biblioteca)
+        biblioteca.realizar_emprestimo("MINVER001", "Matrix", "2023-03-10")
+        biblioteca.fechar()
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio,
+                                         config=ConfiguracaoBiblioteca(max_livros_por_usuario=1))
+        self.assertEqual(len(reaberta.emprestimos_ativos), 2)
+        self.assertFalse(reaberta.buscar_item_por_titulo("Matrix").esta_disponivel())
+        reaberta.fechar()
+
+    def test_compactacao_descarta_diario_antigo(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.popular(biblioteca)
+        biblioteca.compactar(aguardar=True)
+        biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
+        biblioteca.fechar()
+
+        self.assertTrue(os.path.exists(os.path.join(self.diretorio, "snapshot.json")))
+        self.assertEqual(len(biblioteca._segmentos()), 1)
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertTrue(reaberta.buscar_item_por_titulo("1984").esta_disponivel())
+        self.assertEqual(reaberta.emprestimos_ativos, [])
+        self.assertIsNotNone(reaberta.buscar_usuario_por_matricula("MINVER001"))
+        reaberta.fechar()
+
+    def test_compactacao_automatica(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio, limite_diario=3)
+        self.popular(biblioteca)
+        biblioteca.fechar()
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual(len(reaberta.catalogo), 2)
+        self.assertEqual(len(reaberta.emprestimos_ativos), 1)
+        reaberta.fechar()
+
+    def test_mutacoes_de_chaves_diferentes_nao_se_bloqueiam(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        autor = Autor("George Orwell", "go@dystopian.com")
+        biblioteca.importar_itens(Livro(f"Livro {i}", 1949, str(i), autor) for i in range(2))
+        biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(2))
+        # O empréstimo de L0 para no meio da operação, com as travas de L0 e do Livro 0
+        dentro, liberar = threading.Event(), threading.Event()
+        verificar_limites = biblioteca._verificar_limites
+
+        def verificar_devagar(usuario, item):
+            if usuario.matricula == "L0":
+                dentro.set()
+                liberar.wait(5)
+            return verificar_limites(usuario, item)
+        biblioteca._verificar_limites = verificar_devagar
+        parado = threading.Thread(target=biblioteca.realizar_emprestimo, args=("L0", "Livro 0", "2024-01-01"))
+        parado.start()
+        self.assertTrue(dentro.wait(5))
+        biblioteca.realizar_emprestimo("L1", "Livro 1", "2024-01-01")
+        self.assertEqual(len(biblioteca.emprestimos_ativos), 1)
+        liberar.set()
+        parado.join()
+        biblioteca.fechar()
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual(sorted(e.usuario.matricula for e in reaberta.emprestimos_ativos), ["L0", "L1"])
+        reaberta.fechar()
+
+    def test_emprestimo_de_item_removido_durante_a_busca(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.popular(biblioteca)
+        biblioteca.adicionar_item_catalogo(Livro("Homenagem à Catalunha", 1938, "222", Autor("George Orwell",
+                                                                                              "go@dystopian.com")))
+        # O empréstimo acha o item e, antes de pegar a trava dele, a remoção acontece
+        achou, removido = threading.Event(), threading.Event()
+        buscar_item = biblioteca.buscar_item_por_titulo
+
+        def buscar_e_esperar(titulo):
+            item = buscar_item(titulo)
+            if threading.current_thread() is emprestimo and not achou.is_set():
+                achou.set()
+                removido.wait(5)
+            return item
+        biblioteca.buscar_item_por_titulo = buscar_e_esperar
+        respostas = []
+        emprestimo = threading.Thread(target=lambda: respostas.append(
+            biblioteca.realizar_emprestimo("MINVER001", "Homenagem à Catalunha", "2023-03-11")))
+        emprestimo.start()
+        self.assertTrue(achou.wait(5))
+        self.assertTrue(biblioteca.remover_item_catalogo("Homenagem à Catalunha"))
+        removido.set()
+        emprestimo.join()
+        self.assertEqual(respostas, ["Item não encontrado no catálogo."])
+        self.assertEqual(len(biblioteca.emprestimos_ativos), 1)
+        biblioteca.fechar()
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual([e.item.get_titulo() for e in reaberta.emprestimos_ativos], ["1984"])
+        reaberta.fechar()
+
+    def test_exemplares_adicionados_durante_a_gravacao_do_snapshot(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.popular(biblioteca)
+        # A gravação do snapshot só começa depois da adição, já com a porta aberta
+        liberar = threading.Event()
+        gravar_snapshot = biblioteca._gravar_snapshot
+
+        def gravar_depois(*args):
+            liberar.wait(5)
+            gravar_snapshot(*args)
+        biblioteca._gravar_snapshot = gravar_depois
+        biblioteca.compactar()
+        self.assertTrue(biblioteca.adicionar_exemplares("1984", 2))
+        liberar.set()
+        biblioteca.fechar()
+        # O catálogo mapeado acompanha o snapshot: a adição ainda está só no diário
+        with abrir_catalogo_mapeado(self.diretorio) as mapeado:
+            self.assertEqual(mapeado.buscar_item_por_titulo("1984").get_total_exemplares(), 1)
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        livro = reaberta.buscar_item_por_titulo("1984")
+        self.assertEqual((livro.get_total_exemplares(), livro.get_exemplares_disponiveis()), (3, 2))
+        reaberta.fechar()
+
+    def test_compactacao_grava_catalogo_mapeado(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio)
+        self.assertIsNone(biblioteca.catalogo_mapeado)
+        self.popular(biblioteca)
+        biblioteca.compactar(aguardar=True)
+        self.assertEqual(list(biblioteca.catalogo_mapeado.titulos()), ["1984", "Matrix"])
+        biblioteca.fechar()
+        self.assertIsNone(biblioteca.catalogo_mapeado)
+
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual(len(reaberta.catalogo_mapeado), 2)
+        self.assertEqual(reaberta.catalogo_mapeado.buscar_item_por_titulo("matrix").diretor, "Wachowskis")
+        reaberta.fechar()
+
+    def test_compactacao_com_emprestimos_concorrentes(self):
+        biblioteca = BibliotecaPersistente("Central", self.diretorio, limite_diario=7)
+        autor = Autor("George Orwell", "go@dystopian.com")
+        biblioteca.importar_itens(Livro(f"Livro {i}", 1949, str(i), autor, exemplares=2) for i in range(8))
+        biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(8))
+
+        def emprestar(usuario):
+            for rodada in range(20):
+                titulo = f"Livro {(usuario + rodada) % 8}"
+                biblioteca.realizar_emprestimo(f"L{usuario}", titulo, "2024-01-01")
+                if rodada % 3:
+                    biblioteca.registrar_devolucao_item(f"L{usuario}", titulo, "2024-01-02")
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(emprestar, range(8)))
+        esperado = sorted((e.usuario.matricula, e.item.get_titulo()) for e in biblioteca.emprestimos_ativos)
+        biblioteca.fechar()
+        reaberta = BibliotecaPersistente("Central", self.diretorio)
+        self.assertEqual(sorted((e.usuario.matricula, e.item.get_titulo()) for e in reaberta.emprestimos_ativos),
+                         esperado)
+        reaberta.fechar()
+
+
+class TestBibliotecaSQLite(unittest.TestCase):
+    def setUp(self):
+        self.temporario = tempfile.TemporaryDirectory()
+        self.biblioteca = BibliotecaSQLite("Central", os.path.join(self.temporario.name, "biblioteca.db"))
+        self.autor = Autor("George Orwell", "go@dystopian.com")
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", self.autor))
+        self.biblioteca.adicionar_item_catalogo(Revista("Piauí", 2023, "200", "Alvinegra"))
+        self.biblioteca.registrar_usuario(Usuario("Winston Smith", "winston@ex.com", "MINVER001"))
+
+    def tearDown(self):
+        self.biblioteca.fechar()
+        self.temporario.cleanup()
+
+    def test_buscar_e_remover(self):
+        livro = self.biblioteca.buscar_item_por_titulo("1984")
+        self.assertEqual(livro.get_autor_nome(), "George Orwell")
+        self.assertIsNone(self.biblioteca.buscar_item_por_titulo("Inexistente"))
+        self.assertTrue(self.biblioteca.remover_item_catalogo("piauí"))
+        self.assertFalse(self.biblioteca.remover_item_catalogo("Piauí"))
+        self.assertEqual(len(self.biblioteca.catalogo), 1)
+
+    def test_registrar_usuario_duplicado(self):
+        with self.assertRaises(ValueError):
+            self.biblioteca.registrar_usuario(Usuario("Clone", "c@ex.com", "MINVER001"))
+        self.assertEqual(self.biblioteca.buscar_usuario_por_matricula("MINVER001").nome, "Winston Smith")
+
+    def test_ordem_dos_usuarios_usa_indice(self):
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(3))
+        self.assertEqual([u.matricula for u in self.biblioteca.usuarios_registrados],
+                         ["MINVER001", "L0", "L1", "L2"])
+        with self.biblioteca._pool.conexao() as conexao:
+            plano = " ".join(linha["detail"] for linha in conexao.execute(
+                "EXPLAIN QUERY PLAN SELECT COALESCE(MAX(ordem), 0) + 1 FROM usuarios"))
+        self.assertIn("idx_usuarios_ordem", plano)
+
+    def test_emprestimo_e_devolucao(self):
+        self.assertEqual(self.biblioteca.realizar_emprestimo("MINVER001", "Piauí", "2023-03-10", "2023-03-24"),
+                         "Este tipo de item não pode ser emprestado.")
+        resultado = self.biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10", "2023-03-24")
+        self.assertIn("realizado com sucesso", resultado)
+        self.assertFalse(self.biblioteca.buscar_item_por_titulo("1984").esta_disponivel())
+        self.assertEqual(len(self.biblioteca.emprestimos_ativos), 1)
+        resultado = self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
+        self.assertIn("devolvido por Winston Smith", resultado)
+        self.assertTrue(self.biblioteca.buscar_item_por_titulo("1984").esta_disponivel())
+        self.assertEqual(self.biblioteca.emprestimos_ativos, [])
+        self.biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowskis"))
+        self.biblioteca.realizar_emprestimo("MINVER001", "matrix", "2023-03-10")
+        self.assertIn("Item Matrix devolvido", self.biblioteca.registrar_devolucao_item("MINVER001", "MATRIX",
+                                                                                       "2023-03-15"))
+
+    def test_exemplares_prazo_padrao_e_limites(self):
+        self.biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski", 2))
+        self.biblioteca.registrar_usuario(Usuario("Julia", "julia@ex.com", "MINVER002"))
+        self.biblioteca.registrar_usuario(Usuario("O'Brien", "obrien@ex.com", "MINVER003"))
+        self.assertEqual(self.biblioteca.buscar_item_por_titulo("Matrix").get_total_exemplares(), 2)
+        self.biblioteca.config.set_dias_emprestimo("dvd", 7)
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER001", "Matrix", "2023-03-10"))
+        self.assertEqual(self.biblioteca.realizar_emprestimo("MINVER001", "Matrix", "2023-03-10"),
+                         "Usuário já possui um exemplar de 'Matrix'.")
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER002", "Matrix", "2023-03-10"))
+        self.assertEqual(self.biblioteca.buscar_item_por_titulo("Matrix").get_exemplares_disponiveis(), 0)
+        self.assertEqual(self.biblioteca.realizar_emprestimo("MINVER003", "Matrix", "2023-03-10"),
+                         "Item 'Matrix' não está disponível para empréstimo.")
+        self.assertEqual({str(e.data_devolucao_prevista) for e in self.biblioteca.emprestimos_ativos}, {"2023-03-17"})
+        self.assertTrue(self.biblioteca.adicionar_exemplares("Matrix"))
+        self.biblioteca.config.set_limite_por_tipo("livro", 0)
+        self.assertEqual(self.biblioteca.realizar_emprestimo("MINVER003", "1984", "2023-03-10"),
+                         "Limite de 0 empréstimo(s) do tipo 'livro' por usuário atingido.")
+        self.biblioteca.config.set_max_livros_por_usuario(1)
+        self.assertEqual(self.biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10"),
+                         "Limite de 1 empréstimo(s) por usuário atingido.")
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("MINVER003", "Matrix", "2023-03-10"))
+        self.biblioteca.registrar_devolucao_item("MINVER001", "Matrix", "2023-03-12")
+        self.assertEqual(self.biblioteca.buscar_item_por_titulo("Matrix").get_exemplares_disponiveis(), 1)
+
+    def test_banco_antigo_ganha_contagem_de_exemplares(self):
+        caminho = os.path.join(self.temporario.name, "antigo.db")
+        conexao = sqlite3.connect(caminho)
+        conexao.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, tipo TEXT NOT NULL, titulo TEXT NOT NULL, "
+                        "titulo_chave TEXT NOT NULL, ano_publicacao INTEGER NOT NULL, isbn TEXT, genero TEXT, "
+                        "autor_nome TEXT, autor_email TEXT, autor_biografia TEXT, edicao TEXT, editora TEXT, "
+                        "duracao_minutos INTEGER, diretor TEXT, disponivel INTEGER NOT NULL DEFAULT 1, "
+                        "removido INTEGER NOT NULL DEFAULT 0)")
+        conexao.execute("INSERT INTO itens (tipo, titulo, titulo_chave, ano_publicacao, duracao_minutos, diretor, "
+                        "disponivel) VALUES ('dvd', 'Matrix', 'matrix', 1999, 136, 'Wachowski', 0)")
+        conexao.commit()
+        conexao.close()
+        biblioteca = BibliotecaSQLite("Antiga", caminho)
+        try:
+            item = biblioteca.buscar_item_por_titulo("Matrix")
+            self.assertEqual((item.get_total_exemplares(), item.get_exemplares_disponiveis()), (1, 0))
+        finally:
+            biblioteca.fechar()
+
+    def test_emprestimos_concorrentes_do_mesmo_item(self):
+        self.biblioteca.importar_usuarios(
+            {"nome": f"Leitor {i}", "email": f"leitor{i}@ex.com", "matricula": f"L{i}"} for i in range(20))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            resultados = list(executor.map(
+                lambda i: self.biblioteca.realizar_emprestimo(f"L{i}", "1984", "2023-03-10", "2023-03-24"),
+                range(20)))
+        self.assertEqual(sum("realizado com sucesso" in r for r in resultados), 1)
+        self.assertEqual(len(self.biblioteca.emprestimos_ativos), 1)
+
+
+class LivroLento(Livro):
+    # Cede a vez a outras threads entre a consulta e o empréstimo, ampliando
+    # a janela em que uma verificação sem trava deixaria emprestar duas vezes.
+    def esta_disponivel(self):
+        disponivel = super().esta_disponivel()
+        time.sleep(0)
+        return disponivel
+
+
+class TestConcorrencia(unittest.TestCase):
+    def setUp(self):
+        self.intervalo_original = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # Força trocas de thread frequentes
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        autor = Autor("Autor Teste", "autor@test.com")
+        self.biblioteca.importar_itens(LivroLento(f"Livro {i}", 2000, str(i), autor) for i in range(10))
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(200))
+
+    def tearDown(self):
+        sys.setswitchinterval(self.intervalo_original)
+
+    def test_emprestimos_concorrentes_sem_duplicidade(self):
+        gerador = random.Random(42)
+        tentativas = [(f"L{gerador.randrange(200)}", f"Livro {gerador.randrange(10)}") for _ in range(5000)]
+
+        def operar(tentativa):
+            matricula, titulo = tentativa
+            resultado = self.biblioteca.realizar_emprestimo(matricula, titulo, "2023-03-10", "2023-03-24")
+            if "realizado com sucesso" in resultado and gerador.random() < 0.5:
+                self.biblioteca.registrar_devolucao_item(matricula, titulo, "2023-03-11")
+            return resultado
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            resultados = list(executor.map(operar, tentativas))
+
+        sucessos = sum("realizado com sucesso" in r for r in resultados)
+        ativos = self.biblioteca.emprestimos_ativos
+        self.assertEqual(sucessos, len(ativos) + len(self.biblioteca.historico_emprestimos))
+        itens_emprestados = [emprestimo.item for emprestimo in ativos]
+        self.assertEqual(len(itens_emprestados), len(set(itens_emprestados)))
+        indisponiveis = [item for item in self.biblioteca.catalogo if not item.esta_disponivel()]
+        self.assertEqual(set(indisponiveis), set(itens_emprestados))
+        total_com_usuarios = sum(len(u.livros_emprestados) for u in self.biblioteca.usuarios_registrados)
+        self.assertEqual(total_com_usuarios, len(ativos))
+
+
+class TestServidor(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", Autor("George Orwell", "go@dystopian.com")))
+        self.biblioteca.registrar_usuario(Usuario("Winston Smith", "winston@ex.com", "MINVER001"))
+        self.servidor = iniciar_servidor_em_thread(self.biblioteca)
+        self.remota = BibliotecaRemota("127.0.0.1", self.servidor.porta)
+
+    def tearDown(self):
+        self.remota.fechar()
+        self.servidor.encerrar()
+
+    def test_operacoes_remotas(self):
+        self.remota.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowskis"))
+        self.assertIsInstance(self.biblioteca.buscar_item_por_titulo("Matrix"), DVD)
+        self.assertEqual(self.remota.buscar_usuario_por_matricula("MINVER001").nome, "Winston Smith")
+        resultado = self.remota.realizar_emprestimo("MINVER001", "1984", "2023-03-10", "2023-03-24")
+        self.assertIn("realizado com sucesso", resultado)
+        self.assertFalse(self.remota.buscar_item_por_titulo("1984").esta_disponivel())
+        self.assertEqual(len(self.remota.emprestimos_ativos), 1)
+        self.assertEqual(len(self.remota.catalogo), 2)
+        self.assertIn("devolvido", self.remota.registrar_devolucao_item("MINVER001", "1984", "2023-03-15"))
+        self.assertTrue(self.remota.remover_item_catalogo("Matrix"))
+        self.assertIsNone(self.remota.buscar_item_por_titulo("Matrix"))
+
+    def test_erro_de_validacao_chega_ao_cliente(self):
+        with self.assertRaises(ValueError):
+            self.remota.registrar_usuario(Usuario("Clone", "c@ex.com", "MINVER001"))
+        self.assertEqual(len(self.remota.usuarios_registrados), 1)
+
+    def test_clientes_concorrentes(self):
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(8))
+
+        def emprestar(i):
+            remota = BibliotecaRemota("127.0.0.1", self.servidor.porta)
+            try:
+                return remota.realizar_emprestimo(f"L{i}", "1984", "2023-03-10", "2023-03-24")
+            finally:
+                remota.fechar()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resultados = list(executor.map(emprestar, range(8)))
+        self.assertEqual(sum("realizado com sucesso" in r for r in resultados), 1)
+
+    def test_listagens_remotas_paginadas(self):
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(450))
+        matriculas = [usuario.matricula for usuario in self.remota.iterar_usuarios()]
+        self.assertEqual(len(matriculas), 451)
+        self.assertEqual(matriculas[:2], ["MINVER001", "L0"])
+        pagina = self.remota.pagina_itens(tipo="livro", disponivel=True)
+        self.assertEqual([item.get_titulo() for item in pagina.itens], ["1984"])
+        self.assertIsNone(pagina.proximo_cursor)
+
+    def test_itens_do_autor_remoto(self):
+        self.remota.adicionar_item_catalogo(Livro("A Revolução dos Bichos", 1945, "222",
+                                                  Autor("george  orwell", "GO@dystopian.com")))
+        itens = self.remota.itens_do_autor("George Orwell", "go@dystopian.com")
+        self.assertEqual([item.get_titulo() for item in itens], ["1984", "A Revolução dos Bichos"])
+        self.assertEqual(len(self.biblioteca.autores), 1)
+
+    def test_recusa_chega_ao_cliente(self):
+        resposta = self.remota.realizar_emprestimo("U9", "1984", "2023-03-10")
+        self.assertIsInstance(resposta, Recusa)
+        self.assertEqual(resposta, "Usuário não encontrado.")
+
+    def test_configuracao_remota(self):
+        self.assertEqual(self.remota.config.get_max_livros_por_usuario(), 5)
+        self.remota.config.set_max_livros_por_usuario(0)
+        self.remota.config.set_dias_emprestimo("livro", 7)
+        self.assertEqual(self.biblioteca.config.get_max_livros_por_usuario(), 0)
+        self.assertEqual(self.remota.config.dias_por_tipo, {"livro": 7})
+        self.assertEqual(self.remota.realizar_emprestimo("MINVER001", "1984", "2023-03-10"),
+                         "Limite de 0 empréstimo(s) por usuário atingido.")
+        with self.assertRaises(ValueError):
+            self.remota.config.set_max_livros_por_usuario(-1)
+
+    def test_erro_inesperado_vira_resposta(self):
+        biblioteca = Biblioteca("Biblioteca Central")
+        biblioteca.sugerir_titulos = lambda titulo, limite=5: {}[titulo]
+        resposta = OperacoesBiblioteca(biblioteca).executar({"op": "sugerir_titulos", "args": ["x"], "id": 1})
+        self.assertEqual((resposta["id"], resposta["ok"], resposta["tipo"]), (1, False, "KeyError"))
+
+    def test_linha_grande_demais(self):
+        with socket.create_connection(("127.0.0.1", self.servidor.porta), timeout=5) as conexao:
+            requisicao = json.dumps({"op": "sugerir_titulos", "args": ["x" * LIMITE_LINHA]}) + "\n"
+            conexao.sendall(requisicao.encode("utf-8"))
+            arquivo = conexao.makefile("rb")
+            resposta = json.loads(arquivo.readline())
+            self.assertEqual((resposta["ok"], resposta["tipo"]), (False, "ValueError"))
+            self.assertEqual(arquivo.readline(), b"")
+        # As outras conexões continuam sendo atendidas
+        self.assertIsNotNone(self.remota.buscar_item_por_titulo("1984"))
+
+    def test_metricas_de_lote_sobre_o_servidor(self):
+        saida = io.StringIO()
+        executar_lote(self.remota, ['{"op": "metricas"}'], saida)
+        resposta = json.loads(saida.getvalue())
+        self.assertEqual((resposta["ok"], resposta["tipo"]), (False, "ValueError"))
+        instrumentar(self.biblioteca)
+        saida = io.StringIO()
+        executar_lote(self.remota, ['{"op": "metricas"}'], saida)
+        self.assertTrue(json.loads(saida.getvalue())["ok"])
+
+
+class TestBuscaTextual(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        tolkien = Autor("J.R.R. Tolkien", "tolkien@example.com")
+        machado = Autor("Machado de Assis", "machado@abl.org.br")
+        self.anel = Livro("O Senhor dos Anéis", 1954, "978-0618260274", tolkien, "Fantasia")
+        self.hobbit = Livro("O Hobbit", 1937, "978-0547928227", tolkien, "Fantasia")
+        self.casmurro = Livro("Dom Casmurro", 1899, "978-8535902774", machado, "Romance")
+        self.fantasia = Livro("Fantasia Brasileira", 2001, "978-1111111111", machado, "Ensaio")
+        self.dvd = DVD("Senhor das Moscas", 1990, 90, "Harry Hook")
+        self.revista = Revista("Mundo Estranho", 2010, "100", "Editora Abril")
+        for item in (self.anel, self.hobbit, self.casmurro, self.fantasia, self.dvd, self.revista):
+            self.biblioteca.adicionar_item_catalogo(item)
+
+    def test_busca_sem_acentos_e_por_prefixo(self):
+        self.assertEqual(self.biblioteca.buscar_itens("aneis").itens, [self.anel])
+        self.assertEqual(self.biblioteca.buscar_itens("ANÉ").itens, [self.anel])
+        self.assertEqual(self.biblioteca.buscar_itens("senh").total, 2)
+
+    def test_busca_por_autor_diretor_editora_e_isbn(self):
+        self.assertEqual(set(self.biblioteca.buscar_itens("tolkien").itens), {self.anel, self.hobbit})
+        self.assertEqual(self.biblioteca.buscar_itens("harry hook").itens, [self.dvd])
+        self.assertEqual(self.biblioteca.buscar_itens("abril").itens, [self.revista])
+        self.assertEqual(self.biblioteca.buscar_itens("978-0547").itens, [self.hobbit])
+        self.assertEqual(self.biblioteca.buscar_itens("9780547928227").itens, [self.hobbit])
+
+    def test_titulo_pesa_mais_que_genero(self):
+        resultados = self.biblioteca.buscar_itens("fantasia")
+        self.assertEqual(resultados.total, 3)
+        self.assertIs(resultados.itens[0], self.fantasia)
+
+    def test_paginacao(self):
+        primeira = self.biblioteca.buscar_itens("fantasia", pagina=1, por_pagina=2)
+        segunda = self.biblioteca.buscar_itens("fantasia", pagina=2, por_pagina=2)
+        self.assertEqual(len(primeira.itens), 2)
+        self.assertEqual(len(segunda.itens), 1)
+        self.assertEqual(primeira.total_paginas, 2)
+        self.assertFalse(set(primeira.itens) & set(segunda.itens))
+        with self.assertRaises(ValueError):
+            self.biblioteca.buscar_itens("fantasia", pagina=0)
+
+    def test_prefixo_com_expansoes_demais_marca_truncado(self):
+        self.assertFalse(self.biblioteca.buscar_itens("fantasia").truncado)
+        # "m" expande para "machado", "moscas" e "mundo"
+        self.assertEqual(self.biblioteca.buscar_itens("m").total, 4)
+        self.biblioteca._indice_busca.max_expansoes = 2
+        resultados = self.biblioteca.buscar_itens("m")
+        self.assertTrue(resultados.truncado)
+        self.assertLess(resultados.total, 4)
+        self.assertFalse(self.biblioteca.buscar_itens("mo").truncado)
+
+    def test_remocao_atualiza_indice(self):
+        self.biblioteca.remover_item_catalogo("O Hobbit")
+        self.assertEqual(self.biblioteca.buscar_itens("hobbit").total, 0)
+        self.assertEqual(self.biblioteca.buscar_itens("tolkien").itens, [self.anel])
+        self.assertEqual(self.biblioteca.completar_termo("hob"), [])
+        self.assertEqual(self.biblioteca.completar_termo("cas"), ["casmurro"])
+
+    def test_sugerir_titulos_com_erro_de_digitacao(self):
+        self.assertEqual(self.biblioteca.sugerir_titulos("O Senhr dos Aneis")[0], "O Senhor dos Anéis")
+        self.assertEqual(self.biblioteca.sugerir_titulos("dom casmuro", limite=1), ["Dom Casmurro"])
+        self.assertEqual(self.biblioteca.sugerir_titulos("xyzw"), [])
+
+    def test_sugestoes_acompanham_remocao(self):
+        self.biblioteca.adicionar_item_catalogo(Livro("O Hobbit", 1937, "222", Autor("J.R.R. Tolkien", "t@ex.com")))
+        self.biblioteca.remover_item_catalogo("O Hobbit")
+        self.assertIn("O Hobbit", self.biblioteca.sugerir_titulos("O Hobit"))
+        self.biblioteca.remover_item_catalogo("O Hobbit")
+        self.assertNotIn("O Hobbit", self.biblioteca.sugerir_titulos("O Hobit"))
+
+
+class TestListagens(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        autor = Autor("George Orwell", "go@dystopian.com")
+        self.biblioteca.importar_itens(
+            Livro(f"Livro {i}", 2000, str(i), autor, "Distopia" if i % 2 else "Ensaio") for i in range(50))
+        self.biblioteca.importar_itens(DVD(f"Filme {i}", 2000, 100, "Diretor") for i in range(10))
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(5))
+
+    def test_filtros(self):
+        self.biblioteca.realizar_emprestimo("L0", "Livro 1", "2023-03-10")
+        self.assertEqual(len(list(self.biblioteca.iterar_itens(tipo="dvd"))), 10)
+        distopias = list(self.biblioteca.iterar_itens(genero="distopia"))
+        self.assertEqual(len(distopias), 25)
+        disponiveis = list(self.biblioteca.iterar_itens(tipo="livro", genero="Distopia", disponivel=True))
+        self.assertEqual(len(disponiveis), 24)
+        self.assertNotIn(self.biblioteca.buscar_item_por_titulo("Livro 1"), disponiveis)
+
+    def test_paginas_por_cursor(self):
+        titulos = []
+        cursor = 0
+        while cursor is not None:
+            pagina = self.biblioteca.pagina_itens(cursor, por_pagina=7, tipo="livro")
+            self.assertLessEqual(len(pagina.itens), 7)
+            titulos.extend(item.get_titulo() for item in pagina.itens)
+            cursor = pagina.proximo_cursor
+        self.assertEqual(titulos, [f"Livro {i}" for i in range(50)])
+        self.assertIsNone(self.biblioteca.pagina_itens(50, por_pagina=10, tipo="dvd").proximo_cursor)
+        with self.assertRaises(ValueError):
+            self.biblioteca.pagina_usuarios(0, por_pagina=0)
+
+    def test_iteracao_sob_demanda(self):
+        itens = self.biblioteca.iterar_itens()
+        self.assertEqual(next(itens).get_titulo(), "Livro 0")
+        # Itens acrescentados durante a iteração também são visitados
+        self.biblioteca.adicionar_item_catalogo(Revista("Piauí", 2023, "200", "Alvinegra"))
+        self.assertEqual(list(itens)[-1].get_titulo(), "Piauí")
+
+    def test_emprestimos_por_vencimento(self):
+        self.biblioteca.realizar_emprestimo("L0", "Livro 1", "2023-03-10", "2023-03-30")
+        self.biblioteca.realizar_emprestimo("L1", "Livro 2", "2023-03-10", "2023-03-20")
+        self.biblioteca.realizar_emprestimo("L0", "Livro 3", "2023-03-10", "2023-03-25")
+        ordem = [e.item.get_titulo() for e in self.biblioteca.iterar_emprestimos_ativos()]
+        self.assertEqual(ordem, ["Livro 2", "Livro 3", "Livro 1"])
+        self.assertEqual([e.item.get_titulo() for e in self.biblioteca.iterar_emprestimos_ativos("L0")],
+                         ["Livro 3", "Livro 1"])
+        pagina = self.biblioteca.pagina_emprestimos_ativos(por_pagina=1)
+        self.assertEqual([e.item.get_titulo() for e in pagina.itens], ["Livro 2"])
+        pagina = self.biblioteca.pagina_emprestimos_ativos(pagina.proximo_cursor, por_pagina=1)
+        self.assertEqual([e.item.get_titulo() for e in pagina.itens], ["Livro 3"])
+        pagina = self.biblioteca.pagina_emprestimos_ativos(pagina.proximo_cursor, por_pagina=1, matricula="L0")
+        self.assertEqual([e.item.get_titulo() for e in pagina.itens], ["Livro 1"])
+        self.assertIsNone(pagina.proximo_cursor)
+
+    def test_cursor_de_emprestimos_estavel_com_mesma_data(self):
+        for i in range(10):
+            self.biblioteca.realizar_emprestimo(f"L{i % 5}", f"Livro {i}", "2023-03-10", "2023-03-24")
+        pagina = self.biblioteca.pagina_emprestimos_ativos(por_pagina=4)
+        vistos = [e.item.get_titulo() for e in pagina.itens]
+        self.assertEqual(vistos, ["Livro 0", "Livro 1", "Livro 2", "Livro 3"])
+        # Devoluções e novos empréstimos na mesma data entre as páginas
+        self.biblioteca.registrar_devolucao_item("L1", "Livro 1", "2023-03-12")
+        self.biblioteca.registrar_devolucao_item("L4", "Livro 4", "2023-03-12")
+        self.biblioteca.realizar_emprestimo("L1", "Livro 20", "2023-03-12", "2023-03-24")
+        cursor = pagina.proximo_cursor
+        while cursor is not None:
+            pagina = self.biblioteca.pagina_emprestimos_ativos(cursor, por_pagina=4)
+            vistos.extend(e.item.get_titulo() for e in pagina.itens)
+            cursor = pagina.proximo_cursor
+        self.assertEqual(vistos, ["Livro 0", "Livro 1", "Livro 2", "Livro 3"] +
+                         [f"Livro {i}" for i in range(5, 10)] + ["Livro 20"])
+
+    def test_cursores_invalidos(self):
+        for cursor in (-1, "x", "2023-03-24", 1.5):
+            with self.assertRaises(ValueError):
+                self.biblioteca.pagina_emprestimos_ativos(cursor)
+        with self.assertRaises(ValueError):
+            self.biblioteca.pagina_itens(-3)
+        with self.assertRaises(ValueError):
+            self.biblioteca.pagina_usuarios(-1)
+        with self.assertRaises(ValueError):
+            self.biblioteca.pagina_itens("1.99")
+
+    def test_cursor_de_itens_sobrevive_a_remocoes(self):
+        pagina = self.biblioteca.pagina_itens(por_pagina=10)
+        self.assertEqual(pagina.itens[-1].get_titulo(), "Livro 9")
+        # Remover itens antes do cursor não faz a próxima página pular nenhum
+        self.biblioteca.remover_item_catalogo("Livro 0")
+        self.biblioteca.remover_item_catalogo("Livro 3")
+        pagina = self.biblioteca.pagina_itens(pagina.proximo_cursor, por_pagina=2)
+        self.assertEqual([item.get_titulo() for item in pagina.itens], ["Livro 10", "Livro 11"])
+
+
+class TestReservas(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central", ConfiguracaoBiblioteca(dias_retirada_reserva=2))
+        autor = Autor("George Orwell", "go@dystopian.com")
+        self.livro = Livro("1984", 1949, "111", autor)
+        self.biblioteca.adicionar_item_catalogo(self.livro)
+        self.biblioteca.importar_usuarios(Usuario(f"Leitor {i}", f"l{i}@ex.com", f"L{i}") for i in range(4))
+        self.biblioteca.realizar_emprestimo("L0", "1984", "2023-03-01", "2023-03-10")
+
+    def test_fila_atendida_na_devolucao(self):
+        self.assertIn("Posição na fila: 1", self.biblioteca.reservar_item("L1", "1984", "2023-03-02"))
+        self.assertIn("Posição na fila: 2", self.biblioteca.reservar_item("L2", "1984", "2023-03-03"))
+        self.assertIn("já possui uma reserva", self.biblioteca.reservar_item("L1", "1984", "2023-03-03"))
+
+        resultado = self.biblioteca.registrar_devolucao_item("L0", "1984", "2023-03-05")
+        self.assertIn("separado para a reserva de Leitor 1", resultado)
+        self.assertFalse(self.livro.esta_disponivel())
+        self.assertEqual(self.biblioteca.posicao_na_fila("L1", "1984"), 0)
+        self.assertEqual(self.biblioteca.posicao_na_fila("L2", "1984"), 1)
+        # O exemplar separado só sai para quem reservou
+        self.assertIn("não está disponível", self.biblioteca.realizar_emprestimo("L3", "1984", "2023-03-05"))
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("L1", "1984", "2023-03-06"))
+        self.assertIsNone(self.biblioteca.posicao_na_fila("L1", "1984"))
+
+    def test_reserva_expira_e_passa_para_o_proximo(self):
+        self.biblioteca.reservar_item("L1", "1984", "2023-03-02")
+        self.biblioteca.reservar_item("L2", "1984", "2023-03-03")
+        self.biblioteca.registrar_devolucao_item("L0", "1984", "2023-03-05")
+
+        self.assertEqual(self.biblioteca.expirar_reservas("2023-03-07"), []) # prazo até 07/03
+        expiradas = self.biblioteca.expirar_reservas("2023-03-08")
+        self.assertEqual([r.usuario.matricula for r in expiradas], ["L1"])
+        self.assertEqual(expiradas[0].situacao, Reserva.EXPIRADA)
+        self.assertEqual(self.biblioteca.posicao_na_fila("L2", "1984"), 0)
+
+        # A expiração também acontece antes de um empréstimo
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("L3", "1984", "2023-03-20"))
+
+    def test_cancelar_reserva(self):
+        self.assertEqual(self.biblioteca.reservar_item("L1", "Inexistente", "2023-03-02"),
+                         "Item não encontrado no catálogo.")
+        self.biblioteca.reservar_item("L1", "1984", "2023-03-02")
+        self.biblioteca.reservar_item("L2", "1984", "2023-03-02")
+        self.assertIn("cancelada", self.biblioteca.cancelar_reserva("L1", "1984", "2023-03-03"))
+        self.assertEqual(self.biblioteca.posicao_na_fila("L2", "1984"), 1)
+        self.assertEqual(self.biblioteca.cancelar_reserva("L1", "1984", "2023-03-03"), "Reserva não encontrada.")
+
+        self.biblioteca.registrar_devolucao_item("L0", "1984", "2023-03-05")
+        self.biblioteca.cancelar_reserva("L2", "1984", "2023-03-06")
+        self.assertTrue(self.livro.esta_disponivel())
+        self.assertEqual(self.biblioteca.reservas_ativas, [])
+
+    def test_novos_exemplares_atendem_a_fila(self):
+        self.biblioteca.reservar_item("L1", "1984", "2023-03-02")
+        self.biblioteca.adicionar_exemplares("1984", 2, "2023-03-04")
+        self.assertEqual(self.biblioteca.posicao_na_fila("L1", "1984"), 0)
+        self.assertEqual(self.livro.get_exemplares_disponiveis(), 1)
+
+
+class TestEventos(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        self.autor = Autor("George Orwell", "go@dystopian.com")
+
+    def tearDown(self):
+        self.biblioteca.eventos.fechar()
+
+    def popular(self):
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", self.autor))
+        self.biblioteca.registrar_usuario(Usuario("Winston Smith", "winston@ex.com", "MINVER001"))
+        self.biblioteca.realizar_emprestimo("MINVER001", "1984", "2023-03-10", "2023-03-24")
+        self.biblioteca.registrar_devolucao_item("MINVER001", "1984", "2023-03-15")
+        self.biblioteca.remover_item_catalogo("1984")
+
+    def test_assinantes_recebem_eventos_tipados(self):
+        todos = []
+        emprestimos = []
+        self.biblioteca.assinar_eventos(todos.append)
+        self.biblioteca.assinar_eventos(emprestimos.append, tipos=[EmprestimoRealizado, ItemDevolvido])
+        self.popular()
+        self.biblioteca.eventos.aguardar()
+
+        self.assertEqual([e.tipo for e in todos], ["item_adicionado", "usuario_registrado", "emprestimo_realizado",
+                                                   "item_devolvido", "item_removido"])
+        self.assertEqual([e.sequencia for e in todos], [1, 2, 3, 4, 5])
+        self.assertEqual([type(e) for e in emprestimos], [EmprestimoRealizado, ItemDevolvido])
+        self.assertEqual(emprestimos[1].dados["data_devolucao_real"], "2023-03-15")
+
+    def test_assinante_lento_nao_bloqueia_operacoes(self):
+        self.biblioteca.eventos = BarramentoEventos(capacidade=2)
+        liberar = threading.Event()
+        self.biblioteca.assinar_eventos(lambda evento: liberar.wait())
+        inicio = time.perf_counter()
+        self.popular()
+        self.assertLess(time.perf_counter() - inicio, 1.0)
+        self.assertGreater(self.biblioteca.eventos.descartados, 0)
+        liberar.set()
+
+    def test_assinante_com_erro_nao_interrompe_entrega(self):
+        recebidos = []
+        self.biblioteca.assinar_eventos(lambda evento: 1 / 0)
+        self.biblioteca.assinar_eventos(recebidos.append)
+        self.popular()
+        self.biblioteca.eventos.aguardar()
+        self.assertEqual(len(recebidos), 5)
+        self.assertEqual(self.biblioteca.eventos.falhas, 5)
+
+    def test_arquivo_jsonl(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, "eventos.jsonl")
+            arquivo = ArquivoEventos(caminho)
+            self.biblioteca.assinar_eventos(arquivo)
+            self.popular()
+            self.biblioteca.eventos.fechar()
+            arquivo.fechar()
+            registros = list(ler_registros_jsonl(caminho))
+        self.assertEqual(len(registros), 5)
+        self.assertEqual(registros[2]["tipo"], "emprestimo_realizado")
+        self.assertEqual(registros[2]["dados"]["matricula"], "MINVER001")
+
+    def test_biblioteca_persistente_publica_eventos(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            biblioteca = BibliotecaPersistente("Central", diretorio)
+            biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "111", self.autor))
+            biblioteca.fechar()
+            recebidos = []
+            reaberta = BibliotecaPersistente("Central", diretorio)
+            reaberta.assinar_eventos(recebidos.append)
+            reaberta.registrar_usuario(Usuario("Winston Smith", "winston@ex.com", "MINVER001"))
+            reaberta.eventos.aguardar()
+            reaberta.eventos.fechar()
+            reaberta.fechar()
+        self.assertEqual([e.tipo for e in recebidos], ["usuario_registrado"])
+
+
+class TestMetricas(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        self.biblioteca.adicionar_item_catalogo(
+            Livro("1984", 1949, "978-0451524935", Autor("George Orwell", "go@dystopian.com"), "Distopia"))
+        self.biblioteca.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+
+    def test_operacoes_medidas(self):
+        metricas = instrumentar(self.biblioteca)
+        self.assertIs(instrumentar(self.biblioteca), metricas)
+        self.biblioteca.realizar_emprestimo("U1", "1984", "2023-03-10")
+        self.biblioteca.realizar_emprestimo("U1", "Inexistente", "2023-03-10")
+        self.biblioteca.registrar_devolucao_item("U1", "1984", "2023-03-12")
+        with self.assertRaises(ValueError):
+            self.biblioteca.buscar_itens("orwell", pagina=0)
+
+        resumo = metricas.resumo()
+        self.assertEqual(resumo["realizar_emprestimo"]["chamadas"], 2)
+        self.assertEqual(resumo["registrar_devolucao_item"]["chamadas"], 1)
+        self.assertEqual(resumo["buscar_itens"]["erros"], 1)
+        # As buscas feitas dentro do empréstimo também contam
+        self.assertEqual(metricas.taxa_acerto("titulo"), 0.5)
+        self.assertEqual(metricas.taxa_acerto("matricula"), 1.0)
+
+        texto = metricas.para_prometheus()
+        self.assertIn('biblioteca_operacao_segundos_count{operacao="realizar_emprestimo"} 2', texto)
+        self.assertIn('biblioteca_operacao_segundos_bucket{operacao="realizar_emprestimo",le="+Inf"} 2', texto)
+        self.assertIn('biblioteca_alteracoes_total{operacao="emprestimo"} 1', texto)
+        self.assertIn('biblioteca_indice_consultas_total{indice="titulo",resultado="falta"} 1', texto)
+        self.assertIn("biblioteca_emprestimos_ativos 0", texto)
+        self.assertIn("biblioteca_itens_catalogo 1", texto)
+
+    def test_desinstrumentar(self):
+        instrumentar(self.biblioteca)
+        desinstrumentar(self.biblioteca)
+        self.assertIsNone(self.biblioteca.metricas)
+        self.assertNotIn("realizar_emprestimo", vars(self.biblioteca))
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("U1", "1984", "2023-03-10"))
+
+    def test_histograma(self):
+        histograma = Histograma((0.001, 0.01, 0.1))
+        for valor in [0.0005] * 90 + [0.05] * 9 + [2.0]:
+            histograma.observar(valor)
+        self.assertEqual(histograma.contagens, [90, 0, 9, 1])
+        self.assertEqual(histograma.percentil(50), 0.001)
+        self.assertEqual(histograma.percentil(99), 0.1)
+        self.assertEqual(histograma.percentil(100), float("inf"))
+
+    def test_metricas_remotas(self):
+        servidor = iniciar_servidor_em_thread(self.biblioteca)
+        remota = BibliotecaRemota("127.0.0.1", servidor.porta)
+        try:
+            with self.assertRaises(ValueError):
+                remota.metricas()
+            instrumentar(self.biblioteca)
+            self.biblioteca.buscar_item_por_titulo("1984")
+            self.assertIn('operacao="buscar_item_por_titulo"', remota.metricas())
+        finally:
+            remota.fechar()
+            servidor.encerrar()
+
+
+class TestOperacoesLentas(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.diretorio.name, "lentas.log")
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        self.biblioteca.adicionar_item_catalogo(
+            Livro("1984", 1949, "978-0451524935", Autor("George Orwell", "go@dystopian.com"), "Distopia"))
+        self.biblioteca.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+        self.registro = monitorar(self.biblioteca, RegistroOperacoesLentas(self.caminho, limite_ms=0))
+
+    def tearDown(self):
+        self.registro.fechar()
+        self.diretorio.cleanup()
+
+    def test_registra_chamada_mais_externa(self):
+        self.biblioteca.realizar_emprestimo("U1", "1984", "2023-03-10")
+        registros = ler_operacoes_lentas(self.caminho)
+        # As buscas internas do empréstimo não viram linhas à parte
+        self.assertEqual([registro["operacao"] for registro in registros], ["realizar_emprestimo"])
+        self.assertEqual(registros[0]["argumentos"], ["'U1'", "'1984'", "'2023-03-10'"])
+        self.assertEqual(registros[0]["tamanhos"]["catalogo"], 1)
+        self.assertEqual(registros[0]["tamanhos"]["emprestimos_ativos"], 1)
+
+    def test_limite_e_desligamento(self):
+        self.registro.limite_ms = 10000
+        self.biblioteca.buscar_item_por_titulo("1984")
+        self.registro.limite_ms = 0
+        self.registro.ativo = False
+        self.biblioteca.buscar_item_por_titulo("1984")
+        self.assertEqual(ler_operacoes_lentas(self.caminho), [])
+        self.registro.ativo = True
+        self.biblioteca.buscar_item_por_titulo("1984")
+        self.assertEqual(self.registro.registradas, 1)
+        with self.assertRaises(ValueError):
+            monitorar(self.biblioteca, self.registro)
+
+    def test_perfis(self):
+        self.registro.perfil = "cprofile"
+        self.biblioteca.registrar_devolucao_item("U1", "1984", "2023-03-12")
+        self.registro.perfil = "tracemalloc"
+        self.biblioteca.buscar_itens("orwell")
+        self.registro.perfil = None
+        perfil, memoria = ler_operacoes_lentas(self.caminho)
+        self.assertIn("function calls", perfil["perfil"])
+        self.assertIn("variacao_memoria_bytes", memoria)
+        self.assertIn("maiores_alocacoes", memoria)
+        with self.assertRaises(ValueError):
+            self.registro.perfil = "perf"
+
+    def test_rotacao(self):
+        self.registro.fechar()
+        self.registro = RegistroOperacoesLentas(self.caminho, limite_ms=0, tamanho_maximo=2000, copias=2)
+        for _ in range(50):
+            self.registro.executar(self.biblioteca, "buscar_item_por_titulo",
+                                   self.biblioteca.buscar_item_por_titulo, ("1984",), {})
+        self.assertTrue(os.path.exists(self.caminho + ".2"))
+        self.assertFalse(os.path.exists(self.caminho + ".3"))
+
+
+class TestLote(unittest.TestCase):
+    COMANDOS = [
+        "# comentário",
+        '{"op": "adicionar_item_catalogo", "args": [{"tipo": "livro", "titulo": "1984", "ano_publicacao": 1949, '
+        '"isbn": "1", "autor_nome": "George Orwell", "autor_email": "go@dystopian.com"}]}',
+        '{"op": "registrar_usuario", "args": [{"nome": "Ana", "email": "ana@example.com", "matricula": "U1"}]}',
+        "",
+        '{"op": "realizar_emprestimo", "args": ["U1", "1984", "2023-03-10"], "id": "emp"}',
+        '{"op": "listar_emprestimos_ativos"}',
+        '{"op": "registrar_devolucao_item", "args": ["U1", "1984", "2023-03-12"]}',
+        '{"op": "desconhecida"}',
+        "isto não é JSON",
+    ]
+
+    def test_executar_lote(self):
+        biblioteca = Biblioteca("Biblioteca Central")
+        saida = io.StringIO()
+        resumo = executar_lote(biblioteca, self.COMANDOS, saida, tamanho_buffer=2)
+        self.assertEqual(resumo.comandos, 7)
+        self.assertEqual(resumo.erros, 2)
+        self.assertEqual(resumo.por_operacao["realizar_emprestimo"], [1, 0])
+        self.assertEqual(resumo.por_operacao["desconhecida"], [1, 1])
+        respostas = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual([resposta["id"] for resposta in respostas], [2, 3, "emp", 6, 7, 8, 9])
+        self.assertIn("realizado com sucesso", respostas[2]["resultado"])
+        self.assertEqual(respostas[3]["resultado"][0]["usuario"]["matricula"], "U1")
+        self.assertEqual(len(biblioteca.historico_emprestimos), 1)
+
+    def test_recusas_contam_como_erro(self):
+        biblioteca = Biblioteca("Biblioteca Central", ConfiguracaoBiblioteca(max_livros_por_usuario=1))
+        comandos = self.COMANDOS[1:3] + [
+            '{"op": "adicionar_item_catalogo", "args": [{"tipo": "dvd", "titulo": "Matrix", "ano_publicacao": 1999, '
+            '"duracao_minutos": 136, "diretor": "Wachowskis"}]}',
+            '{"op": "realizar_emprestimo", "args": ["U1", "1984", "2023-03-10"]}',
+            # Acima do limite, usuário inexistente e exemplar já emprestado
+            '{"op": "realizar_emprestimo", "args": ["U1", "Matrix", "2023-03-10"]}',
+            '{"op": "realizar_emprestimo", "args": ["U9", "Matrix", "2023-03-10"]}',
+            '{"op": "realizar_emprestimo", "args": ["U1", "1984", "2023-03-10"]}',
+            '{"op": "remover_item_catalogo", "args": ["Inexistente"]}',
+        ]
+        saida = io.StringIO()
+        resumo = executar_lote(biblioteca, comandos, saida)
+        self.assertEqual((resumo.comandos, resumo.erros, resumo.recusas), (8, 4, 4))
+        self.assertEqual(resumo.por_operacao["realizar_emprestimo"], [4, 3])
+        self.assertEqual(resumo.por_operacao["remover_item_catalogo"], [1, 1])
+        respostas = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual([resposta.get("recusado", False) for resposta in respostas],
+                         [False] * 4 + [True] * 4)
+        self.assertTrue(all(resposta["ok"] for resposta in respostas))
+
+    def test_lotes_em_paralelo(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminhos = []
+            for nome in ("a.jsonl", "b.jsonl"):
+                caminho = os.path.join(diretorio, nome)
+                with open(caminho, "w", encoding="utf-8") as arquivo:
+                    arquivo.write("\n".join(self.COMANDOS))
+                caminhos.append(caminho)
+            saida = io.StringIO()
+            resumo = executar_em_paralelo(caminhos, saida, processos=2)
+        self.assertEqual(resumo.comandos, 14)
+        self.assertEqual(resumo.erros, 4)
+        self.assertEqual(resumo.por_operacao["registrar_usuario"], [2, 0])
+        respostas = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual([resposta["lote"] for resposta in respostas], ["a.jsonl"] * 7 + ["b.jsonl"] * 7)
+        # Cada lote tem a sua biblioteca: o mesmo usuário é aceito nos dois
+        self.assertTrue(all(resposta["ok"] for resposta in respostas if resposta["id"] == 3))
+
+
+class ConfiguracaoComPrazoInvalido(ConfiguracaoBiblioteca):
+    def data_devolucao_padrao(self, tipo, data_emprestimo):
+        return "sem data"
+
+class TestBibliotecaFragmentada(unittest.TestCase):
+    def test_fragmento_de_estavel(self):
+        self.assertEqual(fragmento_de("1984", 4), fragmento_de("1984", 4))
+        self.assertTrue(all(0 <= fragmento_de(f"U{i}", 3) < 3 for i in range(50)))
+
+    def test_duas_fases_no_mesmo_processo(self):
+        # Item num fragmento e usuário no outro, sem processos: a lógica das fases
+        lado_item, lado_usuario = Fragmento(0), Fragmento(1)
+        lado_item.adicionar_item_catalogo(Livro("1984", 1949, "1", Autor("George Orwell", "go@dystopian.com")))
+        lado_usuario.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+        ok, (registro, tipo, exemplar) = lado_item.preparar_item("t1", "1984")
+        self.assertTrue(ok)
+        config = ConfiguracaoBiblioteca()
+        self.assertEqual(lado_usuario.preparar_usuario("t1", "U1", "1984", tipo, config), (True, "Ana"))
+        # A vaga reservada já impede um segundo empréstimo do mesmo título
+        self.assertFalse(lado_usuario.preparar_usuario("t2", "U1", "1984", tipo, config)[0])
+        self.assertEqual(lado_item.preparar_item("t2", "1984")[1], "Item '1984' não está disponível para empréstimo.")
+        lado_item.confirmar_item("t1")
+        lado_usuario.confirmar_usuario("t1", registro, date(2023, 3, 10), date(2023, 3, 24), exemplar)
+        self.assertEqual(len(lado_usuario.listar_emprestimos_ativos()), 1)
+
+        ok, (titulo, exemplar) = lado_usuario.preparar_devolucao("t3", "U1", "1984")
+        lado_item.devolver_exemplar(titulo, exemplar)
+        self.assertIn("devolvido por Ana", lado_usuario.confirmar_devolucao("t3", "2023-03-12"))
+        self.assertTrue(lado_item.buscar_item_por_titulo("1984").esta_disponivel())
+
+    def test_abortar_libera_exemplar_e_vaga(self):
+        fragmento = Fragmento(0)
+        config = ConfiguracaoBiblioteca(max_livros_por_usuario=1)
+        fragmento.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+        fragmento.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+        self.assertTrue(fragmento.preparar_item("t1", "Matrix")[0])
+        self.assertTrue(fragmento.preparar_usuario("t1", "U1", "Matrix", "dvd", config)[0])
+        self.assertIn("Limite de 1", fragmento.preparar_usuario("t2", "U1", "Outro", "dvd", config)[1])
+        fragmento.abortar_item("t1")
+        fragmento.abortar_usuario("t1")
+        self.assertTrue(fragmento.buscar_item_por_titulo("Matrix").esta_disponivel())
+        self.assertTrue(fragmento.preparar_usuario("t3", "U1", "Outro", "dvd", config)[0])
+
+    def test_falha_na_confirmacao_desfaz_as_duas_fases(self):
+        lado_item, lado_usuario = Fragmento(0), Fragmento(1)
+        lado_item.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+        lado_usuario.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+        ok, (registro, tipo, exemplar) = lado_item.preparar_item("t1", "Matrix")
+        lado_usuario.preparar_usuario("t1", "U1", "Matrix", tipo, ConfiguracaoBiblioteca())
+        with self.assertRaises(ValueError):
+            lado_usuario.confirmar_usuario("t1", registro, date(2023, 3, 10), "sem data", exemplar)
+        # Nada foi gravado e a reserva continua lá para ser desfeita
+        lado_usuario.abortar_usuario("t1")
+        lado_item.abortar_item("t1")
+        self.assertEqual(lado_usuario.listar_emprestimos_ativos(), [])
+        self.assertEqual(lado_usuario._vagas_pendentes, {})
+        self.assertTrue(lado_item.buscar_item_por_titulo("Matrix").esta_disponivel())
+
+    def test_processos(self):
+        biblioteca = BibliotecaFragmentada.iniciar(2)
+        try:
+            autor = Autor("George Orwell", "go@dystopian.com")
+            relatorio = biblioteca.importar_itens([Livro(f"Livro {i}", 1949, str(i), autor) for i in range(10)] +
+                                                  [{"tipo": "desconhecido"}, Revista("Veja", 2023, "1", "Abril")])
+            self.assertEqual(relatorio.importados, 11)
+            self.assertEqual(relatorio.erros[0][0], 11)
+            for i in range(6):
+                biblioteca.registrar_usuario(Usuario(f"Leitor {i}", f"l{i}@example.com", f"U{i}"))
+            with self.assertRaises(ValueError):
+                biblioteca.registrar_usuario(Usuario("Repetido", "r@example.com", "U0"))
+            self.assertEqual(len(biblioteca.catalogo), 11)
+            self.assertEqual(len(biblioteca.usuarios_registrados), 6)
+
+            # Combinações de usuário e item nos mesmos e em outros fragmentos
+            for i in range(6):
+                self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo(f"U{i}", f"livro {i}",
+                                                                                    "2023-03-10"))
+            self.assertEqual(biblioteca.realizar_emprestimo("U1", "Livro 0", "2023-03-10"),
+                             "Item 'Livro 0' não está disponível para empréstimo.")
+            self.assertEqual(biblioteca.realizar_emprestimo("X", "Livro 9", "2023-03-10"), "Usuário não encontrado.")
+            self.assertEqual(biblioteca.realizar_emprestimo("X", "Nada", "2023-03-10"), "Usuário não encontrado.")
+            self.assertEqual(biblioteca.realizar_emprestimo("U1", "Veja", "2023-03-10"),
+                             "Este tipo de item não pode ser emprestado.")
+            self.assertEqual(len(biblioteca.emprestimos_ativos), 6)
+            self.assertEqual(len(biblioteca.emprestimos_atrasados("2023-04-01")), 6)
+            self.assertFalse(biblioteca.buscar_item_por_titulo("Livro 0").esta_disponivel())
+
+            for i in range(6):
+                self.assertIn("devolvido", biblioteca.registrar_devolucao_item(f"U{i}", f"Livro {i}", "2023-03-12"))
+            self.assertEqual(biblioteca.registrar_devolucao_item("U0", "Livro 0", "2023-03-12"),
+                             "Empréstimo não encontrado ou já devolvido.")
+            self.assertEqual(biblioteca.emprestimos_ativos, [])
+            self.assertTrue(biblioteca.buscar_item_por_titulo("Livro 0").esta_disponivel())
+        finally:
+            biblioteca.encerrar()
+
+    def test_limites_e_falhas_com_a_configuracao_do_roteador(self):
+        # U0 e "Duna" ficam no fragmento 0; "Matrix" e "1984" no fragmento 1
+        biblioteca = BibliotecaFragmentada.iniciar(2)
+        try:
+            autor = Autor("George Orwell", "go@dystopian.com")
+            biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+            biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "1", autor))
+            biblioteca.adicionar_item_catalogo(Livro("Duna", 1965, "2", Autor("Frank Herbert", "fh@example.com")))
+            biblioteca.registrar_usuario(Usuario("Ana", "ana@example.com", "U0"))
+            # Alterada depois que os processos começaram
+            biblioteca.config.set_max_livros_por_usuario(1)
+            self.assertIn("realizado com sucesso", biblioteca.realizar_emprestimo("U0", "Matrix", "2023-03-10"))
+            self.assertEqual(biblioteca.realizar_emprestimo("U0", "1984", "2023-03-10"),
+                             "Limite de 1 empréstimo(s) por usuário atingido.")
+            self.assertEqual(biblioteca.realizar_emprestimo("U0", "Duna", "2023-03-10"),
+                             "Limite de 1 empréstimo(s) por usuário atingido.")
+            biblioteca.registrar_devolucao_item("U0", "Matrix", "2023-03-12")
+
+            # Uma falha na segunda fase desfaz os dois lados, no mesmo
+            # fragmento ou entre fragmentos
+            biblioteca.config = ConfiguracaoComPrazoInvalido()
+            for titulo in ("Matrix", "Duna"):
+                with self.assertRaises(ValueError):
+                    biblioteca.realizar_emprestimo("U0", titulo, "2023-03-10")
+                self.assertTrue(biblioteca.buscar_item_por_titulo(titulo).esta_disponivel())
+            self.assertEqual(biblioteca.emprestimos_ativos, [])
+            self.assertIn("realizado com sucesso",
+                          biblioteca.realizar_emprestimo("U0", "Matrix", "2023-03-10", "2023-03-24"))
+        finally:
+            biblioteca.encerrar()
+
+    def test_emprestimos_concorrentes_do_ultimo_exemplar(self):
+        biblioteca = BibliotecaFragmentada.iniciar(2)
+        try:
+            biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+            for i in range(8):
+                biblioteca.registrar_usuario(Usuario(f"Leitor {i}", f"l{i}@example.com", f"U{i}"))
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                mensagens = list(executor.map(
+                    lambda i: biblioteca.realizar_emprestimo(f"U{i}", "Matrix", "2023-03-10"), range(8)))
+            self.assertEqual(sum("realizado com sucesso" in mensagem for mensagem in mensagens), 1)
+            self.assertEqual(len(biblioteca.emprestimos_ativos), 1)
+        finally:
+            biblioteca.encerrar()
+
+class BibliotecaLenta(Biblioteca):
+    def buscar_item_por_titulo(self, titulo):
+        time.sleep(0.1)
+        return super().buscar_item_por_titulo(titulo)
+
+class TestFederacao(unittest.TestCase):
+    def setUp(self):
+        self.agencias = {}
+        for numero in range(4):
+            biblioteca = BibliotecaLenta(f"Agência {numero}")
+            biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "1", Autor("George Orwell", "go@dystopian.com")))
+            biblioteca.registrar_usuario(Usuario(f"Leitor {numero}", f"l{numero}@example.com", f"U{numero}"))
+            self.agencias[f"A{numero}"] = biblioteca
+        self.agencias["A2"].adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+        self.federacao = FederacaoBibliotecas(self.agencias, ttl_cache=60)
+
+    def tearDown(self):
+        self.federacao.fechar()
+
+    def test_consulta_concorrente_e_cache(self):
+        inicio = time.perf_counter()
+        encontrado = self.federacao.buscar_item_por_titulo("1984")
+        # Quatro agências de 0,1 s respondem juntas, não em 0,4 s
+        self.assertLess(time.perf_counter() - inicio, 0.35)
+        self.assertEqual(encontrado.agencias, ["A0", "A1", "A2", "A3"])
+        inicio = time.perf_counter()
+        self.assertEqual(self.federacao.buscar_item_por_titulo("1984").agencias, encontrado.agencias)
+        self.assertLess(time.perf_counter() - inicio, 0.05)
+        self.assertEqual((self.federacao.cache.acertos, self.federacao.cache.faltas), (1, 1))
+        self.assertIsNone(self.federacao.buscar_item_por_titulo("Inexistente"))
+
+    def test_busca_textual_sem_duplicatas(self):
+        pagina = self.federacao.buscar_itens("orwell")
+        self.assertEqual(len(pagina.itens), 1)
+        self.assertEqual(pagina.total, 1)
+        self.assertEqual(pagina.itens[0].agencias, ["A0", "A1", "A2", "A3"])
+        self.assertEqual(self.federacao.sugerir_titulos("Matrx"), ["Matrix"])
+
+    def test_falha_de_agencia_nao_derruba_a_consulta(self):
+        self.federacao.tempo_limite = 0.05
+        resultado = self.federacao.consultar("buscar_item_por_titulo", "1984")
+        self.assertEqual(resultado.respostas, {})
+        self.assertEqual(set(resultado.falhas), {"A0", "A1", "A2", "A3"})
+        # Resultado incompleto não vai para o cache
+        self.federacao.tempo_limite = 5
+        self.assertIsNone(self.federacao.buscar_usuario_por_matricula("X")[1])
+        self.assertEqual(len(self.federacao.cache), 1)
+
+    def test_emprestimo_entre_agencias(self):
+        self.federacao.buscar_item_por_titulo("Matrix")
+        resultado = self.federacao.realizar_emprestimo("U0", "Matrix", "2023-03-10")
+        self.assertTrue(resultado.sucesso)
+        self.assertEqual(resultado.agencia, "A2")
+        self.assertEqual(resultado.mensagem,
+                         "Empréstimo de 'Matrix' para 'Leitor 0' realizado com sucesso. Agência: A2.")
+        self.assertEqual(len(self.agencias["A2"].emprestimos_ativos), 1)
+        # O cache da busca anterior foi descartado: a disponibilidade é a atual
+        self.assertFalse(self.federacao.buscar_item_por_titulo("Matrix").item.esta_disponivel())
+        resultado = self.federacao.realizar_emprestimo("U1", "Matrix", "2023-03-10")
+        self.assertFalse(resultado.sucesso)
+        self.assertEqual(str(resultado), "Item 'Matrix' não está disponível para empréstimo.")
+        # A cópia registrada na agência A2 não muda a agência de origem
+        self.assertEqual(self.federacao.buscar_usuario_por_matricula("U0")[0], "A0")
+        resultado = self.federacao.registrar_devolucao_item("U0", "Matrix", "2023-03-12")
+        self.assertTrue(resultado.sucesso)
+        self.assertIn("devolvido por Leitor 0", resultado.mensagem)
+        self.assertFalse(self.federacao.registrar_devolucao_item("U0", "Matrix", "2023-03-12").sucesso)
+        self.assertEqual(self.federacao.realizar_emprestimo("UX", "Matrix", "2023-03-10").mensagem,
+                         "Usuário não encontrado.")
+        self.assertEqual(self.federacao.realizar_emprestimo("U1", "Duna", "2023-03-10").mensagem,
+                         "Item não encontrado em nenhuma agência.")
+
+    def test_emprestimo_prefere_agencia_do_usuario(self):
+        resultado = self.federacao.realizar_emprestimo("U3", "1984", "2023-03-10")
+        self.assertEqual((resultado.sucesso, resultado.agencia), (True, "A3"))
+        self.assertEqual(resultado.mensagem, "Empréstimo de '1984' para 'Leitor 3' realizado com sucesso.")
+        self.assertEqual(len(self.agencias["A3"].emprestimos_ativos), 1)
+        # Sem exemplar livre na A3, o próximo empréstimo vai para outra agência
+        self.agencias["A3"].registrar_usuario(Usuario("Outro", "o@example.com", "U9"))
+        self.assertIn("Agência: A0", self.federacao.realizar_emprestimo("U9", "1984", "2023-03-10").mensagem)
+
+    def test_devolucao_vai_so_para_a_agencia_do_emprestimo(self):
+        # Empréstimos feitos direto nas agências, sem passar pela federação
+        for nome in ("A0", "A1"):
+            self.agencias[nome].adicionar_item_catalogo(Livro("Duna", 1965, "2", Autor("Frank Herbert", "fh@x.com")))
+            self.agencias[nome].registrar_usuario(Usuario("Leitor 9", "l9@example.com", "U9"))
+        self.agencias["A1"].realizar_emprestimo("U9", "Duna", "2023-03-10")
+        # O título vale sem diferenciar maiúsculas, como no empréstimo
+        resultado = self.federacao.registrar_devolucao_item("U9", "DUNA", "2023-03-12")
+        self.assertEqual((resultado.sucesso, resultado.agencia), (True, "A1"))
+        self.assertIn("Item Duna devolvido", resultado.mensagem)
+        # Com o empréstimo nas duas agências, uma chamada não devolve os dois
+        self.agencias["A0"].realizar_emprestimo("U9", "Duna", "2023-03-10")
+        self.agencias["A1"].realizar_emprestimo("U9", "Duna", "2023-03-10")
+        resultado = self.federacao.registrar_devolucao_item("U9", "Duna", "2023-03-12")
+        self.assertFalse(resultado.sucesso)
+        self.assertIn("mais de uma agência", resultado.mensagem)
+        self.assertEqual(len(self.agencias["A0"].emprestimos_ativos) + len(self.agencias["A1"].emprestimos_ativos), 2)
+        self.assertTrue(self.federacao.registrar_devolucao_item("U9", "Duna", "2023-03-12", agencia="A0").sucesso)
+        self.assertEqual(len(self.agencias["A0"].emprestimos_ativos), 0)
+        self.assertEqual(len(self.agencias["A1"].emprestimos_ativos), 1)
+
+    def test_devolucao_com_agencia_sem_resposta_falha(self):
+        self.agencias["A1"].realizar_emprestimo("U1", "1984", "2023-03-10")
+        iterar = self.agencias["A3"].iterar_emprestimos_ativos
+
+        def iterar_lento(matricula=None):
+            time.sleep(0.3)
+            return iterar(matricula)
+        self.agencias["A3"].iterar_emprestimos_ativos = iterar_lento
+        self.federacao.tempo_limite = 0.1
+        resultado = self.federacao.registrar_devolucao_item("U1", "1984", "2023-03-12")
+        self.assertFalse(resultado.sucesso)
+        self.assertIn("A3: Tempo limite esgotado.", resultado.mensagem)
+        # Nada foi devolvido em nenhuma agência
+        self.assertEqual(len(self.agencias["A1"].emprestimos_ativos), 1)
+
+    def test_cache_ttl_expira(self):
+        agora = [0.0]
+        cache = CacheTTL(10, relogio=lambda: agora[0])
+        cache.guardar("chave", 1)
+        self.assertEqual(cache.obter("chave"), (True, 1))
+        agora[0] = 11
+        self.assertEqual(cache.obter("chave"), (False, None))
+        self.assertEqual(len(cache), 0)
+
+class TestCatalogoMapeado(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.diretorio.name, "catalogo.bin")
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        orwell = Autor("George Orwell", "go@dystopian.com", "Escritor inglês")
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "978-0451524935", orwell, "Distopia", 3))
+        self.biblioteca.adicionar_item_catalogo(Livro("A Revolução dos Bichos", 1945, "978-0451526342", orwell,
+                                                      "Distopia"))
+        self.biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski", 2))
+        self.biblioteca.adicionar_item_catalogo(Revista("Veja", 2023, "Edição 1", "Abril"))
+        self.biblioteca.adicionar_item_catalogo(Revista("Sem Editora", 2023, "1", None))
+        self.biblioteca.adicionar_item_catalogo(ItemBibliografico("Mapa Antigo", 1800))
+        # Título repetido: a busca devolve o primeiro, como na Biblioteca
+        self.biblioteca.adicionar_item_catalogo(DVD("matrix", 2003, 138, "Outro"))
+
+    def tearDown(self):
+        self.diretorio.cleanup()
+
+    def test_exportar_e_ler(self):
+        self.assertEqual(exportar_catalogo(self.biblioteca, self.caminho), 7)
+        with CatalogoMapeado(self.caminho) as catalogo:
+            self.assertEqual(len(catalogo), 7)
+            for posicao, item in enumerate(self.biblioteca.catalogo):
+                self.assertEqual(catalogo.registro(posicao), item_para_registro(item))
+            livro = catalogo.buscar_item_por_titulo("a revolução dos bichos")
+            self.assertIsInstance(livro, Livro)
+            self.assertEqual((livro.autor.nome, livro.autor.biografia), ("George Orwell", "Escritor inglês"))
+            self.assertEqual(catalogo.buscar_item_por_titulo("MATRIX").diretor, "Wachowski")
+            self.assertEqual(catalogo.buscar_item_por_titulo("1984").get_total_exemplares(), 3)
+            self.assertIsNone(catalogo.buscar_item_por_titulo("Sem Editora").editora)
+            self.assertIsNone(catalogo.buscar_item_por_titulo("Duna"))
+            self.assertEqual(list(catalogo.titulos())[:2], ["1984", "A Revolução dos Bichos"])
+            self.assertEqual([type(item) for item in catalogo][-2:], [ItemBibliografico, DVD])
+            with self.assertRaises(IndexError):
+                catalogo.registro(7)
+
+    def test_muitos_itens(self):
+        autor = Autor("Autor", "autor@example.com")
+        itens = [Livro(f"Livro {i}", 2000, str(i), autor) for i in range(2000)]
+        exportar_catalogo(itens, self.caminho)
+        with CatalogoMapeado(self.caminho) as catalogo:
+            self.assertTrue(all(catalogo.posicao_do_titulo(f"livro {i}") == i for i in range(2000)))
+            self.assertIsNone(catalogo.posicao_do_titulo("Livro 2000"))
+
+    def test_arquivo_invalido(self):
+        with open(self.caminho, "wb") as arquivo:
+            arquivo.write(b"x" * 100)
+        with self.assertRaises(ValueError):
+            CatalogoMapeado(self.caminho)
+        with self.assertRaises(TypeError):
+            exportar_catalogo(["1984"], self.caminho)
+
+class TestCacheBusca(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+        self.orwell = Autor("George Orwell", "go@dystopian.com")
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "1", self.orwell, "Distopia"))
+        self.biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+        self.biblioteca.registrar_usuario(Usuario("Ana", "ana@example.com", "U1"))
+        self.cache = ativar_cache(self.biblioteca, CacheBusca(capacidade=3))
+
+    def test_acertos_e_despejos(self):
+        primeira = self.biblioteca.buscar_itens("orwell")
+        self.assertIs(self.biblioteca.buscar_itens("orwell"), primeira)
+        self.biblioteca.sugerir_titulos("Matrx")
+        self.biblioteca.completar_termo("dis")
+        self.biblioteca.buscar_itens("matrix")
+        estatisticas = self.cache.estatisticas()
+        self.assertEqual((estatisticas["acertos"], estatisticas["faltas"]), (1, 4))
+        self.assertEqual((estatisticas["tamanho"], estatisticas["despejos"]), (3, 1))
+        # A busca menos usada recentemente foi a que saiu
+        self.biblioteca.buscar_itens("orwell")
+        self.assertEqual(self.cache.faltas, 5)
+
+    def test_invalidacao_precisa(self):
+        self.assertEqual(self.biblioteca.buscar_itens("orwell").total, 1)
+        self.assertEqual(self.biblioteca.buscar_itens("matrix").total, 1)
+        self.assertEqual(self.biblioteca.sugerir_titulos("Revoluçao"), [])
+        self.biblioteca.adicionar_item_catalogo(Livro("A Revolução dos Bichos", 1945, "2", self.orwell))
+        # "matrix" não tem relação com o livro novo e continua em cache
+        self.assertEqual(self.cache.invalidacoes, 2)
+        self.assertEqual(self.biblioteca.buscar_itens("orwell").total, 2)
+        self.assertEqual(self.biblioteca.sugerir_titulos("Revoluçao"), ["A Revolução dos Bichos"])
+        self.biblioteca.buscar_itens("matrix")
+        self.assertEqual(self.cache.acertos, 1)
+
+        self.assertTrue(self.biblioteca.remover_item_catalogo("1984"))
+        self.assertEqual(self.biblioteca.buscar_itens("orwell").total, 1)
+        relatorio = self.biblioteca.importar_itens([DVD(f"Matrix {i}", 2003, 130, "Wachowski") for i in range(100)])
+        self.assertEqual(relatorio.importados, 100)
+        self.assertEqual(self.biblioteca.buscar_itens("matrix").total, 101)
+
+    def test_disponibilidade_nunca_fica_velha(self):
+        ativar_cache(self.biblioteca)  # Já ativo: devolve o mesmo cache
+        desativar_cache(self.biblioteca)
+        self.assertNotIn("buscar_itens", vars(self.biblioteca))
+        cache = ativar_cache(self.biblioteca, operacoes=("buscar_item_por_titulo", "buscar_itens"))
+        matrix = self.biblioteca.buscar_itens("matrix").itens[0]
+        self.assertTrue(self.biblioteca.buscar_item_por_titulo("Matrix").esta_disponivel())
+        self.assertIn("realizado com sucesso", self.biblioteca.realizar_emprestimo("U1", "Matrix", "2023-03-10"))
+        self.assertGreater(cache.acertos, 0)
+        self.assertFalse(self.biblioteca.buscar_item_por_titulo("Matrix").esta_disponivel())
+        self.assertFalse(self.biblioteca.buscar_itens("matrix").itens[0].esta_disponivel())
+        self.assertIn("não está disponível", self.biblioteca.realizar_emprestimo("U1", "Matrix", "2023-03-10"))
+        self.biblioteca.registrar_devolucao_item("U1", "Matrix", "2023-03-12")
+        self.assertTrue(matrix.esta_disponivel())
+        # Um título removido e incluído de novo devolve o objeto novo
+        self.biblioteca.remover_item_catalogo("Matrix")
+        self.assertIsNone(self.biblioteca.buscar_item_por_titulo("matrix"))
+        novo = DVD("Matrix", 1999, 136, "Wachowski", exemplares=2)
+        self.biblioteca.adicionar_item_catalogo(novo)
+        self.assertIs(self.biblioteca.buscar_item_por_titulo("Matrix"), novo)
+
+    def test_validade(self):
+        agora = [0.0]
+        cache = CacheBusca(ttl=10, relogio=lambda: agora[0])
+        _, _, geracao = cache.obter("chave")
+        cache.guardar("chave", 1, geracao, lambda alterado: False)
+        self.assertEqual(cache.obter("chave")[:2], (True, 1))
+        agora[0] = 11
+        self.assertEqual(cache.obter("chave")[:2], (False, None))
+        self.assertEqual(cache.expiradas, 1)
+        # Resultado calculado antes de uma invalidação não é guardado
+        _, _, geracao = cache.obter("outra")
+        cache.limpar()
+        self.assertFalse(cache.guardar("outra", 2, geracao, lambda alterado: False))
+        with self.assertRaises(TypeError):
+            ativar_cache(BibliotecaRemota.__new__(BibliotecaRemota))
+
+    def test_metricas_do_cache(self):
+        metricas = instrumentar(self.biblioteca)
+        self.biblioteca.buscar_itens("orwell")
+        self.biblioteca.buscar_itens("orwell")
+        texto = metricas.para_prometheus()
+        self.assertIn("biblioteca_cache_busca_acertos 1", texto)
+        self.assertIn('biblioteca_operacao_segundos_count{operacao="buscar_itens"} 2', texto)
+
+class TestRegistroAutores(unittest.TestCase):
+    def setUp(self):
+        self.biblioteca = Biblioteca("Biblioteca Central")
+
+    def test_autor_unico_por_nome_e_email(self):
+        primeiro = Livro("1984", 1949, "1", Autor("George Orwell", "go@dystopian.com"), "Distopia")
+        segundo = Livro("A Revolução dos Bichos", 1945, "2", Autor(" george  ORWELL ", "GO@dystopian.com ",
+                                                                    "Escritor inglês"), "distopia".title())
+        self.biblioteca.adicionar_item_catalogo(primeiro)
+        self.biblioteca.importar_itens([segundo, {"tipo": "livro", "titulo": "Dias na Birmânia",
+                                                  "ano_publicacao": 1934, "isbn": "3", "autor_nome": "George Orwell",
+                                                  "autor_email": "go@dystopian.com", "genero": "Distopia"}])
+        self.assertEqual(len(self.biblioteca.autores), 1)
+        autor = primeiro.autor
+        self.assertIs(segundo.autor, autor)
+        self.assertEqual(autor.biografia, "Escritor inglês")
+        self.assertEqual(autor.livros_publicados, ["1984", "A Revolução dos Bichos", "Dias na Birmânia"])
+        # Gêneros iguais passam a ser a mesma string
+        self.assertIs(self.biblioteca.catalogo[2].genero, primeiro.genero)
+        self.assertIs(segundo.genero, primeiro.genero)
+
+    def test_itens_do_autor(self):
+        orwell = Autor("George Orwell", "go@dystopian.com")
+        outro_orwell = Autor("George Orwell", "outro@example.com")
+        self.biblioteca.adicionar_item_catalogo(Livro("1984", 1949, "1", orwell))
+        self.biblioteca.adicionar_item_catalogo(Livro("Homônimo", 2001, "2", outro_orwell))
+        self.biblioteca.adicionar_item_catalogo(DVD("Matrix", 1999, 136, "Wachowski"))
+        self.assertEqual(len(self.biblioteca.itens_do_autor("george orwell")), 2)
+        self.assertEqual([item.get_titulo() for item in self.biblioteca.itens_do_autor("George Orwell",
+                                                                                       "go@dystopian.com")],
+                         ["1984"])
+        self.assertEqual(self.biblioteca.itens_do_autor("Ninguém"), [])
+
+        self.assertTrue(self.biblioteca.remover_item_catalogo("Homônimo"))
+        self.assertEqual(len(self.biblioteca.autores), 1)
+        self.assertEqual(outro_orwell.livros_publicados, [])
+        self.assertEqual(len(self.biblioteca.itens_do_autor("George Orwell")), 1)
+        self.assertTrue(self.biblioteca.remover_item_catalogo("1984"))
+        self.assertIsNone(self.biblioteca.autores.buscar("George Orwell", "go@dystopian.com"))
+
+    def test_strings_repetidas_internadas(self):
+        editora = "".join(["Ab", "ril"])
+        diretor = "".join(["Wacho", "wski"])
+        self.biblioteca.importar_itens([Revista("Veja", 2023, "1", "Abril"), Revista("Exame", 2023, "2", editora),
+                                        DVD("Matrix", 1999, 136, "Wachowski"), DVD("Matrix 2", 2003, 138, diretor)])
+        revistas, dvds = self.biblioteca.catalogo[:2], self.biblioteca.catalogo[2:]
+        self.assertIs(revistas[0].editora, revistas[1].editora)
+        self.assertIs(dvds[0].diretor, dvds[1].diretor)
+
+class TestBenchmark(unittest.TestCase):
+    def test_execucao_e_comparacao(self):
+        resultado = executar([200], amostra=50, medir_memoria=False)
+        cenario = resultado["escalas"]["200"]
+        self.assertEqual(cenario["operacoes"]["iterar_itens"]["registros"], 200)
+        self.assertEqual(cenario["operacoes"]["realizar_emprestimo"]["chamadas"], cenario["emprestimos"])
+        self.assertEqual(comparar(resultado, resultado), [])
+
+        base = {"escalas": {"200": {"memoria_pico_mb": None, "operacoes": {
+            "buscar_item_por_titulo": dict(cenario["operacoes"]["buscar_item_por_titulo"]),
+        }}, "5000": {"operacoes": {}}}}
+        base["escalas"]["200"]["operacoes"]["buscar_item_por_titulo"]["por_segundo"] *= 10
+        regressoes = comparar(resultado, base)
+        self.assertEqual(len(regressoes), 1)
+        self.assertIn("buscar_item_por_titulo", regressoes[0])
+
 
 class TestConfiguracaoBiblioteca(unittest.TestCase):
     def test_criar_configuracao(self):
@@ -248,5 +1901,19 @@ class TestConfiguracaoBiblioteca(unittest.TestCase):
         with self.assertRaises(ValueError):
             config.set_max_livros_por_usuario("abc")
 
+    def test_regras_por_tipo(self):
+        config = ConfiguracaoBiblioteca(dias_emprestimo_padrao=14)
+        config.set_limite_por_tipo("dvd", 2)
+        config.set_dias_emprestimo("dvd", 7)
+        self.assertEqual(config.get_limite_por_tipo("dvd"), 2)
+        self.assertIsNone(config.get_limite_por_tipo("livro"))
+        self.assertEqual(config.get_dias_emprestimo("dvd"), 7)
+        self.assertEqual(config.get_dias_emprestimo("livro"), 14)
+        self.assertEqual(config.data_devolucao_padrao("dvd", "2023-03-10"), date(2023, 3, 17))
+        config.set_limite_por_tipo("dvd", None)
+        self.assertIsNone(config.get_limite_por_tipo("dvd"))
+        with self.assertRaises(ValueError):
+            config.set_dias_emprestimo("dvd", 0)
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file